@@ -1,13 +1,26 @@
 """
 Модуль для работы с аутентификацией: хеширование паролей и генерация JWT токенов
 """
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from fastapi import HTTPException, status
 from passlib.context import CryptContext
 from jose import jwt
 from app.config import settings
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# bcrypt освобождает GIL на время вычисления хеша, поэтому пул потоков даёт реальный параллелизм
+hashing_executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASHING_WORKERS,
+    thread_name_prefix="password-hashing"
+)
+_hashing_slots = threading.BoundedSemaphore(
+    settings.PASSWORD_HASHING_WORKERS + settings.PASSWORD_HASHING_QUEUE_LIMIT
+)
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Проверка соответствие пароля его хешу"""
     return pwd_context.verify(plain_password, hashed_password)
@@ -16,6 +29,45 @@ def get_password_hash(password: str) -> str:
     """Генерация безопасный хеш пароля"""
     return pwd_context.hash(password)
 
+def _release_hashing_slot(_future):
+    """Освобождение места в очереди хеширования после завершения задачи в пуле"""
+    _hashing_slots.release()
+
+async def _run_in_hashing_executor(func, *args):
+    """
+    Выполнение функции хеширования в выделенном пуле потоков.
+    При переполнении очереди запрос отклоняется с кодом 503,
+    чтобы всплеск авторизаций не вытеснял остальной трафик.
+    Место в очереди освобождается по завершении задачи в пуле, а не ожидающего
+    запроса: при отмене запроса хеширование продолжается и по-прежнему учитывается
+    """
+    # место освобождается колбэком задачи, блок with здесь не подходит
+    if not _hashing_slots.acquire(blocking=False):  # pylint: disable=consider-using-with
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Сервис авторизации перегружен, повторите попытку позже",
+            headers={"Retry-After": "1"},
+        )
+    try:
+        future = hashing_executor.submit(func, *args)
+    except RuntimeError:
+        _hashing_slots.release()
+        raise
+    future.add_done_callback(_release_hashing_slot)
+    return await asyncio.wrap_future(future)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Асинхронная проверка пароля без блокировки цикла событий"""
+    return await _run_in_hashing_executor(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    """Асинхронная генерация хеша пароля без блокировки цикла событий"""
+    return await _run_in_hashing_executor(get_password_hash, password)
+
+def shutdown_hashing_executor():
+    """Остановка пула потоков хеширования при завершении работы приложения"""
+    hashing_executor.shutdown(wait=False, cancel_futures=True)
+
 def create_access_token(data: dict) -> str:
     """Создание JWT access токен с ограниченным сроком действия"""
     to_encode = data.copy()
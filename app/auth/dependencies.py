@@ -6,19 +6,28 @@ from typing import Annotated
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
-from sqlmodel import Session, select
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app.config import settings
 from app.models.user import User
 from app.database import get_db
+from app.auth.token_cache import token_cache
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
 async def get_current_user(
     token: Annotated[str, Depends(oauth2_scheme)],
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ) -> User:
-    """Зависимость для получения текущего авторизованного пользователя"""
+    """
+    Зависимость для получения текущего авторизованного пользователя.
+    Ранее проверенные токены обслуживаются из кеша без декодирования и обращения к БД
+    """
+    cached_user = token_cache.get(token)
+    if cached_user is not None:
+        return cached_user
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Неверные учётные данные",
@@ -37,8 +46,9 @@ async def get_current_user(
     except (JWTError, ValueError) as exc:
         raise credentials_exception from exc
 
-    user = db.exec(select(User).where(User.id == user_id)).first()
+    user = (await db.exec(select(User).where(User.id == user_id))).first()
     if not user:
         raise credentials_exception
 
+    token_cache.set(token, user, expires_at=payload.get("exp"))
     return user
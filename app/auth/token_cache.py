@@ -0,0 +1,74 @@
+"""
+Модуль кеша проверенных JWT токенов.
+Позволяет не декодировать токен и не загружать пользователя из БД при каждом запросе
+"""
+import time
+from itertools import count
+from typing import Optional
+from sqlalchemy import event
+from app.cache import TTLCache
+from app.config import settings
+from app.models.user import User
+
+USER_SNAPSHOT_FIELDS = ("id", "username", "email")
+
+
+class TokenCache:
+    """
+    Кеш соответствия «токен → пользователь».
+    Хранится не объект сессии, а снимок полей пользователя: каждый запрос
+    получает собственный экземпляр User, не связанный с другими сессиями
+    (хеш пароля в снимок не входит).
+    Срок жизни записи не превышает срок действия токена (поле exp).
+    Инвалидация выполняется через поколение пользователя, которое хранится в
+    TTL-кеше того же размера и срока жизни: запись токена действительна, только
+    пока поколение на месте, поэтому вытеснение поколения приводит к промаху,
+    а не к устаревшему ответу, и перебор закешированных токенов не требуется
+    """
+    def __init__(self, max_size: int, ttl: float):
+        self._cache = TTLCache(max_size=max_size, ttl=ttl)
+        self._generations = TTLCache(max_size=max_size, ttl=ttl)
+        self._next_generation = count(1)
+
+    def get(self, token: str) -> Optional[User]:
+        """Получение копии пользователя по ранее проверенному токену"""
+        entry = self._cache.get(token)
+        if entry is None:
+            return None
+        snapshot, generation = entry
+        if generation != self._generations.get(snapshot["id"]):
+            self._cache.delete(token)
+            return None
+        return User(**snapshot)
+
+    def set(self, token: str, user: User, expires_at: Optional[float] = None):
+        """Сохранение снимка пользователя для токена с учётом его срока действия (UNIX-время)"""
+        ttl = None if expires_at is None else expires_at - time.time()
+        generation = self._generations.get(user.id)
+        if generation is None:
+            generation = next(self._next_generation)
+        self._generations.set(user.id, generation)
+        snapshot = {field: getattr(user, field) for field in USER_SNAPSHOT_FIELDS}
+        self._cache.set(token, (snapshot, generation), ttl=ttl)
+
+    def invalidate_user(self, user_id: int):
+        """Инвалидация всех токенов пользователя после изменения его данных"""
+        self._generations.delete(user_id)
+
+    def clear(self):
+        """Полная очистка кеша"""
+        self._cache.clear()
+        self._generations.clear()
+
+
+token_cache = TokenCache(
+    max_size=settings.TOKEN_CACHE_SIZE,
+    ttl=settings.TOKEN_CACHE_TTL_SECONDS
+)
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_changed_user(_mapper, _connection, target: User):
+    """Сброс закешированных токенов при изменении или удалении пользователя"""
+    token_cache.invalidate_user(target.id)
@@ -0,0 +1,67 @@
+"""
+Модуль потоковой выгрузки каталога товаров в форматах NDJSON и CSV.
+Товары читаются серверным курсором порциями по EXPORT_CHUNK_SIZE строк
+и сразу отдаются клиенту, поэтому потребление памяти не зависит от размера каталога
+"""
+import csv
+import io
+import json
+from typing import AsyncIterator, Dict, Iterable, List
+import orjson
+from sqlmodel import select
+from app.config import settings
+from app.database import async_session
+from app.models.product import Product
+from app.business_logic.stock import stock_expression
+from app.schemas.product_schema import CatalogFileFormat
+
+EXPORT_FIELDS = ["id", "name", "description", "price", "category", "ingredients", "stock"]
+
+MEDIA_TYPES = {
+    CatalogFileFormat.NDJSON: "application/x-ndjson",
+    CatalogFileFormat.CSV: "text/csv; charset=utf-8",
+}
+
+
+def render_ndjson(rows: Iterable[Dict]) -> bytes:
+    """Кодирование порции товаров в строки NDJSON"""
+    return b"".join(orjson.dumps(row) + b"\n" for row in rows) # pylint: disable=no-member
+
+
+def render_csv(rows: Iterable[Dict], header: bool = False) -> bytes:
+    """
+    Кодирование порции товаров в строки CSV.
+    Список ингредиентов записывается в ячейку как JSON-массив
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(EXPORT_FIELDS)
+    writer.writerows(
+        [json.dumps(value, ensure_ascii=False) if key == "ingredients" else value
+         for key, value in row.items()]
+        for row in rows
+    )
+    return buffer.getvalue().encode()
+
+
+async def stream_catalog(export_format: CatalogFileFormat) -> AsyncIterator[bytes]:
+    """
+    Генератор выгрузки всего каталога, упорядоченного по id.
+    Сессия открывается внутри генератора: сессия зависимости get_db закрывается
+    до начала отправки потокового ответа. Чтение выполняется в одной транзакции,
+    поэтому выгрузка соответствует согласованному снимку каталога
+    """
+    columns = [stock_expression().label(field) if field == "stock" else getattr(Product, field)
+               for field in EXPORT_FIELDS]
+    async with async_session() as db:
+        result = await db.stream(
+            select(*columns).order_by(Product.id)
+            .execution_options(yield_per=settings.EXPORT_CHUNK_SIZE)
+        )
+        render = render_csv if export_format == CatalogFileFormat.CSV else render_ndjson
+        if export_format == CatalogFileFormat.CSV:
+            yield render_csv([], header=True)
+        async for partition in result.partitions():
+            rows: List[Dict] = [dict(zip(EXPORT_FIELDS, row)) for row in partition]
+            yield render(rows)
@@ -0,0 +1,46 @@
+"""
+Модуль поддержки индекса ингредиентов товаров (таблица product_ingredients).
+Индекс обновляется при каждом изменении состава товара
+"""
+from typing import Dict, Iterable
+from sqlalchemy import insert
+from sqlmodel import delete
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.models.product import ProductIngredient
+
+
+async def replace_product_ingredients(db: AsyncSession, product_id: int,
+                                      ingredients: Iterable[str]):
+    """
+    Замена записей индекса для товара актуальным списком ингредиентов.
+    Изменения выполняются в текущей транзакции сессии и фиксируются вместе с товаром
+    """
+    await remove_product_ingredients(db, product_id)
+    db.add_all([
+        ProductIngredient(product_id=product_id, ingredient=ingredient)
+        for ingredient in dict.fromkeys(ingredients or [])
+    ])
+
+
+async def remove_product_ingredients(db: AsyncSession, product_id: int):
+    """Удаление записей индекса для товара"""
+    await db.exec(delete(ProductIngredient).where(ProductIngredient.product_id == product_id))
+
+
+async def replace_ingredients_bulk(db: AsyncSession, ingredients: Dict[int, Iterable[str]]):
+    """
+    Замена записей индекса сразу для многих товаров:
+    одно удаление по списку товаров и одна пакетная вставка (executemany)
+    """
+    if not ingredients:
+        return
+    await db.exec(delete(ProductIngredient).where(
+        ProductIngredient.product_id.in_(list(ingredients)) # pylint: disable=no-member
+    ))
+    rows = [
+        {"product_id": product_id, "ingredient": ingredient}
+        for product_id, names in ingredients.items()
+        for ingredient in dict.fromkeys(names or [])
+    ]
+    if rows:
+        await db.exec(insert(ProductIngredient), params=rows)
@@ -0,0 +1,95 @@
+"""
+Модуль жизненного цикла заказа.
+Заказ переходит из статуса created в checked_out и paid либо в cancelled или expired.
+Пока заказ в статусе created или checked_out, товары его позиций зарезервированы
+на складе до момента reserved_until. Каждый переход выполняется одним условным
+UPDATE ... WHERE status IN (...) RETURNING, поэтому параллельные запросы и фоновое
+снятие резерва не могут перевести заказ дважды.
+Фоновая задача sweep_expired_orders периодически переводит просроченные заказы
+в статус expired и возвращает товары на склад пакетами: один UPDATE заказов
+и один запрос возврата товаров на пакет. Задача может выполняться в нескольких
+воркерах одновременно — заказ достаётся только тому, чей UPDATE изменил его статус
+"""
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Sequence
+from sqlalchemy import update
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.config import settings
+from app.database import async_session
+from app.models.order import HOLDING_STATUSES, Order, OrderStatus
+from app.business_logic.product_cache import invalidate_changed_products
+from app.business_logic.stock import release_orders_stock
+
+
+def utcnow() -> datetime:
+    """Текущее время в UTC"""
+    return datetime.now(timezone.utc)
+
+
+def deadline(minutes: float) -> datetime:
+    """Момент окончания резервирования, отсчитываемый от текущего времени"""
+    return utcnow() + timedelta(minutes=minutes)
+
+
+async def transition(db: AsyncSession, order: Order, target: OrderStatus,
+                     allowed: Sequence[str], reserved_until: Optional[datetime],
+                     *conditions) -> bool:
+    """
+    Перевод заказа в статус target, если его текущий статус входит в allowed
+    и выполнены дополнительные условия. Новые статус и срок резервирования
+    записываются в загруженный объект заказа.
+    Возвращает False, если заказ уже в другом статусе или условия не выполнены
+    """
+    row = (await db.exec(
+        update(Order)
+        .where(Order.id == order.id, Order.status.in_(allowed), *conditions) # pylint: disable=no-member
+        .values(status=target.value, reserved_until=reserved_until)
+        .returning(Order.status, Order.reserved_until)
+        .execution_options(synchronize_session=False)
+    )).one_or_none()
+    if row is None:
+        return False
+    set_committed_value(order, "status", row.status)
+    set_committed_value(order, "reserved_until", row.reserved_until)
+    return True
+
+
+async def expire_orders(db: AsyncSession, limit: int) -> List[int]:
+    """
+    Перевод не более limit просроченных заказов в статус expired с возвратом
+    товаров на склад в текущей транзакции. Возвращает id просроченных заказов
+    """
+    now = utcnow()
+    expired = (
+        Order.status.in_(HOLDING_STATUSES), # pylint: disable=no-member
+        Order.reserved_until < now
+    )
+    batch = select(Order.id).where(*expired).order_by(Order.reserved_until).limit(limit)
+    order_ids = list((await db.exec(
+        update(Order)
+        .where(Order.id.in_(batch), *expired) # pylint: disable=no-member
+        .values(status=OrderStatus.EXPIRED.value, reserved_until=None)
+        .returning(Order.id)
+        .execution_options(synchronize_session=False)
+    )).scalars())
+    await release_orders_stock(db, order_ids)
+    return order_ids
+
+
+async def sweep_expired_orders(batch_size: Optional[int] = None) -> int:
+    """
+    Снятие резерва всех просроченных заказов пакетами по ORDER_SWEEP_BATCH_SIZE,
+    каждый пакет — в отдельной транзакции. Возвращает число просроченных заказов
+    """
+    batch_size = batch_size or settings.ORDER_SWEEP_BATCH_SIZE
+    total = 0
+    while True:
+        async with async_session() as db:
+            order_ids = await expire_orders(db, batch_size)
+            await db.commit()
+            await invalidate_changed_products(db)
+        total += len(order_ids)
+        if len(order_ids) < batch_size:
+            return total
@@ -0,0 +1,211 @@
+"""
+Модуль изменения заказов.
+Заказ загружается один раз вместе с позициями, после чего каждое изменение
+выполняется минимальным числом запросов: остаток товара и итоги заказа изменяются
+условными UPDATE ... RETURNING, полученные значения записываются в уже загруженные
+объекты, а позиции добавляются и удаляются в загруженной коллекции заказа.
+Позиции изменяются только в заказе в статусе created; переходы между статусами
+выполняются условными UPDATE модуля order_lifecycle.
+Сессии создаются с expire_on_commit=False, поэтому после фиксации транзакции
+заказ возвращается из памяти без повторного чтения
+"""
+from typing import Dict, List, Optional
+from fastapi import HTTPException
+from sqlalchemy import insert
+from sqlalchemy.orm import make_transient_to_detached, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.config import settings
+from app.models.order import HOLDING_STATUSES, Order, OrderItem, OrderStatus
+from app.models.user import User
+from app.business_logic.order_lifecycle import deadline, transition, utcnow
+from app.business_logic.order_totals import adjust_order_totals
+from app.business_logic.product_cache import invalidate_changed_products
+from app.business_logic.stock import (
+    release_orders_stock, reserve_product, reserve_products, reserve_stock, release_stock
+)
+
+
+def order_with_items_query():
+    """
+    Запрос заказов с предзагруженными позициями.
+    В асинхронном режиме связи не догружаются лениво, поэтому загружаются явно.
+    Позиции выбираются отдельным запросом по id заказов (selectinload), поэтому
+    столбцы заказа не повторяются в каждой строке позиции. Название и цена товара
+    хранятся в позициях, поэтому товары не загружаются
+    """
+    return select(Order).options(selectinload(Order.items))
+
+
+class OrderService:
+    """
+    Изменение заказов пользователя без повторной загрузки заказа после записи.
+    Методы изменяют объекты в памяти и выполняют запросы в текущей транзакции;
+    фиксация выполняется методом commit
+    """
+    def __init__(self, db: AsyncSession, user: User):
+        self.db = db
+        self.user = user
+
+    async def get_order(self, order_id: int,
+                        detail: str = "Заказ не найден") -> Order:
+        """Загрузка заказа с позициями с проверкой прав доступа (два запроса)"""
+        order = (await self.db.exec(
+            order_with_items_query().where(Order.id == order_id)
+        )).first()
+
+        if not order or order.user_id != self.user.id:
+            raise HTTPException(404, detail)
+        return order
+
+    async def create_order(self) -> Order:
+        """
+        Создание пустого заказа одним INSERT.
+        Коллекция позиций инициализируется пустой и не требует загрузки
+        """
+        order = Order(user_id=self.user.id, items=[],
+                      reserved_until=deadline(settings.ORDER_RESERVATION_MINUTES))
+        self.db.add(order)
+        return await self.commit(order)
+
+    @staticmethod
+    def ensure_editable(order: Order):
+        """Проверка, что позиции заказа можно изменять"""
+        if order.status != OrderStatus.CREATED.value:
+            raise HTTPException(409, f"Заказ в статусе {order.status} нельзя изменить")
+
+    async def adjust_totals(self, order: Order, quantity: int, amount: float):
+        """
+        Изменение итогов заказа; если заказ тем временем отменён или просрочен,
+        транзакция не фиксируется и возвращается ошибка
+        """
+        if not await adjust_order_totals(self.db, order, quantity, amount):
+            raise HTTPException(409, "Заказ нельзя изменить: он отменён или просрочен")
+
+    @staticmethod
+    def find_item(order: Order, item_id: int) -> OrderItem:
+        """Поиск позиции в загруженном заказе"""
+        item = next((i for i in order.items if i.id == item_id), None)
+        if not item:
+            raise HTTPException(404, "Позиция не найдена")
+        return item
+
+    async def add_item(self, order: Order, product_id: int,
+                       quantity: int) -> Optional[OrderItem]:
+        """
+        Резервирование товара и добавление позиции со снимком названия и цены.
+        Возвращает None, если товара нет или его недостаточно на складе
+        """
+        self.ensure_editable(order)
+        reserved = await reserve_product(self.db, product_id, quantity)
+        if not reserved:
+            return None
+        item = OrderItem(product_id=product_id, quantity=quantity,
+                         product_name=reserved.name, unit_price=reserved.price)
+        order.items.append(item)
+        await self.adjust_totals(order, quantity, quantity * reserved.price)
+        return item
+
+    async def add_items(self, order: Order, quantities: Dict[int, int]) -> List[int]:
+        """
+        Добавление нескольких позиций с одним резервированием всех товаров,
+        одним многострочным INSERT позиций и одним изменением итогов заказа.
+        Возвращает id товаров, которых недостаточно на складе
+        """
+        self.ensure_editable(order)
+        products = await reserve_products(self.db, quantities)
+        short_ids = [product_id for product_id in quantities if product_id not in products]
+        rows = [
+            {"order_id": order.id, "product_id": product_id, "quantity": quantity,
+             "product_name": products[product_id].name,
+             "unit_price": products[product_id].price}
+            for product_id, quantity in quantities.items() if product_id in products
+        ]
+        if rows:
+            await self.attach_items(order, rows)
+        await self.adjust_totals(order, sum(row["quantity"] for row in rows),
+                                 sum(row["quantity"] * row["unit_price"] for row in rows))
+        return short_ids
+
+    async def attach_items(self, order: Order, rows: List[Dict]):
+        """
+        Вставка позиций одним INSERT ... RETURNING и добавление их в загруженный
+        заказ как уже сохранённых объектов. Поштучная вставка объектов при flush
+        в SQLite выполняется отдельным запросом на каждую позицию
+        """
+        item_ids = dict((await self.db.exec(
+            insert(OrderItem).values(rows).returning(OrderItem.product_id, OrderItem.id)
+        )).all())
+        items = []
+        for row in rows:
+            item = OrderItem(id=item_ids[row["product_id"]], **row)
+            make_transient_to_detached(item)
+            self.db.add(item)
+            items.append(item)
+        set_committed_value(order, "items", [*order.items, *items])
+
+    async def change_quantity(self, order: Order, item: OrderItem, quantity: int) -> bool:
+        """
+        Изменение количества товара в позиции с резервированием или возвратом разницы.
+        Возвращает False, если товара недостаточно на складе
+        """
+        self.ensure_editable(order)
+        delta = quantity - item.quantity
+        if delta > 0 and not await reserve_stock(self.db, item.product_id, delta):
+            return False
+        if delta < 0:
+            await release_stock(self.db, item.product_id, -delta)
+        item.quantity = quantity
+        await self.adjust_totals(order, delta, delta * item.unit_price)
+        return True
+
+    async def remove_item(self, order: Order, item: OrderItem):
+        """Удаление позиции с возвратом товара на склад"""
+        self.ensure_editable(order)
+        await release_stock(self.db, item.product_id, item.quantity)
+        await self.adjust_totals(order, -item.quantity, -item.quantity * item.unit_price)
+        order.items.remove(item)
+        await self.db.delete(item)
+
+    async def checkout(self, order: Order) -> Order:
+        """
+        Оформление непустого заказа: created → checked_out.
+        Резерв продлевается на ORDER_CHECKOUT_MINUTES для оплаты
+        """
+        if not await transition(self.db, order, OrderStatus.CHECKED_OUT,
+                                (OrderStatus.CREATED.value,),
+                                deadline(settings.ORDER_CHECKOUT_MINUTES),
+                                Order.item_count > 0):
+            raise HTTPException(409, "Оформить можно только непустой заказ в статусе created")
+        return await self.commit(order)
+
+    async def pay(self, order: Order) -> Order:
+        """
+        Оплата оформленного заказа до истечения срока резервирования:
+        checked_out → paid; товары окончательно списываются со склада
+        """
+        if not await transition(self.db, order, OrderStatus.PAID,
+                                (OrderStatus.CHECKED_OUT.value,), None,
+                                Order.reserved_until > utcnow()):
+            raise HTTPException(
+                409, "Оплатить можно только оформленный заказ до истечения срока резервирования"
+            )
+        return await self.commit(order)
+
+    async def cancel(self, order: Order) -> Order:
+        """Отмена заказа с возвратом товаров на склад одним UPDATE"""
+        if not await transition(self.db, order, OrderStatus.CANCELLED,
+                                HOLDING_STATUSES, None):
+            raise HTTPException(409, f"Заказ в статусе {order.status} нельзя отменить")
+        await release_orders_stock(self.db, [order.id])
+        return await self.commit(order)
+
+    async def commit(self, order: Order) -> Order:
+        """
+        Фиксация изменений и сброс кеша изменённых товаров.
+        Возвращается тот же объект заказа: после фиксации он не устаревает
+        """
+        await self.db.commit()
+        await invalidate_changed_products(self.db)
+        return order
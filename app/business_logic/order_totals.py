@@ -0,0 +1,41 @@
+"""
+Модуль поддержки количества товаров и суммы заказа.
+Итоги изменяются приращением в одном UPDATE без чтения значений в Python,
+поэтому параллельные изменения позиций одного заказа не теряют обновлений.
+Вызывается в той же транзакции, что и изменение позиций
+"""
+from sqlalchemy import update
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.config import settings
+from app.models.order import Order, OrderStatus
+from app.business_logic.order_lifecycle import deadline
+
+
+async def adjust_order_totals(db: AsyncSession, order: Order, quantity: int,
+                              amount: float) -> bool:
+    """
+    Изменение итогов заказа в статусе created с продлением срока резервирования:
+    UPDATE orders SET item_count = item_count + :quantity, total = total + :amount,
+    reserved_until = :deadline WHERE id = :order_id AND status = 'created'
+    RETURNING item_count, total, reserved_until.
+    Условие на статус исключает гонку с отменой и снятием резерва по истечении срока.
+    Новые значения записываются в загруженный объект заказа без его перечитывания.
+    Возвращает False, если заказ уже не в статусе created
+    """
+    if not quantity and not amount:
+        return True
+    row = (await db.exec(
+        update(Order)
+        .where(Order.id == order.id, Order.status == OrderStatus.CREATED.value)
+        .values(item_count=Order.item_count + quantity, total=Order.total + amount,
+                reserved_until=deadline(settings.ORDER_RESERVATION_MINUTES))
+        .returning(Order.item_count, Order.total, Order.reserved_until)
+        .execution_options(synchronize_session=False)
+    )).one_or_none()
+    if row is None:
+        return False
+    set_committed_value(order, "item_count", row.item_count)
+    set_committed_value(order, "total", row.total)
+    set_committed_value(order, "reserved_until", row.reserved_until)
+    return True
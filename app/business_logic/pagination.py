@@ -0,0 +1,57 @@
+"""
+Модуль вспомогательных функций для курсорной (keyset) пагинации.
+Курсор содержит значения ключа сортировки последней выданной записи
+и передаётся клиенту в виде непрозрачной строки
+"""
+import base64
+import json
+from typing import Any, List, Sequence
+from fastapi import HTTPException, status
+
+
+def encode_cursor(*values: Any) -> str:
+    """Кодирование значений ключа сортировки в непрозрачный курсор"""
+    raw = json.dumps(list(values), default=str, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+INT64_RANGE = range(-2 ** 63, 2 ** 63)
+
+
+def matches_type(value: Any, expected: type) -> bool:
+    """
+    Проверка, что значение из курсора — скаляр ожидаемого типа:
+    для float допускаются целые числа, логические значения не допускаются,
+    целые числа ограничены диапазоном 64-битных столбцов БД
+    """
+    if isinstance(value, bool):
+        return False
+    if expected is float:
+        return isinstance(value, (int, float))
+    if expected is int:
+        return isinstance(value, int) and value in INT64_RANGE
+    return isinstance(value, expected)
+
+
+def decode_cursor(cursor: str, size: int, types: Sequence[type] = ()) -> List[Any]:
+    """
+    Декодирование курсора в список значений ключа сортировки.
+    Если переданы types, значения проверяются на соответствие типам.
+    Повреждённый курсор приводит к ошибке 400
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError) as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Некорректный курсор пагинации"
+        ) from exc
+
+    if (not isinstance(values, list) or len(values) != size
+            or not all(matches_type(value, expected) for value, expected in zip(values, types))):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Некорректный курсор пагинации"
+        )
+    return values
@@ -0,0 +1,25 @@
+"""
+Модуль периодических фоновых задач приложения.
+Задачи запускаются в lifespan приложения и останавливаются отменой при его завершении
+"""
+import asyncio
+import logging
+from typing import Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+
+async def run_periodically(job: Callable[[], Awaitable[int]], interval: float, name: str):
+    """
+    Выполнение задачи job каждые interval секунд. Задача возвращает число
+    обработанных записей, ненулевое значение записывается в журнал.
+    Ошибки записываются в журнал и не останавливают выполнение
+    """
+    while True:
+        try:
+            processed = await job()
+            if processed:
+                logger.info("%s: %d", name, processed)
+        except Exception: # pylint: disable=broad-exception-caught
+            logger.exception("%s: ошибка", name)
+        await asyncio.sleep(interval)
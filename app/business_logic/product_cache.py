@@ -0,0 +1,132 @@
+"""
+Модуль кеша каталога товаров.
+Карточки товаров и страницы списка хранятся в виде готовых к отдаче словарей.
+Карточки адресуются версией товара, страницы списка — версией каталога:
+любое изменение товара или остатка увеличивает версии, и закешированные ранее
+записи перестают использоваться без перебора ключей, что работает и для кеша,
+общего для нескольких воркеров. Запись, построенная по устаревшим данным
+параллельным запросом, попадает под старую версию и никогда не будет прочитана
+"""
+import uuid
+from typing import Any, Dict, Iterable, Optional
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.cache import CacheBackend, MemoryCacheBackend
+from app.config import settings
+from app.models.product import Product
+from app.schemas.product_schema import ProductListQuery, ProductResponse
+
+VERSION_KEY = "products:version"
+ITEM_VERSION_KEY = "products:item_version:{}"
+CHANGED_PRODUCTS_KEY = "product_cache_changed_ids"
+
+
+class ProductCache:
+    """
+    Кеш карточек товаров и страниц каталога поверх подключаемого бэкенда
+    со счётчиками попаданий и промахов.
+    Эпоха отличает счётчики версий разных экземпляров хранилища: после перезапуска
+    бэкенда в памяти версии начинаются заново, и без эпохи ETag могли бы совпасть.
+    Для общего бэкенда всем воркерам следует передавать одинаковую эпоху
+    """
+    def __init__(self, backend: CacheBackend, epoch: Optional[str] = None):
+        self.backend = backend
+        self.epoch = epoch or uuid.uuid4().hex
+        self.hits = 0
+        self.misses = 0
+
+    def _count(self, value: Any) -> Any:
+        """Учёт обращения к кешу в счётчиках"""
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    @staticmethod
+    def product_key(product_id: int, version: int) -> str:
+        """Ключ карточки товара для версии товара"""
+        return f"products:item:{product_id}:{version}"
+
+    @staticmethod
+    def page_key(version: int, params: ProductListQuery) -> str:
+        """Ключ страницы каталога для версии каталога и параметров запроса"""
+        return f"products:page:{version}:{params.model_dump_json()}"
+
+    async def version(self) -> int:
+        """Текущая версия каталога"""
+        return await self.backend.get_counter(VERSION_KEY)
+
+    async def product_version(self, product_id: int) -> int:
+        """Текущая версия карточки товара"""
+        return await self.backend.get_counter(ITEM_VERSION_KEY.format(product_id))
+
+    async def get_product(self, product_id: int, version: int) -> Optional[Dict]:
+        """Получение закешированной карточки товара"""
+        return self._count(await self.backend.get(self.product_key(product_id, version)))
+
+    async def set_product(self, product: Product, version: int) -> Dict:
+        """
+        Сохранение карточки товара, прочитанной при указанной версии;
+        возвращает сохранённое представление
+        """
+        data = ProductResponse.model_validate(product).model_dump(mode="json")
+        await self.backend.set(self.product_key(product.id, version), data)
+        return data
+
+    async def get_page(self, version: int, params: ProductListQuery) -> Optional[Dict]:
+        """Получение закешированной страницы каталога"""
+        return self._count(await self.backend.get(self.page_key(version, params)))
+
+    async def set_page(self, version: int, params: ProductListQuery, page: Dict):
+        """Сохранение страницы каталога, построенной для указанной версии"""
+        await self.backend.set(self.page_key(version, params), page)
+
+    async def invalidate(self, product_ids: Iterable[int] = ()) -> int:
+        """
+        Переход к новым версиям изменённых товаров и каталога.
+        Возвращает новую версию каталога
+        """
+        for product_id in product_ids:
+            await self.backend.incr(ITEM_VERSION_KEY.format(product_id))
+        return await self.backend.incr(VERSION_KEY)
+
+    async def write_through(self, product: Product) -> Dict:
+        """Обновление карточки изменённого товара и версий после фиксации изменений"""
+        await self.invalidate([product.id])
+        return await self.set_product(product, await self.product_version(product.id))
+
+    def stats(self) -> Dict[str, Any]:
+        """Счётчики попаданий и промахов кеша"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0
+        }
+
+    async def clear(self):
+        """Полная очистка кеша и счётчиков"""
+        await self.backend.clear()
+        self.hits = self.misses = 0
+
+
+def mark_products_changed(db: AsyncSession, *product_ids: int):
+    """
+    Регистрация товаров, изменённых в текущей транзакции сессии.
+    Кеш сбрасывается только после фиксации изменений вызовом invalidate_changed_products,
+    иначе параллельный запрос мог бы снова закешировать незафиксированные данные
+    """
+    db.info.setdefault(CHANGED_PRODUCTS_KEY, set()).update(product_ids)
+
+
+async def invalidate_changed_products(db: AsyncSession):
+    """Инвалидация кеша по товарам, изменённым в зафиксированной транзакции"""
+    product_ids = db.info.pop(CHANGED_PRODUCTS_KEY, None)
+    if product_ids:
+        await product_cache.invalidate(product_ids)
+
+
+product_cache = ProductCache(MemoryCacheBackend(
+    max_size=settings.PRODUCT_CACHE_SIZE,
+    ttl=settings.PRODUCT_CACHE_TTL_SECONDS
+))
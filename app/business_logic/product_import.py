@@ -0,0 +1,198 @@
+"""
+Модуль пакетного импорта товаров из NDJSON или CSV.
+Каждая строка проверяется схемой ProductCreate; корректные строки
+записываются порциями по IMPORT_CHUNK_SIZE: одна выборка существующих товаров
+по названиям, одно пакетное обновление и одна пакетная вставка (executemany) на порцию.
+Остаток из файла задаётся явно, поэтому не перенесённые изменения остатка
+обновлённых товаров из журнала движения удаляются.
+Чтение файла, разбор и проверка строк выполняются порциями в пуле потоков,
+чтобы не блокировать цикл событий; файл не в UTF-8 отклоняется исключением ImportFileError.
+Товар с уже существующим названием обновляется, при нескольких товарах с одним
+названием обновляется товар с наименьшим id. Ошибки сообщаются с номером строки.
+
+Таблица похожести для небольших импортов обновляется инкрементально в той же транзакции.
+Для крупных импортов её полный пересчёт квадратичен по размеру каталога, поэтому
+он выполняется после фиксации товаров отдельной задачей (rebuild_similarity_job):
+до его завершения рекомендации строятся по индексу ингредиентов
+"""
+import csv
+import json
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Set, Tuple
+from fastapi.concurrency import run_in_threadpool
+from pydantic import ValidationError
+from sqlalchemy import func, insert, update
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.config import settings
+from app.database import async_session
+from app.models.product import Product
+from app.schemas.product_schema import CatalogFileFormat, ProductCreate
+from app.business_logic.ingredient_index import replace_ingredients_bulk
+from app.business_logic.similarity import rebuild_similarity, refresh_products_similarity
+from app.business_logic.product_cache import product_cache
+from app.business_logic.stock_ledger import discard_stock_movements
+
+
+class ImportFileError(ValueError):
+    """Файл импорта не может быть прочитан целиком (например, не в кодировке UTF-8)"""
+
+
+class ImportReport:
+    """Итоги импорта: количество добавленных и обновлённых товаров и ошибки по строкам"""
+    def __init__(self):
+        self.inserted = 0
+        self.updated = 0
+        self.failed = 0
+        self.errors: List[Dict] = []
+        self.product_ids: Set[int] = set()
+        self.similarity_rebuild_required = False
+
+    def add_error(self, line: int, errors: List[str]):
+        """Регистрация ошибки строки; в отчёт попадают первые IMPORT_MAX_REPORTED_ERRORS"""
+        self.failed += 1
+        if len(self.errors) < settings.IMPORT_MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "errors": errors})
+
+    def as_dict(self) -> Dict:
+        """Представление отчёта для ответа API"""
+        return {
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "failed": self.failed,
+            "errors": self.errors,
+        }
+
+
+def _format_errors(exc: ValidationError) -> List[str]:
+    """Краткое описание ошибок валидации строки"""
+    return [
+        f"{'.'.join(map(str, error['loc'])) or 'row'}: {error['msg']}"
+        for error in exc.errors()
+    ]
+
+
+def parse_ndjson(lines: Iterable[str]) -> Iterator[Tuple[int, object]]:
+    """Разбор NDJSON: пары (номер строки, объект); пустые строки пропускаются"""
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield number, json.loads(line)
+        except json.JSONDecodeError as exc:
+            yield number, ValueError(f"Некорректный JSON: {exc.msg}")
+
+
+def parse_csv(lines: Iterable[str]) -> Iterator[Tuple[int, object]]:
+    """
+    Разбор CSV с заголовком в формате выгрузки каталога.
+    Ингредиенты ожидаются JSON-массивом, пустое описание считается отсутствующим
+    """
+    reader = csv.DictReader(lines)
+    for row in reader:
+        row.pop("id", None)
+        row.pop(None, None)
+        if not row.get("description"):
+            row["description"] = None
+        try:
+            row["ingredients"] = json.loads(row.get("ingredients") or "null")
+        except json.JSONDecodeError:
+            yield reader.line_num, ValueError("ingredients: ожидается JSON-массив")
+            continue
+        yield reader.line_num, row
+
+
+def validate_rows(rows: Iterable[Tuple[int, object]],
+                  report: ImportReport) -> Iterator[Tuple[int, ProductCreate]]:
+    """Проверка разобранных строк схемой ProductCreate с записью ошибок в отчёт"""
+    for number, row in rows:
+        if isinstance(row, ValueError):
+            report.add_error(number, [str(row)])
+            continue
+        try:
+            yield number, ProductCreate.model_validate(row)
+        except ValidationError as exc:
+            report.add_error(number, _format_errors(exc))
+
+
+async def read_rows(rows: Iterator[Tuple[int, ProductCreate]],
+                    size: int) -> List[Tuple[int, ProductCreate]]:
+    """
+    Чтение, разбор и проверка следующей порции строк файла в пуле потоков.
+    Пустой список означает конец файла
+    """
+    try:
+        return await run_in_threadpool(lambda: list(islice(rows, size)))
+    except UnicodeDecodeError as exc:
+        raise ImportFileError("Файл должен быть в кодировке UTF-8") from exc
+
+
+async def _upsert_chunk(db: AsyncSession, chunk: Dict[str, ProductCreate],
+                        report: ImportReport):
+    """Запись порции товаров, уникальных по названию, и обновление индекса ингредиентов"""
+    existing = dict((await db.exec(
+        select(Product.name, func.min(Product.id))
+        .where(Product.name.in_(list(chunk))) # pylint: disable=no-member
+        .group_by(Product.name)
+    )).all())
+
+    updates = [{"id": existing[name], **product.model_dump()}
+               for name, product in chunk.items() if name in existing]
+    inserts = [product.model_dump() for name, product in chunk.items() if name not in existing]
+
+    if updates:
+        await db.exec(update(Product), params=updates)
+        await discard_stock_movements(db, [row["id"] for row in updates])
+    if inserts:
+        await db.exec(insert(Product), params=inserts)
+        existing.update((await db.exec(
+            select(Product.name, func.max(Product.id))
+            .where(Product.name.in_([row["name"] for row in inserts])) # pylint: disable=no-member
+            .group_by(Product.name)
+        )).all())
+
+    await replace_ingredients_bulk(
+        db, {existing[name]: product.ingredients for name, product in chunk.items()}
+    )
+    report.updated += len(updates)
+    report.inserted += len(inserts)
+    report.product_ids.update(existing[name] for name in chunk)
+
+
+async def import_products(db: AsyncSession, lines: Iterable[str],
+                          import_format: CatalogFileFormat) -> ImportReport:
+    """
+    Импорт товаров из строк файла в одной транзакции.
+    После фиксации изменений сбрасывается кеш каталога. Если изменено больше
+    SIMILARITY_INCREMENTAL_LIMIT товаров, в отчёте устанавливается признак
+    similarity_rebuild_required, и вызывающая сторона запускает rebuild_similarity_job
+    """
+    report = ImportReport()
+    parser = parse_csv if import_format == CatalogFileFormat.CSV else parse_ndjson
+    rows = validate_rows(parser(lines), report)
+    chunk: Dict[str, ProductCreate] = {}
+    while batch := await read_rows(rows, settings.IMPORT_CHUNK_SIZE):
+        for _, product in batch:
+            chunk.pop(product.name, None)
+            chunk[product.name] = product
+            if len(chunk) >= settings.IMPORT_CHUNK_SIZE:
+                await _upsert_chunk(db, chunk, report)
+                chunk = {}
+    if chunk:
+        await _upsert_chunk(db, chunk, report)
+
+    if len(report.product_ids) > settings.SIMILARITY_INCREMENTAL_LIMIT:
+        report.similarity_rebuild_required = True
+    elif report.product_ids:
+        await refresh_products_similarity(db, report.product_ids)
+    await db.commit()
+    if report.product_ids:
+        await product_cache.invalidate(report.product_ids)
+    return report
+
+
+async def rebuild_similarity_job():
+    """Полный пересчёт таблицы похожести в отдельной сессии и транзакции"""
+    async with async_session() as db:
+        await rebuild_similarity(db)
+        await db.commit()
@@ -1,10 +1,18 @@
 """
 Модуль системы рекомендаций для замены товаров при недостатке запасов
 """
-from typing import List, Dict
-from sqlalchemy.orm import Session
-from app.models.product import Product
-from app.models.order import Order
+from collections import defaultdict
+from typing import Callable, List, Dict, Set, Tuple
+from sqlalchemy.orm import aliased
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.models.product import Product, ProductSimilarity
+from app.business_logic.stock import exec_with_stock, select_with_stock, stock_expression
+
+MAX_RECOMMENDATIONS = 3
+# Глубина выборки кандидатов на товар при пакетном подборе: часть кандидатов
+# может уже входить в рекомендации этого товара
+CANDIDATE_DEPTH = 2 * MAX_RECOMMENDATIONS
 
 class RecommendationEngine:
     """
@@ -15,48 +23,102 @@ class RecommendationEngine:
     - Формирование структурированных рекомендаций
     - Анализ заказов на предмет дефицитных позиций
     """
-    def __init__(self, db: Session):
+    def __init__(self, db: AsyncSession):
         self.db = db
 
-    def find_alternatives(self, original_product_id: int,
-                          excluded_ids: List[int] = None) -> List[Product]:
+    async def find_alternatives(self, original_product_id: int,
+                                excluded_ids: List[int] = None) -> List[Product]:
         """
         Поиск альтернативных товаров для замены.
 
-        Алгоритм работы:
-        1. Поиск товаров из той же категории
-        2. Ранжирование по количеству общих ингредиентов
-        3. Добавление дополнительных товаров при недостатке рекомендаций
+        Основной источник — предрассчитанная таблица product_similarity,
+        к которой при запросе применяется только фильтр наличия на складе.
+        Если похожих товаров в наличии недостаточно, список дополняется
+        другими товарами той же категории и затем других категорий
         """
-        original_product = self.db.query(Product).get(original_product_id)
-        if not original_product:
-            return []
-
-        same_category = self.db.query(Product).filter(
-            Product.category == original_product.category,
-            Product.id != original_product_id,
-            Product.id.notin_(excluded_ids or []), # pylint: disable=no-member
-            Product.stock > 0
-        ).all()
+        return (await self.find_alternatives_batch(
+            [original_product_id], set(excluded_ids or [])
+        ))[original_product_id]
 
-        ranked_products = []
-        for product in same_category:
-            common_ingredients = set(original_product.ingredients) & set(product.ingredients)
-            ranked_products.append((-len(common_ingredients), product))
+    async def find_alternatives_in_categories(self, recommendations: Dict[int, List[Product]],
+                                              in_stock: Callable):
+        """
+        Дополнение рекомендаций товарами той же категории в порядке id одним запросом
+        для всех товаров, которым их не хватает. Для каждого товара выбирается
+        не больше CANDIDATE_DEPTH первых товаров категории в наличии по индексу
+        (category, id), поэтому стоимость не зависит от размера категории
+        """
+        pending = self._pending(recommendations)
+        if not pending:
+            return
+        original, candidate = aliased(Product), aliased(Product)
+        first_in_category = (
+            select(candidate.id)
+            .where(candidate.category == original.category, *in_stock(candidate))
+            .order_by(candidate.id)
+            .limit(CANDIDATE_DEPTH)
+        )
+        candidates = defaultdict(list)
+        for product_id, product in await exec_with_stock(
+            self.db,
+            select_with_stock(original.id, Product)
+            .select_from(original)
+            .join(Product, Product.id.in_(first_in_category)) # pylint: disable=no-member
+            .where(original.id.in_(pending)) # pylint: disable=no-member
+            .order_by(original.id, Product.id)
+        ):
+            candidates[product_id].append(product)
+        self._extend(recommendations, candidates)
 
-        ranked_products.sort(key=lambda x: x[0])
+    async def find_alternatives_in_catalog(self, recommendations: Dict[int, List[Product]],
+                                           in_stock: Callable):
+        """
+        Дополнение рекомендаций первыми по id товарами каталога в наличии
+        одним запросом для всех товаров, которым их не хватает
+        """
+        pending = self._pending(recommendations)
+        if not pending:
+            return
+        others = await exec_with_stock(
+            self.db,
+            select_with_stock(Product).where(*in_stock(Product)).order_by(Product.id)
+            .limit(CANDIDATE_DEPTH)
+        )
+        self._extend(recommendations, {product_id: others for product_id in pending})
 
-        result = [p[1] for p in ranked_products[:3]]
+    @staticmethod
+    def _pending(recommendations: Dict[int, List[Product]]) -> List[int]:
+        """Товары, которым не хватает рекомендаций"""
+        return [product_id for product_id, recs in recommendations.items()
+                if len(recs) < MAX_RECOMMENDATIONS]
 
-        if len(result) < 3:
-            additional = self.db.query(Product).filter(
-                Product.id.notin_([p.id for p in result] + # pylint: disable=no-member
-                                  [original_product_id] + (excluded_ids or [])),
-                Product.stock > 0
-            ).limit(3 - len(result)).all()
-            result += additional
+    @staticmethod
+    def _extend(recommendations: Dict[int, List[Product]],
+                candidates: Dict[int, List[Product]]):
+        """Дополнение рекомендаций кандидатами, ещё не вошедшими в них"""
+        for product_id, products in candidates.items():
+            recs = recommendations[product_id]
+            chosen = {p.id for p in recs}
+            for product in products:
+                if len(recs) >= MAX_RECOMMENDATIONS:
+                    break
+                if product.id not in chosen:
+                    recs.append(product)
+                    chosen.add(product.id)
 
-        return result[:3]
+    @staticmethod
+    def prepare_recommendations(products: List[Product]) -> List[Dict]:
+        """
+        Форматирование списка рекомендованных товаров
+        """
+        return [
+            {
+                "id": p.id,
+                "name": p.name,
+                "price": p.price,
+                "available_stock": p.stock
+            } for p in products
+        ]
 
     @staticmethod
     def prepare_recommendation_message(products: List[Product]) -> Dict:
@@ -65,24 +127,74 @@ class RecommendationEngine:
         """
         return {
             "detail": "Недостаточно товара на складе",
-            "recommendations": [
-                {
-                    "id": p.id,
-                    "name": p.name,
-                    "price": p.price,
-                    "available_stock": p.stock
-                } for p in products
-            ]
+            "recommendations": RecommendationEngine.prepare_recommendations(products)
         }
 
-    def find_alternatives_for_order(self, order: Order):
+    async def find_alternatives_for_items(
+            self, quantities: Dict[int, int]
+    ) -> Tuple[Dict[int, Product], Dict[int, List[Product]]]:
+        """
+        Пакетный анализ набора позиций {id товара: количество} на предмет дефицита.
+
+        Все товары загружаются одним запросом, альтернативы для всех дефицитных позиций
+        подбираются пакетно (find_alternatives_batch). Товары из анализируемого набора
+        исключаются из рекомендаций для всех позиций сразу.
+        Возвращает загруженные товары и рекомендации для дефицитных позиций
+        """
+        if not quantities:
+            return {}, {}
+
+        products = {p.id: p for p in await exec_with_stock(
+            self.db,
+            select_with_stock(Product).where(Product.id.in_(list(quantities))) # pylint: disable=no-member
+        )}
+        short_ids = [
+            product_id for product_id, quantity in quantities.items()
+            if product_id in products and products[product_id].stock < quantity
+        ]
+        return products, await self.find_alternatives_batch(short_ids, set(quantities))
+
+    async def find_alternatives_batch(self, product_ids: List[int],
+                                      excluded_ids: Set[int]) -> Dict[int, List[Product]]:
         """
-        Анализ всего заказа на предмет дефицитных позиций
+        Подбор альтернатив сразу для нескольких товаров не более чем тремя запросами
+        для всех товаров. Порядок источников:
+        1. Похожие товары той же категории из таблицы похожести
+        2. Остальные товары той же категории в порядке id
+        3. Похожие товары других категорий из таблицы похожести
+        4. Остальные товары каталога в порядке id
+        Товары excluded_ids исключаются из всех рекомендаций
         """
-        recommendations = {}
-        for item in order.items:
-            product = self.db.query(Product).get(item.product_id)
-            if product.stock < item.quantity:
-                recs = self.find_alternatives(item.product_id)
-                recommendations[item.product_id] = recs
+        recommendations = {product_id: [] for product_id in product_ids}
+        if not recommendations:
+            return recommendations
+
+        excluded = set(excluded_ids) | set(product_ids)
+
+        def in_stock(product) -> tuple:
+            return product.id.notin_(excluded), stock_expression(product) > 0
+
+        original = aliased(Product)
+        same_category, other_categories = defaultdict(list), defaultdict(list)
+        for product_id, same, product in await exec_with_stock(
+            self.db,
+            select_with_stock(
+                ProductSimilarity.product_id,
+                (Product.category == original.category).label("same_category"),
+                Product
+            )
+            .join(Product, Product.id == ProductSimilarity.similar_id)
+            .join(original, original.id == ProductSimilarity.product_id)
+            .where(
+                ProductSimilarity.product_id.in_(list(recommendations)), # pylint: disable=no-member
+                *in_stock(Product)
+            )
+            .order_by(ProductSimilarity.product_id, ProductSimilarity.score.desc(), Product.id)
+        ):
+            (same_category if same else other_categories)[product_id].append(product)
+
+        self._extend(recommendations, same_category)
+        await self.find_alternatives_in_categories(recommendations, in_stock)
+        self._extend(recommendations, other_categories)
+        await self.find_alternatives_in_catalog(recommendations, in_stock)
         return recommendations
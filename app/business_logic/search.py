@@ -0,0 +1,60 @@
+"""
+Модуль полнотекстового поиска товаров по названию, описанию и ингредиентам.
+В SQLite используется таблица FTS5 products_fts, в PostgreSQL — столбец
+products.search_vector типа tsvector; оба поддерживаются триггерами из миграции.
+Каждое слово запроса ищется как префикс, слова объединяются по И.
+Результаты упорядочены по релевантности (bm25 / ts_rank_cd) и id
+"""
+import re
+from typing import List
+from sqlalchemy import column, func, literal_column, table, tuple_
+from sqlmodel import select
+from app.business_logic.pagination import decode_cursor
+from app.business_logic.stock import stock_expression
+from app.database import is_sqlite
+from app.models.product import Product
+
+SEARCH_TABLE = "products_fts"
+SEARCH_VECTOR_COLUMN = "search_vector"
+TOKEN_PATTERN = re.compile(r"\w+")
+
+products_fts = table(SEARCH_TABLE, column("rowid"), column("rank"))
+
+
+def tokenize(text: str) -> List[str]:
+    """Выделение слов запроса; регистр приводится СУБД при сравнении"""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def build_search_query(text: str, limit: int, cursor: str = None):
+    """
+    Построение запроса страницы результатов поиска.
+    Оценка score возрастает с уменьшением релевантности, поэтому курсор
+    продолжает выдачу строго после пары (score, id) последней записи.
+    Возвращает None, если в запросе нет слов
+    """
+    tokens = tokenize(text)
+    if not tokens:
+        return None
+
+    columns = (Product.id, Product.name, Product.price, stock_expression().label("stock"))
+    if is_sqlite():
+        score = products_fts.c.rank
+        query = (
+            select(*columns, score.label("score"))
+            .select_from(products_fts)
+            .join(Product, Product.id == products_fts.c.rowid)
+            .where(literal_column(SEARCH_TABLE).op("MATCH")(
+                " ".join(f'"{token}"*' for token in tokens)
+            ))
+        )
+    else:
+        vector = literal_column(f"products.{SEARCH_VECTOR_COLUMN}")
+        ts_query = func.to_tsquery("simple", " & ".join(f"{token}:*" for token in tokens))
+        score = -func.ts_rank_cd(vector, ts_query)
+        query = select(*columns, score.label("score")).where(vector.op("@@")(ts_query))
+
+    if cursor:
+        last_score, last_id = decode_cursor(cursor, 2, (float, int))
+        query = query.where(tuple_(score, Product.id) > tuple_(last_score, last_id))
+    return query.order_by(score, Product.id).limit(limit + 1)
@@ -0,0 +1,337 @@
+"""
+Модуль расчёта матрицы похожести товаров.
+
+Похожесть двух товаров с общими ингредиентами — коэффициент Жаккара по множествам
+ингредиентов плюс бонус за совпадение категории (бонус больше 1 гарантирует,
+что товары той же категории всегда ранжируются выше товаров других категорий).
+Товары без общих ингредиентов не похожи и в таблицу не попадают: товары той же
+категории без общих ингредиентов подбирает запасной поиск рекомендаций.
+Для каждого товара в таблице product_similarity хранятся SIMILARITY_TOP_K
+наиболее похожих товаров; при изменении каталога пересчитываются только строки,
+на которые повлияло изменение.
+
+Поэтому при изменении товара загружается не весь каталог и не вся категория,
+а товары с общими ингредиентами (по индексу product_ingredients). Оценки каждого
+товара считаются разреженно по инвертированному индексу (списки товаров каждого
+ингредиента), только для товаров с общими ингредиентами
+"""
+import asyncio
+from dataclasses import dataclass, field
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+import numpy as np
+from sqlalchemy import func, insert, or_
+from sqlmodel import delete, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.config import settings
+from app.models.product import Product, ProductIngredient, ProductSimilarity
+
+# Наибольшее число id в одном списке IN: меньше ограничения числа параметров запроса
+# SQLite (32766) и asyncpg (32767), чтобы окрестность популярного ингредиента
+# читалась одним запросом, а не повторяющимися запросами по частям
+CHUNK_SIZE = 10000
+SCORE_TOLERANCE = 1e-6
+
+
+@dataclass
+class CatalogMatrix:
+    """
+    Разреженное представление каталога: инвертированный индекс ингредиентов
+    (позиции товаров для каждого ингредиента) и коды категорий товаров
+    """
+    ids: np.ndarray
+    categories: np.ndarray
+    postings: List[np.ndarray]
+    product_ingredients: List[np.ndarray]
+    sizes: np.ndarray
+    positions: Dict[int, int] = field(default_factory=dict)
+
+
+def build_catalog_matrix(rows: Iterable[Tuple[int, str, Sequence[str]]]) -> CatalogMatrix:
+    """Построение матрицы каталога из строк (id, категория, ингредиенты)"""
+    rows = list(rows)
+    vocabulary: Dict[str, int] = {}
+    category_codes: Dict[str, int] = {}
+    product_ingredients = []
+    postings: List[List[int]] = []
+    for position, (_, _, ingredients) in enumerate(rows):
+        codes = [vocabulary.setdefault(name, len(vocabulary))
+                 for name in dict.fromkeys(ingredients or [])]
+        for code in codes:
+            if code == len(postings):
+                postings.append([])
+            postings[code].append(position)
+        product_ingredients.append(np.array(codes, dtype=np.int64))
+
+    ids = np.array([row[0] for row in rows], dtype=np.int64)
+    return CatalogMatrix(
+        ids=ids,
+        categories=np.array(
+            [category_codes.setdefault(row[1], len(category_codes)) for row in rows],
+            dtype=np.int64
+        ),
+        postings=[np.array(positions, dtype=np.int64) for positions in postings],
+        product_ingredients=product_ingredients,
+        sizes=np.array([len(codes) for codes in product_ingredients], dtype=np.float32),
+        positions={int(product_id): position for position, product_id in enumerate(ids)}
+    )
+
+
+def score_row(matrix: CatalogMatrix, position: int,
+              category_boost: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Ненулевые оценки похожести товара с позицией position: позиции товаров
+    с общими ингредиентами и их оценки, округлённые до 6 знаков.
+    Число общих ингредиентов получается подсчётом позиций в списках товаров
+    ингредиентов товара, поэтому стоимость пропорциональна числу вхождений
+    этих ингредиентов, а не размеру каталога или категории
+    """
+    codes = matrix.product_ingredients[position]
+    if codes.size == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+    candidates, shared = np.unique(
+        np.concatenate([matrix.postings[code] for code in codes]), return_counts=True
+    )
+    keep = candidates != position
+    candidates, shared = candidates[keep], shared[keep]
+    scores = shared / (matrix.sizes[position] + matrix.sizes[candidates] - shared)
+    scores += category_boost * (matrix.categories[candidates] == matrix.categories[position])
+    return candidates, np.round(scores, 6)
+
+
+def top_k_rows(matrix: CatalogMatrix, positions: Iterable[int], top_k: int,
+               category_boost: float) -> List[Dict]:
+    """
+    Отбор top_k наиболее похожих товаров для каждого товара из positions.
+    При равенстве оценок предпочтение отдаётся товару с меньшим id
+    """
+    result = []
+    for position in positions:
+        candidates, scores = score_row(matrix, position, category_boost)
+        best = np.lexsort((matrix.ids[candidates], -scores))[:top_k]
+        product_id = int(matrix.ids[position])
+        result += [
+            {"product_id": product_id, "similar_id": int(matrix.ids[candidates[index]]),
+             "score": float(scores[index])}
+            for index in best
+        ]
+    return result
+
+
+def _chunks(values: Sequence, size: int = CHUNK_SIZE):
+    """Разбиение последовательности на части для запросов с IN"""
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+async def load_catalog_matrix(db: AsyncSession) -> CatalogMatrix:
+    """Загрузка всего каталога из БД для полного пересчёта похожести"""
+    query = select(Product.id, Product.category, Product.ingredients)
+    return build_catalog_matrix((await db.exec(query.order_by(Product.id))).all())
+
+
+async def load_neighbourhood(db: AsyncSession, product_ids: Iterable[int],
+                             excluded_id: Optional[int] = None) -> CatalogMatrix:
+    """
+    Загрузка товаров product_ids и всех товаров, похожесть с которыми ненулевая, —
+    товаров с общими ингредиентами (по индексу ингредиентов). Списки похожих товаров
+    product_ids, рассчитанные по окрестности, совпадают с рассчитанными по всему каталогу
+    """
+    rows = {}
+    for chunk in _chunks(sorted(product_ids)):
+        ingredients = select(ProductIngredient.ingredient).where(
+            ProductIngredient.product_id.in_(chunk) # pylint: disable=no-member
+        )
+        sharing = select(ProductIngredient.product_id).where(
+            ProductIngredient.ingredient.in_(ingredients) # pylint: disable=no-member
+        )
+        query = select(Product.id, Product.category, Product.ingredients).where(or_(
+            Product.id.in_(chunk), # pylint: disable=no-member
+            Product.id.in_(sharing) # pylint: disable=no-member
+        ))
+        if excluded_id is not None:
+            query = query.where(Product.id != excluded_id)
+        rows.update((row[0], row) for row in (await db.exec(query)).all())
+    return build_catalog_matrix(rows[product_id] for product_id in sorted(rows))
+
+
+async def _compute_rows(matrix: CatalogMatrix, product_ids: List[int]) -> List[Dict]:
+    """Расчёт строк таблицы похожести для указанных товаров в отдельном потоке"""
+    positions = [matrix.positions[pid] for pid in product_ids if pid in matrix.positions]
+    return await asyncio.to_thread(
+        top_k_rows, matrix, positions, settings.SIMILARITY_TOP_K,
+        settings.SIMILARITY_CATEGORY_BOOST
+    )
+
+
+async def _insert_rows(db: AsyncSession, rows: List[Dict]):
+    """Пакетная вставка строк таблицы похожести"""
+    for chunk in _chunks(rows, CHUNK_SIZE):
+        await db.exec(insert(ProductSimilarity), params=chunk)
+
+
+async def _replace_rows(db: AsyncSession, product_ids: List[int], rows: List[Dict]):
+    """Замена строк таблицы похожести указанных товаров"""
+    for chunk in _chunks(product_ids):
+        await db.exec(delete(ProductSimilarity).where(
+            ProductSimilarity.product_id.in_(chunk) # pylint: disable=no-member
+        ))
+    await _insert_rows(db, rows)
+
+
+async def _recompute_rows(db: AsyncSession, matrix: CatalogMatrix, product_ids: Set[int]):
+    """Пересчёт и замена строк таблицы похожести для указанных товаров"""
+    product_ids = sorted(product_ids)
+    await _replace_rows(db, product_ids, await _compute_rows(matrix, product_ids))
+
+
+async def rebuild_similarity(db: AsyncSession):
+    """
+    Полный пересчёт таблицы похожести по всему каталогу.
+    Таблица очищается только после расчёта, чтобы не удерживать блокировку записи
+    на время вычислений
+    """
+    matrix = await load_catalog_matrix(db)
+    rows = await _compute_rows(matrix, matrix.ids.tolist())
+    await db.exec(delete(ProductSimilarity))
+    await _insert_rows(db, rows)
+
+
+def candidate_scores(matrix: CatalogMatrix,
+                     positions: Sequence[int]) -> Dict[int, Dict[int, float]]:
+    """
+    Ненулевые оценки похожести товаров из positions с остальными товарами матрицы:
+    {id товара матрицы: {id товара из positions: оценка}}
+    """
+    result: Dict[int, Dict[int, float]] = defaultdict(dict)
+    for position in positions:
+        product_id = int(matrix.ids[position])
+        candidates, scores = score_row(matrix, position, settings.SIMILARITY_CATEGORY_BOOST)
+        for candidate, score in zip(matrix.ids[candidates].tolist(), scores.tolist()):
+            result[candidate][product_id] = score
+    return result
+
+
+async def _load_thresholds(db: AsyncSession,
+                           product_ids: List[int]) -> Dict[int, Tuple[int, float]]:
+    """Число похожих товаров и наименьшая оценка в списке каждого из товаров"""
+    thresholds = {}
+    for chunk in _chunks(product_ids):
+        thresholds.update({
+            row.product_id: (row.entries, row.min_score) for row in (await db.exec(
+                select(
+                    ProductSimilarity.product_id,
+                    func.count().label("entries"), # pylint: disable=not-callable
+                    func.min(ProductSimilarity.score).label("min_score")
+                )
+                .where(ProductSimilarity.product_id.in_(chunk)) # pylint: disable=no-member
+                .group_by(ProductSimilarity.product_id)
+            )).all()
+        })
+    return thresholds
+
+
+async def _load_entries(db: AsyncSession, product_ids: List[int]) -> Dict[int, Dict[int, float]]:
+    """Текущие списки похожих товаров: {id товара: {id похожего товара: оценка}}"""
+    entries: Dict[int, Dict[int, float]] = defaultdict(dict)
+    for chunk in _chunks(product_ids):
+        for row in (await db.exec(
+            select(ProductSimilarity)
+            .where(ProductSimilarity.product_id.in_(chunk)) # pylint: disable=no-member
+        )).all():
+            entries[row.product_id][row.similar_id] = row.score
+    return entries
+
+
+async def _listing_products(db: AsyncSession, product_ids: Set[int]) -> Set[int]:
+    """Товары, в списках похожих которых есть товары product_ids"""
+    listing = set()
+    for chunk in _chunks(sorted(product_ids)):
+        listing.update((await db.exec(
+            select(ProductSimilarity.product_id)
+            .where(ProductSimilarity.similar_id.in_(chunk)) # pylint: disable=no-member
+        )).all())
+    return listing
+
+
+async def _accepted_candidates(db: AsyncSession,
+                               offers: Dict[int, Dict[int, float]]) -> List[int]:
+    """
+    Товары, в списки похожих которых проходит хотя бы одна из новых оценок:
+    список неполон или оценка не ниже наименьшей оценки списка
+    """
+    thresholds = await _load_thresholds(db, sorted(offers))
+    accepted = []
+    for candidate in sorted(offers):
+        entries, min_score = thresholds.get(candidate, (0, 0.0))
+        if (entries < settings.SIMILARITY_TOP_K
+                or max(offers[candidate].values()) >= min_score - SCORE_TOLERANCE):
+            accepted.append(candidate)
+    return accepted
+
+
+async def _merge_changed_products(db: AsyncSession, matrix: CatalogMatrix,
+                                  changed: Set[int], recomputed: Set[int]):
+    """
+    Включение изменённых товаров в списки похожих товаров, которые не пересчитываются
+    целиком. Изменённых товаров в этих списках нет, а оценки остальных товаров
+    не изменились, поэтому новый список — лучшие SIMILARITY_TOP_K из текущего списка
+    и новых оценок. Списки, в которые новые оценки не проходят, не загружаются
+    """
+    positions = [matrix.positions[pid] for pid in sorted(changed) if pid in matrix.positions]
+    offers = {
+        candidate: scores for candidate, scores in
+        (await asyncio.to_thread(candidate_scores, matrix, positions)).items()
+        if candidate not in recomputed
+    }
+    accepted = await _accepted_candidates(db, offers)
+    if not accepted:
+        return
+
+    current = await _load_entries(db, accepted)
+    rows = []
+    for candidate in accepted:
+        merged = {**current[candidate], **offers[candidate]}
+        best = sorted(merged.items(), key=lambda entry: (-entry[1], entry[0]))
+        best = best[:settings.SIMILARITY_TOP_K]
+        rows += [{"product_id": candidate, "similar_id": similar_id, "score": score}
+                 for similar_id, score in best]
+    await _replace_rows(db, accepted, rows)
+
+
+async def refresh_product_similarity(db: AsyncSession, product_id: int):
+    """
+    Инкрементальное обновление таблицы похожести после создания товара
+    или изменения его ингредиентов либо категории.
+    Изменения выполняются в текущей транзакции сессии
+    """
+    await refresh_products_similarity(db, [product_id])
+
+
+async def refresh_products_similarity(db: AsyncSession, product_ids: Iterable[int]):
+    """
+    Инкрементальное обновление таблицы похожести после изменения нескольких товаров.
+    Списки изменённых товаров и товаров, в списках которых они были, пересчитываются
+    по окрестности этих товаров; в списки остальных товаров окрестности изменённые
+    товары добавляются слиянием с текущим списком
+    """
+    changed = set(product_ids)
+    recomputed = changed | await _listing_products(db, changed)
+    matrix = await load_neighbourhood(db, recomputed)
+    await _recompute_rows(db, matrix, recomputed)
+    await _merge_changed_products(db, matrix, changed, recomputed)
+
+
+async def remove_product_similarity(db: AsyncSession, product_id: int):
+    """
+    Исключение товара из таблицы похожести перед его удалением:
+    удаляются ссылающиеся на товар строки, списки затронутых товаров пересчитываются
+    по их окрестности без удаляемого товара
+    """
+    affected = await _listing_products(db, {product_id}) - {product_id}
+    await db.exec(delete(ProductSimilarity).where(
+        (ProductSimilarity.product_id == product_id) | (ProductSimilarity.similar_id == product_id)
+    ))
+    if affected:
+        matrix = await load_neighbourhood(db, affected, excluded_id=product_id)
+        await _recompute_rows(db, matrix, affected)
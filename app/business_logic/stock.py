@@ -0,0 +1,178 @@
+"""
+Модуль атомарного резервирования и возврата товара на склад.
+Остаток изменяется одним условным UPDATE без чтения значения в Python,
+поэтому параллельные оформления заказов не приводят к продаже сверх остатка.
+При включённом STOCK_LEDGER_ENABLED изменения записываются в журнал движения
+товаров (модуль stock_ledger) без изменения строки товара, а чтение остатка
+в каталоге, поиске, выгрузке, проверке наличия и рекомендациях выполняется
+через stock_expression, select_with_stock и exec_with_stock — по сжатому
+остатку и журналу
+"""
+from typing import Dict, List, Optional
+from sqlalchemy import Row, case, func, update
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.util import identity_key
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.config import settings
+from app.models.order import OrderItem
+from app.models.product import Product
+from app.business_logic.product_cache import mark_products_changed
+from app.business_logic.stock_ledger import \
+    (append_orders_release, append_release, append_reservation, append_reservations,
+     available_stock)
+
+
+def stock_expression(product=Product):
+    """
+    Выражение остатка товара для чтения: в режиме журнала — доступный остаток
+    с учётом не перенесённых изменений, иначе products.stock.
+    product — модель Product или её псевдоним в запросе
+    """
+    return available_stock(product) if settings.STOCK_LEDGER_ENABLED else product.stock
+
+
+def select_with_stock(*entities):
+    """
+    Запрос, выбирающий объекты Product (и другие столбцы entities). В режиме журнала
+    последним столбцом выбирается доступный остаток для exec_with_stock
+    """
+    if settings.STOCK_LEDGER_ENABLED:
+        return select(*entities, available_stock())
+    return select(*entities)
+
+
+async def exec_with_stock(db: AsyncSession, query) -> list:
+    """
+    Выполнение запроса, построенного select_with_stock. В режиме журнала доступный
+    остаток записывается в загруженные объекты Product вместо сжатого остатка.
+    Строки возвращаются в том же виде, что и без журнала
+    """
+    if not settings.STOCK_LEDGER_ENABLED:
+        return list((await db.exec(query)).all())
+    rows = []
+    for *row, stock in (await db.exec(query)).all():
+        product = next(value for value in row if isinstance(value, Product))
+        set_committed_value(product, "stock", stock)
+        rows.append(row[0] if len(row) == 1 else tuple(row))
+    return rows
+
+
+async def load_product(db: AsyncSession, product_id: int) -> Optional[Product]:
+    """
+    Загрузка товара с доступным остатком. Уже загруженный в сессию объект
+    перечитывается из БД
+    """
+    rows = await exec_with_stock(db, select_with_stock(Product).where(Product.id == product_id)
+                                 .execution_options(populate_existing=True))
+    return rows[0] if rows else None
+
+
+def _sync_loaded_stock(db: AsyncSession, product_id: int, stock: Optional[int]):
+    """
+    Обновление остатка у объекта товара, уже загруженного в сессию,
+    и регистрация товара для сброса кеша каталога после фиксации транзакции
+    """
+    if stock is None:
+        return
+    mark_products_changed(db, product_id)
+    product = db.identity_map.get(identity_key(Product, product_id))
+    if product is not None:
+        set_committed_value(product, "stock", stock)
+
+
+async def reserve_product(db: AsyncSession, product_id: int, quantity: int) -> Optional[Row]:
+    """
+    Резервирование товара: UPDATE products SET stock = stock - :q
+    WHERE id = :id AND stock >= :q RETURNING stock, name, price.
+    Возвращает строку с остатком, названием и ценой (в режиме журнала — без остатка)
+    для снимка в позиции заказа
+    или None, если товара нет или его недостаточно на складе
+    """
+    if settings.STOCK_LEDGER_ENABLED:
+        return await append_reservation(db, product_id, quantity)
+    row = (await db.exec(
+        update(Product)
+        .where(Product.id == product_id, Product.stock >= quantity)
+        .values(stock=Product.stock - quantity)
+        .returning(Product.stock, Product.name, Product.price)
+        .execution_options(synchronize_session=False)
+    )).one_or_none()
+    _sync_loaded_stock(db, product_id, row.stock if row else None)
+    return row
+
+
+async def reserve_products(db: AsyncSession, quantities: Dict[int, int]) -> Dict[int, Row]:
+    """
+    Резервирование нескольких товаров {id товара: количество} одним UPDATE:
+    остаток каждого товара уменьшается на его количество (CASE по id),
+    если товара достаточно на складе. Возвращает строки с id, остатком, названием
+    и ценой зарезервированных товаров (в режиме журнала — без остатка);
+    товаров, которых нет или недостаточно, в результате нет
+    """
+    if not quantities:
+        return {}
+    if settings.STOCK_LEDGER_ENABLED:
+        return await append_reservations(db, quantities)
+    requested = case(quantities, value=Product.id)
+    rows = (await db.exec(
+        update(Product)
+        .where(Product.id.in_(list(quantities)), Product.stock >= requested) # pylint: disable=no-member
+        .values(stock=Product.stock - requested)
+        .returning(Product.id, Product.stock, Product.name, Product.price)
+        .execution_options(synchronize_session=False)
+    )).all()
+    for row in rows:
+        _sync_loaded_stock(db, row.id, row.stock)
+    return {row.id: row for row in rows}
+
+
+async def reserve_stock(db: AsyncSession, product_id: int, quantity: int) -> bool:
+    """
+    Резервирование товара без получения его данных.
+    Возвращает False, если товара нет или его недостаточно на складе
+    """
+    return await reserve_product(db, product_id, quantity) is not None
+
+
+async def release_stock(db: AsyncSession, product_id: int, quantity: int):
+    """Возврат зарезервированного товара на склад"""
+    if settings.STOCK_LEDGER_ENABLED:
+        await append_release(db, product_id, quantity)
+        return
+    stock = (await db.exec(
+        update(Product)
+        .where(Product.id == product_id)
+        .values(stock=Product.stock + quantity)
+        .returning(Product.stock)
+        .execution_options(synchronize_session=False)
+    )).scalar_one_or_none()
+    _sync_loaded_stock(db, product_id, stock)
+
+
+async def release_orders_stock(db: AsyncSession, order_ids: List[int]) -> List[int]:
+    """
+    Возврат на склад всех товаров позиций указанных заказов одним UPDATE:
+    остаток каждого товара увеличивается на суммарное количество в этих заказах
+    (коррелированный подзапрос). Возвращает id товаров, остаток которых изменился
+    """
+    if not order_ids:
+        return []
+    if settings.STOCK_LEDGER_ENABLED:
+        return await append_orders_release(db, order_ids)
+    in_orders = OrderItem.order_id.in_(order_ids) # pylint: disable=no-member
+    released = (
+        select(func.sum(OrderItem.quantity))
+        .where(in_orders, OrderItem.product_id == Product.id)
+        .scalar_subquery()
+    )
+    rows = (await db.exec(
+        update(Product)
+        .where(Product.id.in_(select(OrderItem.product_id).where(in_orders))) # pylint: disable=no-member
+        .values(stock=Product.stock + released)
+        .returning(Product.id, Product.stock)
+        .execution_options(synchronize_session=False)
+    )).all()
+    for product_id, stock in rows:
+        _sync_loaded_stock(db, product_id, stock)
+    return [product_id for product_id, _ in rows]
@@ -0,0 +1,206 @@
+"""
+Модуль журнала движения товаров (режим STOCK_LEDGER_ENABLED).
+Резервирование и возврат товара не изменяют строку товара, а добавляют запись
+в stock_movements, поэтому параллельные заказы популярного товара не обновляют
+одну и ту же строку. Доступный остаток равен сжатому остатку products.stock
+плюс сумма ещё не перенесённых изменений товара.
+
+Резервирование добавляет запись одним INSERT ... SELECT с условием на доступный
+остаток, поэтому продажа сверх остатка исключена. В SQLite запись в БД выполняется
+последовательно; в PostgreSQL резервирования одного товара упорядочиваются
+транзакционной рекомендательной блокировкой, которая, в отличие от обновления строки,
+не порождает новых версий строки товара. Возвраты выполняются без блокировок.
+
+Фоновая задача compact_stock_ledger запускается только в этом режиме
+и каждые STOCK_COMPACTION_INTERVAL_SECONDS переносит изменения в products.stock:
+удаляет пакет записей с RETURNING и одним пакетным UPDATE прибавляет их суммы
+к остаткам товаров в той же транзакции, поэтому доступный остаток не меняется
+при сжатии. Каталог, поиск, выгрузка, проверка наличия и рекомендации читают
+доступный остаток (stock.stock_expression), поэтому не отстают от журнала;
+каждая запись в журнал сбрасывает кеш каталога для товара
+"""
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import Row, bindparam, case, delete, func, insert, literal, update
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.config import settings
+from app.database import async_session, is_sqlite
+from app.models.order import OrderItem
+from app.models.product import Product, StockMovement
+from app.business_logic.product_cache import invalidate_changed_products, mark_products_changed
+
+STOCK_LOCK_NAMESPACE = 0x5354
+
+
+def pending_delta(product_id):
+    """Сумма не перенесённых в products.stock изменений остатка товара"""
+    return func.coalesce(
+        select(func.sum(StockMovement.delta))
+        .where(StockMovement.product_id == product_id)
+        .scalar_subquery(),
+        0
+    )
+
+
+def available_stock(product=Product):
+    """
+    Выражение доступного остатка товара: сжатый остаток и изменения из журнала.
+    product — модель Product или её псевдоним в запросе
+    """
+    return product.stock + pending_delta(product.id)
+
+
+async def lock_product_stock(db: AsyncSession, product_id: int):
+    """
+    Рекомендательная блокировка остатка товара до конца транзакции (PostgreSQL).
+    В SQLite не требуется: запись в БД выполняется одной транзакцией одновременно
+    """
+    if not is_sqlite():
+        await db.exec(select(func.pg_advisory_xact_lock(STOCK_LOCK_NAMESPACE, product_id)))
+
+
+async def append_reservation(db: AsyncSession, product_id: int,
+                             quantity: int) -> Optional[Row]:
+    """
+    Резервирование товара записью в журнал: INSERT INTO stock_movements
+    SELECT :id, -:q FROM products WHERE id = :id AND stock + pending >= :q.
+    Возвращает строку с названием и ценой товара для снимка в позиции заказа
+    или None, если товара нет или его недостаточно на складе
+    """
+    await lock_product_stock(db, product_id)
+    reserved = (await db.exec(
+        insert(StockMovement)
+        .from_select(
+            ["product_id", "delta"],
+            select(Product.id, literal(-quantity))
+            .where(Product.id == product_id, available_stock() >= quantity)
+        )
+        .returning(StockMovement.id)
+    )).first()
+    if reserved is None:
+        return None
+    mark_products_changed(db, product_id)
+    return (await db.exec(
+        select(Product.name, Product.price).where(Product.id == product_id)
+    )).one()
+
+
+async def append_reservations(db: AsyncSession, quantities: Dict[int, int]) -> Dict[int, Row]:
+    """
+    Резервирование нескольких товаров {id товара: количество} одним INSERT ... SELECT:
+    запись добавляется для каждого товара, которого достаточно на складе.
+    В PostgreSQL блокировки товаров берутся одним запросом в порядке id.
+    Возвращает строки с id, названием и ценой зарезервированных товаров
+    """
+    product_ids = sorted(quantities)
+    if not is_sqlite():
+        await db.exec(
+            select(func.pg_advisory_xact_lock(STOCK_LOCK_NAMESPACE, Product.id))
+            .where(Product.id.in_(product_ids)) # pylint: disable=no-member
+            .order_by(Product.id)
+        )
+    requested = case(quantities, value=Product.id)
+    reserved = list((await db.exec(
+        insert(StockMovement)
+        .from_select(
+            ["product_id", "delta"],
+            select(Product.id, -requested)
+            .where(Product.id.in_(product_ids), available_stock() >= requested) # pylint: disable=no-member
+        )
+        .returning(StockMovement.product_id)
+    )).scalars())
+    if not reserved:
+        return {}
+    mark_products_changed(db, *reserved)
+    return {row.id: row for row in (await db.exec(
+        select(Product.id, Product.name, Product.price)
+        .where(Product.id.in_(reserved)) # pylint: disable=no-member
+    )).all()}
+
+
+async def append_release(db: AsyncSession, product_id: int, quantity: int):
+    """Возврат товара на склад записью в журнал"""
+    await db.exec(insert(StockMovement).values(product_id=product_id, delta=quantity))
+    mark_products_changed(db, product_id)
+
+
+async def append_orders_release(db: AsyncSession, order_ids: List[int]) -> List[int]:
+    """
+    Возврат товаров позиций указанных заказов одним INSERT ... SELECT
+    с суммой количества по каждому товару. Возвращает id товаров
+    """
+    product_ids = list((await db.exec(
+        insert(StockMovement)
+        .from_select(
+            ["product_id", "delta"],
+            select(OrderItem.product_id, func.sum(OrderItem.quantity))
+            .where(OrderItem.order_id.in_(order_ids)) # pylint: disable=no-member
+            .group_by(OrderItem.product_id)
+        )
+        .returning(StockMovement.product_id)
+    )).scalars())
+    mark_products_changed(db, *product_ids)
+    return product_ids
+
+
+async def discard_stock_movements(db: AsyncSession, product_ids: Iterable[int]):
+    """
+    Удаление не перенесённых изменений остатка товаров. Вызывается, когда остаток
+    задаётся явно (изменение и импорт товара) или товар удаляется
+    """
+    product_ids = list(product_ids)
+    if product_ids:
+        await db.exec(
+            delete(StockMovement)
+            .where(StockMovement.product_id.in_(product_ids)) # pylint: disable=no-member
+        )
+
+
+async def compact_stock_movements(db: AsyncSession, limit: int) -> int:
+    """
+    Перенос не более limit записей журнала в products.stock в текущей транзакции.
+    Переносятся ровно удалённые этой транзакцией записи, поэтому записи,
+    добавленные параллельно, не теряются и не учитываются дважды.
+    Возвращает число перенесённых записей
+    """
+    batch = select(StockMovement.id).order_by(StockMovement.id).limit(limit)
+    movements = (await db.exec(
+        delete(StockMovement)
+        .where(StockMovement.id.in_(batch)) # pylint: disable=no-member
+        .returning(StockMovement.product_id, StockMovement.delta)
+    )).all()
+
+    deltas: Dict[int, int] = defaultdict(int)
+    for product_id, delta in movements:
+        deltas[product_id] += delta
+    changes = [{"product_id": product_id, "delta": delta}
+               for product_id, delta in deltas.items() if delta]
+    if changes:
+        products = Product.__table__
+        await db.exec(
+            update(products)
+            .where(products.c.id == bindparam("product_id"))
+            .values(stock=products.c.stock + bindparam("delta")),
+            params=changes
+        )
+        mark_products_changed(db, *(change["product_id"] for change in changes))
+    return len(movements)
+
+
+async def compact_stock_ledger(batch_size: Optional[int] = None) -> int:
+    """
+    Перенос всех записей журнала пакетами по STOCK_COMPACTION_BATCH_SIZE,
+    каждый пакет — в отдельной транзакции, со сбросом кеша изменённых товаров.
+    Возвращает число перенесённых записей
+    """
+    batch_size = batch_size or settings.STOCK_COMPACTION_BATCH_SIZE
+    total = 0
+    while True:
+        async with async_session() as db:
+            compacted = await compact_stock_movements(db, batch_size)
+            await db.commit()
+            await invalidate_changed_products(db)
+        total += compacted
+        if compacted < batch_size:
+            return total
@@ -0,0 +1,129 @@
+"""
+Модуль с реализацией потокобезопасного LRU-кеша с ограниченным временем жизни записей
+и интерфейсом бэкенда кеша, общего для нескольких процессов приложения
+"""
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+
+class TTLCache:
+    """
+    LRU-кеш ограниченного размера с индивидуальным сроком жизни каждой записи.
+    При переполнении вытесняется запись, к которой дольше всего не обращались
+    """
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Получение значения по ключу; устаревшие записи удаляются при обращении"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """
+        Сохранение значения. Срок жизни записи не превышает ttl кеша,
+        но может быть уменьшен явным параметром ttl
+        """
+        if self.max_size <= 0:
+            return
+        lifetime = self.ttl if ttl is None else min(ttl, self.ttl)
+        if lifetime <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + lifetime)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Hashable):
+        """Удаление записи по ключу"""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        """Полная очистка кеша"""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+
+class CacheBackend(ABC):
+    """
+    Интерфейс хранилища кеша. Значения должны быть сериализуемы в JSON,
+    чтобы реализация могла хранить их во внешнем сервисе (например, Redis),
+    общем для всех воркеров приложения
+    """
+    @abstractmethod
+    async def get(self, key: str) -> Any:
+        """Получение значения по ключу; None, если запись отсутствует или устарела"""
+
+    @abstractmethod
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        """Сохранение значения с ограниченным сроком жизни"""
+
+    @abstractmethod
+    async def delete(self, key: str):
+        """Удаление записи по ключу"""
+
+    @abstractmethod
+    async def incr(self, key: str) -> int:
+        """Атомарное увеличение бессрочного счётчика; возвращает новое значение"""
+
+    @abstractmethod
+    async def get_counter(self, key: str) -> int:
+        """Текущее значение счётчика (0, если счётчик ещё не создавался)"""
+
+    @abstractmethod
+    async def clear(self):
+        """Полная очистка хранилища"""
+
+
+class MemoryCacheBackend(CacheBackend):
+    """
+    Бэкенд кеша в памяти процесса на основе TTLCache.
+    Счётчики хранятся отдельно и не вытесняются
+    """
+    def __init__(self, max_size: int, ttl: float):
+        self._cache = TTLCache(max_size=max_size, ttl=ttl)
+        self._counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    async def get(self, key: str) -> Any:
+        return self._cache.get(key)
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        self._cache.set(key, value, ttl=ttl)
+
+    async def delete(self, key: str):
+        self._cache.delete(key)
+
+    async def incr(self, key: str) -> int:
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    async def get_counter(self, key: str) -> int:
+        with self._lock:
+            return self._counters.get(key, 0)
+
+    async def clear(self):
+        self._cache.clear()
+        with self._lock:
+            self._counters.clear()
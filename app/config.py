@@ -12,6 +12,60 @@ class Settings(BaseSettings):
     SECRET_KEY: str = Field(..., env="SECRET_KEY")
     ALGORITHM: str = Field(default="HS256", env="ALGORITHM")
     ACCESS_TOKEN_EXPIRE_MINUTES: int = Field(default=30, env="ACCESS_TOKEN_EXPIRE_MINUTES")
+    DATABASE_URL: str = Field(
+        default="sqlite+aiosqlite:///./candy_shop.sqlite3", env="DATABASE_URL"
+    )
+    DB_ECHO: bool = Field(default=False, env="DB_ECHO")
+    DB_POOL_SIZE: int = Field(default=5, ge=1, env="DB_POOL_SIZE")
+    DB_MAX_OVERFLOW: int = Field(default=10, ge=0, env="DB_MAX_OVERFLOW")
+    DB_POOL_PRE_PING: bool = Field(default=True, env="DB_POOL_PRE_PING")
+    SQLITE_BUSY_TIMEOUT_MS: int = Field(default=5000, ge=0, env="SQLITE_BUSY_TIMEOUT_MS")
+    SQLITE_MMAP_SIZE: int = Field(default=268435456, ge=0, env="SQLITE_MMAP_SIZE")
+    SQLITE_CACHE_SIZE: int = Field(default=-65536, env="SQLITE_CACHE_SIZE")
+    PASSWORD_HASHING_WORKERS: int = Field(default=4, ge=1, env="PASSWORD_HASHING_WORKERS")
+    PASSWORD_HASHING_QUEUE_LIMIT: int = Field(
+        default=32, ge=0, env="PASSWORD_HASHING_QUEUE_LIMIT"
+    )
+    TOKEN_CACHE_SIZE: int = Field(default=10000, ge=0, env="TOKEN_CACHE_SIZE")
+    TOKEN_CACHE_TTL_SECONDS: int = Field(default=300, ge=0, env="TOKEN_CACHE_TTL_SECONDS")
+    PRODUCT_PAGE_DEFAULT_LIMIT: int = Field(default=50, ge=1, env="PRODUCT_PAGE_DEFAULT_LIMIT")
+    PRODUCT_PAGE_MAX_LIMIT: int = Field(default=200, ge=1, env="PRODUCT_PAGE_MAX_LIMIT")
+    ORDER_PAGE_DEFAULT_LIMIT: int = Field(default=20, ge=1, env="ORDER_PAGE_DEFAULT_LIMIT")
+    ORDER_PAGE_MAX_LIMIT: int = Field(default=100, ge=1, env="ORDER_PAGE_MAX_LIMIT")
+    PRODUCT_CACHE_SIZE: int = Field(default=10000, ge=0, env="PRODUCT_CACHE_SIZE")
+    PRODUCT_CACHE_TTL_SECONDS: int = Field(default=60, ge=0, env="PRODUCT_CACHE_TTL_SECONDS")
+    CATALOG_CACHE_MAX_AGE_SECONDS: int = Field(
+        default=0, ge=0, env="CATALOG_CACHE_MAX_AGE_SECONDS"
+    )
+    ORDER_RESERVATION_MINUTES: int = Field(default=30, ge=1, env="ORDER_RESERVATION_MINUTES")
+    ORDER_CHECKOUT_MINUTES: int = Field(default=15, ge=1, env="ORDER_CHECKOUT_MINUTES")
+    ORDER_SWEEP_INTERVAL_SECONDS: float = Field(
+        default=60, gt=0, env="ORDER_SWEEP_INTERVAL_SECONDS"
+    )
+    ORDER_SWEEP_BATCH_SIZE: int = Field(default=500, ge=1, env="ORDER_SWEEP_BATCH_SIZE")
+    STOCK_LEDGER_ENABLED: bool = Field(default=False, env="STOCK_LEDGER_ENABLED")
+    STOCK_COMPACTION_INTERVAL_SECONDS: float = Field(
+        default=10, gt=0, env="STOCK_COMPACTION_INTERVAL_SECONDS"
+    )
+    STOCK_COMPACTION_BATCH_SIZE: int = Field(
+        default=10000, ge=1, env="STOCK_COMPACTION_BATCH_SIZE"
+    )
+    METRICS_ENABLED: bool = Field(default=True, env="METRICS_ENABLED")
+    QUERY_AUDIT_ENABLED: bool = Field(default=False, env="QUERY_AUDIT_ENABLED")
+    QUERY_AUDIT_STRICT: bool = Field(default=False, env="QUERY_AUDIT_STRICT")
+    QUERY_REPEAT_THRESHOLD: int = Field(default=3, ge=2, env="QUERY_REPEAT_THRESHOLD")
+    SLOW_QUERY_MS: float = Field(default=100, ge=0, env="SLOW_QUERY_MS")
+    FAST_JSON_RESPONSES: bool = Field(default=False, env="FAST_JSON_RESPONSES")
+    EXPORT_CHUNK_SIZE: int = Field(default=1000, ge=1, env="EXPORT_CHUNK_SIZE")
+    IMPORT_CHUNK_SIZE: int = Field(default=1000, ge=1, env="IMPORT_CHUNK_SIZE")
+    IMPORT_MAX_REPORTED_ERRORS: int = Field(
+        default=1000, ge=0, env="IMPORT_MAX_REPORTED_ERRORS"
+    )
+    SIMILARITY_TOP_K: int = Field(default=10, ge=1, env="SIMILARITY_TOP_K")
+    SIMILARITY_CATEGORY_BOOST: float = Field(default=1.5, ge=0, env="SIMILARITY_CATEGORY_BOOST")
+    SIMILARITY_INCREMENTAL_LIMIT: int = Field(
+        default=100, ge=0, env="SIMILARITY_INCREMENTAL_LIMIT"
+    )
 
     class Config:
         """Вложенный класс, содержащий дополнительные настройки конфигурации"""
@@ -1,22 +1,69 @@
 """
-Модуль для работы с базой данных SQLite с использованием SQLModel.
-Содержит настройки подключения, сессии и утилиты для создания структуры БД
+Модуль для работы с базой данных с использованием SQLModel.
+Содержит настройки асинхронного подключения (aiosqlite для SQLite, asyncpg для PostgreSQL),
+фабрику сессий и утилиты для создания структуры БД
 """
-from sqlmodel import create_engine, Session, SQLModel
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.config import settings
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./candy_shop.sqlite3"
+SQLALCHEMY_DATABASE_URL = settings.DATABASE_URL
 
-engine = create_engine(
+def is_sqlite() -> bool:
+    """Проверка, используется ли в качестве СУБД SQLite"""
+    return make_url(SQLALCHEMY_DATABASE_URL).get_backend_name() == "sqlite"
+
+def get_engine_options() -> dict:
+    """
+    Параметры движка из настроек приложения.
+    Размер пула не задаётся для SQLite в памяти, которая использует единственное соединение
+    """
+    options = {
+        "echo": settings.DB_ECHO,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+    database = make_url(SQLALCHEMY_DATABASE_URL).database
+    if not is_sqlite() or database not in (None, "", ":memory:"):
+        options["pool_size"] = settings.DB_POOL_SIZE
+        options["max_overflow"] = settings.DB_MAX_OVERFLOW
+    return options
+
+engine = create_async_engine(
     SQLALCHEMY_DATABASE_URL,
-    connect_args={"check_same_thread": False},
-    echo=True
+    **get_engine_options()
+)
+
+if is_sqlite():
+    @event.listens_for(engine.sync_engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, _connection_record):
+        """
+        Настройка соединения SQLite: журнал WAL позволяет читателям не ждать писателей,
+        synchronous=NORMAL безопасен в режиме WAL и сокращает число fsync
+        """
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+        cursor.execute(f"PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE)}")
+        cursor.execute(f"PRAGMA cache_size={int(settings.SQLITE_CACHE_SIZE)}")
+        cursor.close()
+
+# Объекты остаются доступными после commit: ленивая догрузка атрибутов в async-режиме невозможна
+async_session = async_sessionmaker(
+    engine,
+    class_=AsyncSession,
+    expire_on_commit=False
 )
 
-def get_db():
-    """Генератор сессий базы данных"""
-    with Session(engine) as session:
+async def get_db():
+    """Асинхронный генератор сессий базы данных"""
+    async with async_session() as session:
         yield session
 
-def create_db_and_tables():
+async def create_db_and_tables():
     """Инициализация структуры базы данных на основе SQLModel-классов"""
-    SQLModel.metadata.create_all(engine)
+    async with engine.begin() as connection:
+        await connection.run_sync(SQLModel.metadata.create_all)
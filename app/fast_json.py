@@ -0,0 +1,38 @@
+"""
+Модуль быстрого пути сериализации ответов.
+При включённой настройке FAST_JSON_RESPONSES ответы кодируются через orjson,
+а списочные эндпоинты формируют словари напрямую из выбранных столбцов
+и возвращают готовый ответ, минуя повторную валидацию по response_model
+"""
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+from fastapi.responses import JSONResponse, ORJSONResponse
+from app.config import settings
+
+
+def fast_json_enabled() -> bool:
+    """Проверка включения быстрого пути сериализации"""
+    return settings.FAST_JSON_RESPONSES
+
+
+class DefaultResponse(JSONResponse):
+    """
+    Класс ответа приложения по умолчанию. Способ кодирования выбирается
+    при формировании каждого ответа по текущему значению FAST_JSON_RESPONSES,
+    как и быстрый путь списочных эндпоинтов
+    """
+    def render(self, content: Any) -> bytes:
+        """Кодирование содержимого ответа через orjson или стандартный json"""
+        if fast_json_enabled():
+            return ORJSONResponse.render(self, content)
+        return super().render(content)
+
+
+def rows_to_dicts(keys: Sequence[str], rows: Iterable[Sequence]) -> List[Dict[str, Any]]:
+    """Преобразование строк результата запроса по столбцам в словари"""
+    keys = list(keys)
+    return [dict(zip(keys, row)) for row in rows]
+
+
+def json_response(content: Any, headers: Optional[Dict[str, str]] = None) -> ORJSONResponse:
+    """Готовый ответ, сериализованный orjson без валидации содержимого"""
+    return ORJSONResponse(content=content, headers=headers)
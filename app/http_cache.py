@@ -0,0 +1,50 @@
+"""
+Модуль поддержки условных HTTP-запросов (ETag / If-None-Match).
+ETag вычисляется по версии данных без обращения к БД, поэтому ответ 304
+отдаётся без выполнения запроса и сериализации тела
+"""
+import hashlib
+from typing import Dict
+from fastapi import Request, Response, status
+from app.config import settings
+
+
+def make_etag(*parts) -> str:
+    """Построение сильного ETag из версии данных и параметров представления"""
+    digest = hashlib.sha1(":".join(map(str, parts)).encode()).hexdigest()[:20]
+    return f'"{digest}"'
+
+
+def cache_control() -> str:
+    """Значение заголовка Cache-Control для данных каталога"""
+    return f"public, max-age={settings.CATALOG_CACHE_MAX_AGE_SECONDS}, must-revalidate"
+
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    """
+    Проверка заголовка If-None-Match. Для него используется слабое сравнение,
+    поэтому префикс W/ у тегов клиента игнорируется. Тег «*» не учитывается:
+    существование ресурса без обращения к БД неизвестно
+    """
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return etag in tags
+
+
+def cache_headers(etag: str) -> Dict[str, str]:
+    """Заголовки ETag и Cache-Control для ответа"""
+    return {"ETag": etag, "Cache-Control": cache_control()}
+
+
+def set_cache_headers(response: Response, etag: str):
+    """Установка заголовков ETag и Cache-Control"""
+    response.headers.update(cache_headers(etag))
+
+
+def not_modified(etag: str) -> Response:
+    """Ответ 304 Not Modified без тела"""
+    response = Response(status_code=status.HTTP_304_NOT_MODIFIED)
+    set_cache_headers(response, etag)
+    return response
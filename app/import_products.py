@@ -0,0 +1,48 @@
+"""
+Консольная утилита пакетного импорта товаров из файла NDJSON или CSV.
+Кеш каталога в памяти запущенного сервера утилита сбросить не может:
+его записи устаревают по PRODUCT_CACHE_TTL_SECONDS, общий бэкенд кеша сбрасывается сразу.
+
+Пример запуска: python -m app.import_products products.csv
+"""
+import argparse
+import asyncio
+import json
+import sys
+from app.database import async_session
+# Модели заказов и пользователей импортируются для разрешения связей модели Product
+from app.models import order, user  # pylint: disable=unused-import
+from app.business_logic.product_import import \
+    ImportFileError, import_products, rebuild_similarity_job
+from app.schemas.product_schema import CatalogFileFormat
+
+
+async def run(path: str, import_format: CatalogFileFormat) -> dict:
+    """Импорт файла в отдельной сессии БД с последующим пересчётом похожести при необходимости"""
+    with open(path, encoding="utf-8-sig", newline="") as lines:
+        async with async_session() as db:
+            report = await import_products(db, lines, import_format)
+    if report.similarity_rebuild_required:
+        await rebuild_similarity_job()
+    return report.as_dict()
+
+
+def main():
+    """Разбор аргументов командной строки и вывод отчёта об импорте"""
+    parser = argparse.ArgumentParser(description="Пакетный импорт товаров")
+    parser.add_argument("path", help="путь к файлу NDJSON или CSV")
+    parser.add_argument("--format", choices=[f.value for f in CatalogFileFormat],
+                        help="формат файла; по умолчанию определяется по расширению")
+    args = parser.parse_args()
+    import_format = CatalogFileFormat(
+        args.format or ("csv" if args.path.lower().endswith(".csv") else "ndjson")
+    )
+    try:
+        report = asyncio.run(run(args.path, import_format))
+    except ImportFileError as exc:
+        sys.exit(f"Ошибка импорта {args.path}: {exc}")
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -3,11 +3,53 @@
 Содержит конфигурацию основного приложения FastAPI и подключение роутеров
 """
 
+import asyncio
+from contextlib import asynccontextmanager, suppress
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+from app.auth.auth_handler import shutdown_hashing_executor
+from app.business_logic.order_lifecycle import sweep_expired_orders
+from app.business_logic.periodic import run_periodically
+from app.business_logic.stock_ledger import compact_stock_ledger
+from app.config import settings
+from app.database import engine
+from app.fast_json import DefaultResponse
+from app.metrics import METRICS_MEDIA_TYPE, instrument_engine, metrics_middleware, render_metrics
+from app.query_audit import instrument_query_audit, query_audit_middleware
 from app.routers.user_router import router as user_router
 from app.routers.product_router import router as product_router
 from app.routers.order_router import router as order_router
 
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    """
+    Управление ресурсами приложения на время его работы:
+    фоновые задачи снятия резерва просроченных заказов и сжатия журнала движения
+    товаров, пул хеширования паролей. Сжатие журнала запускается только при включённом
+    STOCK_LEDGER_ENABLED; при выключенном записи, оставшиеся после его выключения,
+    переносятся в остатки один раз при запуске
+    """
+    tasks = [
+        asyncio.create_task(run_periodically(
+            sweep_expired_orders, settings.ORDER_SWEEP_INTERVAL_SECONDS,
+            "Снят резерв просроченных заказов"
+        )),
+    ]
+    if settings.STOCK_LEDGER_ENABLED:
+        tasks.append(asyncio.create_task(run_periodically(
+            compact_stock_ledger, settings.STOCK_COMPACTION_INTERVAL_SECONDS,
+            "Перенесено записей журнала движения товаров"
+        )))
+    else:
+        await compact_stock_ledger()
+    yield
+    for task in tasks:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+    shutdown_hashing_executor()
+
 app = FastAPI(
     title="Система управления складом кондитерского магазина",
     description="Простейшая система управления складом кондитерского магазина, основанная на"
@@ -16,7 +58,9 @@ app = FastAPI(
     contact={
         "url": "https://github.com/Fyodor-The-Coder",
         "email": "fyodor.konto2@gmail.com"
-    }
+    },
+    lifespan=lifespan,
+    default_response_class=DefaultResponse
 )
 
 
@@ -25,6 +69,18 @@ def root():
     """Проверочный эндпоинт для тестирования работы API"""
     return {"message": "Hello, world!"}
 
+instrument_query_audit(engine.sync_engine)
+app.middleware("http")(query_audit_middleware)
+
+if settings.METRICS_ENABLED:
+    instrument_engine(engine.sync_engine)
+    app.middleware("http")(metrics_middleware)
+
+    @app.get("/metrics", include_in_schema=False)
+    def metrics():
+        """Показатели запросов в текстовом формате Prometheus"""
+        return PlainTextResponse(render_metrics(), media_type=METRICS_MEDIA_TYPE)
+
 app.include_router(user_router, prefix="/auth")
 app.include_router(product_router, prefix="/products")
 app.include_router(order_router, prefix="/orders")
@@ -0,0 +1,219 @@
+"""
+Модуль инструментирования запросов.
+Для каждого HTTP-запроса учитываются полное время обработки, время выполнения SQL,
+число SQL-запросов и число возвращённых строк. Показатели SQL собираются
+обработчиками событий SQLAlchemy и привязываются к HTTP-запросу через contextvars,
+поэтому запросы из разных корутин не смешиваются.
+Результаты отдаются клиенту в заголовке Server-Timing и накапливаются в гистограммах
+по маршрутам, доступных в текстовом формате Prometheus на эндпоинте /metrics.
+Гистограммы хранятся в памяти процесса: при нескольких воркерах каждый отдаёт свои
+"""
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+from fastapi import Request, Response
+from sqlalchemy import event
+from sqlalchemy.engine import CursorResult, Engine
+from sqlalchemy.orm import ORMExecuteState, Session
+from app.business_logic.product_cache import product_cache
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+QUERY_START_KEY = "metrics_query_start"
+UNMATCHED_ROUTE = "unmatched"
+METRICS_MEDIA_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class RequestMetrics:
+    """Показатели одного HTTP-запроса"""
+    # pylint: disable=too-few-public-methods
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_time = 0.0
+        self.queries = 0
+        self.rows = 0
+
+    def elapsed(self) -> float:
+        """Время с начала обработки запроса, с"""
+        return time.perf_counter() - self.started
+
+
+current_request: ContextVar[Optional[RequestMetrics]] = ContextVar(
+    "current_request", default=None
+)
+
+
+class Histogram:
+    """Гистограмма Prometheus с набором меток"""
+    def __init__(self, name: str, description: str, buckets: Tuple[float, ...]):
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        self.series: Dict[Tuple, List] = {}
+
+    def observe(self, labels: Tuple[Tuple[str, str], ...], value: float):
+        """Учёт наблюдения для набора меток"""
+        series = self.series.setdefault(labels, [[0] * len(self.buckets), 0, 0.0])
+        index = bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            series[0][index] += 1
+        series[1] += 1
+        series[2] += value
+
+    def render(self) -> List[str]:
+        """Строки гистограммы в текстовом формате Prometheus"""
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, count, total) in sorted(self.series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                bucket_labels = format_labels(labels + (("le", f"{bound:g}"),))
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_bucket{format_labels(labels + (('le', '+Inf'),))} {count}")
+            lines.append(f"{self.name}_sum{format_labels(labels)} {total:.6f}")
+            lines.append(f"{self.name}_count{format_labels(labels)} {count}")
+        return lines
+
+
+class Counter:
+    """Счётчик Prometheus с набором меток"""
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self.series: Dict[Tuple, float] = defaultdict(float)
+
+    def inc(self, labels: Tuple[Tuple[str, str], ...], value: float = 1):
+        """Увеличение счётчика для набора меток"""
+        self.series[labels] += value
+
+    def render(self) -> List[str]:
+        """Строки счётчика в текстовом формате Prometheus"""
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        lines.extend(f"{self.name}{format_labels(labels)} {value:g}"
+                     for labels, value in sorted(self.series.items()))
+        return lines
+
+
+def format_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    """Форматирование меток с экранированием значений"""
+    if not labels:
+        return ""
+    escaped = []
+    for name, value in labels:
+        value = value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        escaped.append(f'{name}="{value}"')
+    return "{" + ",".join(escaped) + "}"
+
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Полное время обработки HTTP-запроса", DURATION_BUCKETS
+)
+DB_DURATION = Histogram(
+    "http_request_db_duration_seconds", "Время выполнения SQL за HTTP-запрос", DURATION_BUCKETS
+)
+DB_QUERIES = Histogram(
+    "http_request_db_queries", "Число SQL-запросов за HTTP-запрос", QUERY_COUNT_BUCKETS
+)
+DB_ROWS = Counter("http_request_db_rows_total", "Число строк, возвращённых SQL-запросами")
+REQUESTS = Counter("http_requests_total", "Число обработанных HTTP-запросов")
+
+
+def before_cursor_execute(conn, _cursor, _statement, _parameters, _context, _executemany):
+    """Запоминание момента начала SQL-запроса в рамках HTTP-запроса"""
+    if current_request.get() is not None:
+        conn.info[QUERY_START_KEY] = time.perf_counter()
+
+
+def after_cursor_execute(conn, cursor, _statement, _parameters, _context, _executemany):
+    """
+    Учёт времени SQL-запроса. Для изменений без RETURNING число строк известно
+    из rowcount курсора; строки выборок учитываются при выполнении через сессию
+    """
+    metrics = current_request.get()
+    started = conn.info.pop(QUERY_START_KEY, None)
+    if metrics is None or started is None:
+        return
+    metrics.db_time += time.perf_counter() - started
+    metrics.queries += 1
+    if cursor.description is None and cursor.rowcount > 0:
+        metrics.rows += cursor.rowcount
+
+
+def count_result_rows(orm_execute_state: ORMExecuteState):
+    """
+    Учёт строк, возвращённых запросом сессии. Асинхронная сессия и так
+    буферизует результат целиком, поэтому он фиксируется через freeze и
+    возвращается вызывающему коду без повторного выполнения.
+    Потоковые выборки (stream, yield_per) не буферизуются и не учитываются
+    """
+    metrics = current_request.get()
+    options = orm_execute_state.execution_options
+    if metrics is None or options.get("stream_results") or options.get("yield_per"):
+        return None
+    result = orm_execute_state.invoke_statement()
+    returns_rows = result.returns_rows if isinstance(result, CursorResult) else \
+        orm_execute_state.is_select
+    if not returns_rows:
+        return result
+    frozen = result.freeze()
+    metrics.rows += len(frozen.data)
+    return frozen()
+
+
+def instrument_engine(engine: Engine):
+    """Подключение обработчиков событий к синхронному движку SQLAlchemy и сессиям"""
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", after_cursor_execute)
+    event.listen(Session, "do_orm_execute", count_result_rows)
+
+
+def route_label(request: Request) -> str:
+    """
+    Шаблон пути маршрута для меток: идентификаторы в пути не порождают
+    отдельные ряды; запросы вне маршрутов объединяются под одной меткой
+    """
+    route = request.scope.get("route")
+    return getattr(route, "path", UNMATCHED_ROUTE)
+
+
+def server_timing(metrics: RequestMetrics, total: float) -> str:
+    """Значение заголовка Server-Timing"""
+    return (f'app;dur={total * 1000:.2f}, '
+            f'db;dur={metrics.db_time * 1000:.2f};'
+            f'desc="queries={metrics.queries} rows={metrics.rows}"')
+
+
+async def metrics_middleware(request: Request, call_next) -> Response:
+    """Замер показателей HTTP-запроса, заголовок Server-Timing и учёт в гистограммах"""
+    metrics = RequestMetrics()
+    token = current_request.set(metrics)
+    try:
+        response = await call_next(request)
+    finally:
+        current_request.reset(token)
+    total = metrics.elapsed()
+    response.headers["Server-Timing"] = server_timing(metrics, total)
+
+    labels = (("method", request.method), ("route", route_label(request)))
+    REQUEST_DURATION.observe(labels, total)
+    DB_DURATION.observe(labels, metrics.db_time)
+    DB_QUERIES.observe(labels, metrics.queries)
+    DB_ROWS.inc(labels, metrics.rows)
+    REQUESTS.inc(labels + (("status", str(response.status_code)),))
+    return response
+
+
+def render_metrics() -> str:
+    """Все показатели в текстовом формате Prometheus"""
+    stats = product_cache.stats()
+    lines = [
+        "# HELP product_cache_requests_total Обращения к кешу каталога",
+        "# TYPE product_cache_requests_total counter",
+        f'product_cache_requests_total{{result="hit"}} {stats["hits"]}',
+        f'product_cache_requests_total{{result="miss"}} {stats["misses"]}',
+    ]
+    for metric in (REQUESTS, REQUEST_DURATION, DB_DURATION, DB_QUERIES, DB_ROWS):
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
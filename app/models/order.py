@@ -2,9 +2,10 @@
 Модуль определения моделей заказов и позиций заказов.
 Содержит SQLModel-классы для работы с системой заказов электронной коммерции
 """
-from datetime import datetime
+from datetime import datetime, timezone
+from enum import Enum
 from typing import List, Optional
-from sqlmodel import SQLModel, Field, Relationship, Column, DateTime, Integer, ForeignKey
+from sqlmodel import SQLModel, Field, Relationship, Column, DateTime, Integer, ForeignKey, Index
 from sqlalchemy.sql import func
 
 
@@ -18,6 +19,9 @@ class OrderItemBase(SQLModel):
 class OrderItem(OrderItemBase, table=True):
     """Модель таблицы позиций заказов в БД"""
     __tablename__ = "order_items"
+    __table_args__ = (
+        Index("ix_order_items_order_id", "order_id"),
+    )
 
     id: Optional[int] = Field(default=None, primary_key=True)
 
@@ -28,23 +32,42 @@ class OrderItem(OrderItemBase, table=True):
         sa_column=Column(Integer, ForeignKey("orders.id"))
     )
 
+    # Название и цена товара на момент резервирования: позиции заказа
+    # отображаются без обращения к товарам и не меняются вместе с каталогом
+    product_name: str = Field(max_length=100)
+    unit_price: float = Field(ge=0)
+
     product: "Product" = Relationship(back_populates="order_items")
     order: "Order" = Relationship(back_populates="items")
 
-    @property
-    def product_name(self):
-        """Возвращает название товара из связанной записи Product"""
-        return self.product.name if self.product else None
-
     @property
     def price(self):
-        """Возвращает актуальную цену товара из связанной записи Product"""
-        return self.product.price if self.product else None
+        """Возвращает цену товара, зафиксированную при добавлении в заказ"""
+        return self.unit_price
+
+class OrderStatus(str, Enum):
+    """
+    Статусы заказа. Товары позиций зарезервированы на складе, пока заказ
+    в статусе created или checked_out и не истёк срок reserved_until;
+    при отмене и истечении срока резерв возвращается на склад.
+    Допустимые переходы: created → checked_out → paid,
+    created и checked_out → cancelled или expired
+    """
+    CREATED = "created"
+    CHECKED_OUT = "checked_out"
+    PAID = "paid"
+    CANCELLED = "cancelled"
+    EXPIRED = "expired"
+
+
+HOLDING_STATUSES = (OrderStatus.CREATED.value, OrderStatus.CHECKED_OUT.value)
+
 
 class OrderBase(SQLModel):
     """Базовая схема заказа"""
-    status: str = Field(default="created", max_length=20)
+    status: str = Field(default=OrderStatus.CREATED.value, max_length=20)
     created_at: Optional[datetime] = Field(
+        default_factory=lambda: datetime.now(timezone.utc),
         sa_column=Column(
             DateTime(timezone=True),
             server_default=func.now(),  # pylint: disable=not-callable,
@@ -63,6 +86,10 @@ class OrderBase(SQLModel):
 class Order(OrderBase, table=True):
     """Модель таблицы заказов в БД"""
     __tablename__ = "orders"
+    __table_args__ = (
+        Index("ix_orders_user_id_created_at", "user_id", "created_at", "id"),
+        Index("ix_orders_status_reserved_until", "status", "reserved_until"),
+    )
 
     id: Optional[int] = Field(default=None, primary_key=True)
 
@@ -73,5 +100,14 @@ class Order(OrderBase, table=True):
         )
     )
 
+    # Количество товаров и сумма заказа поддерживаются в той же транзакции,
+    # что и изменение позиций, поэтому история заказов не требует агрегации
+    item_count: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
+    total: float = Field(default=0.0, sa_column_kwargs={"server_default": "0"})
+    # Срок резервирования товаров заказа; после него резерв снимается фоновой задачей
+    reserved_until: Optional[datetime] = Field(
+        default=None, sa_column=Column(DateTime(timezone=True), nullable=True)
+    )
+
     items: List[OrderItem] = Relationship(back_populates="order")
     user: "User" = Relationship(back_populates="orders")
@@ -2,8 +2,9 @@
 Модуль определения моделей кондитерских изделий.
 Содержит SQLModel-классы для работы с продуктами в БД и валидации данных
 """
+from datetime import datetime
 from typing import List, Optional
-from sqlalchemy import Column, JSON
+from sqlalchemy import Column, DateTime, JSON, Index, func
 from sqlmodel import SQLModel, Field, Relationship
 
 
@@ -24,7 +25,65 @@ class ProductBase(SQLModel):
 class Product(ProductBase, table=True):
     """Модель таблицы товаров в базе данных"""
     __tablename__ = "products"
+    __table_args__ = (
+        Index("ix_products_price_id", "price", "id"),
+        Index("ix_products_category_id", "category", "id"),
+        Index("ix_products_category_price_id", "category", "price", "id"),
+    )
 
     id: Optional[int] = Field(default=None, primary_key=True)
 
     order_items: List["OrderItem"] = Relationship(back_populates="product")
+
+
+class ProductIngredient(SQLModel, table=True):
+    """
+    Модель таблицы-индекса ингредиентов товаров.
+    Нормализованное представление JSON-поля ingredients для поиска товаров
+    с общими ингредиентами через индекс, без разбора JSON в Python
+    """
+    __tablename__ = "product_ingredients"
+    __table_args__ = (
+        Index("ix_product_ingredients_ingredient_product_id", "ingredient", "product_id"),
+    )
+
+    product_id: int = Field(foreign_key="products.id", primary_key=True)
+    ingredient: str = Field(max_length=100, primary_key=True)
+
+
+class ProductSimilarity(SQLModel, table=True):
+    """
+    Модель таблицы предрассчитанной похожести товаров.
+    Для каждого товара хранится не более SIMILARITY_TOP_K наиболее похожих товаров
+    """
+    __tablename__ = "product_similarity"
+    __table_args__ = (
+        Index("ix_product_similarity_product_id_score", "product_id", "score"),
+        Index("ix_product_similarity_similar_id", "similar_id"),
+    )
+
+    product_id: int = Field(foreign_key="products.id", primary_key=True)
+    similar_id: int = Field(foreign_key="products.id", primary_key=True)
+    score: float
+
+
+class StockMovement(SQLModel, table=True):
+    """
+    Модель таблицы журнала движения товаров (режим STOCK_LEDGER_ENABLED).
+    Резервирование и возврат товара добавляют запись с изменением остатка
+    вместо изменения строки товара; периодическое сжатие переносит накопленные
+    изменения в products.stock и удаляет перенесённые записи
+    """
+    __tablename__ = "stock_movements"
+    __table_args__ = (
+        Index("ix_stock_movements_product_id_delta", "product_id", "delta"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    product_id: int = Field(foreign_key="products.id")
+    delta: int
+    created_at: Optional[datetime] = Field(
+        default=None,
+        sa_column=Column(DateTime(timezone=True), server_default=func.now(), # pylint: disable=not-callable
+                         nullable=False)
+    )
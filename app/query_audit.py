@@ -0,0 +1,140 @@
+"""
+Модуль поиска повторяющихся (N+1) и медленных SQL-запросов для разработки и тестирования.
+Запросы HTTP-запроса сводятся к отпечаткам: значения литералов и параметров заменяются
+на «?», списки IN сворачиваются, поэтому запросы, отличающиеся только аргументами,
+имеют одинаковый отпечаток. Отпечаток, повторившийся QUERY_REPEAT_THRESHOLD раз и более,
+считается признаком N+1, запрос дольше SLOW_QUERY_MS — медленным.
+Эндпоинт может объявить бюджет числа запросов декоратором query_budget.
+Нарушения записываются в журнал, а в строгом режиме (QUERY_AUDIT_STRICT) повторы
+и превышения бюджета приводят к исключению QueryBudgetExceeded, что роняет тесты.
+Запросы собираются собственными обработчиками событий SQLAlchemy и промежуточным
+слоем query_audit_middleware, поэтому аудит не зависит от включения METRICS_ENABLED
+"""
+import logging
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import List, Optional, Tuple
+from fastapi import Request, Response
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+NUMBER_LITERAL = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?(?![\w.])")
+PARAMETER = re.compile(r"%\(\w+\)s|%s|\$\d+|:\w+|\?")
+VALUE_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+WHITESPACE = re.compile(r"\s+")
+QUERY_START_KEY = "query_audit_start"
+
+
+class QueryBudgetExceeded(RuntimeError):
+    """Эндпоинт выполнил больше запросов, чем объявлено, или повторяющиеся запросы"""
+
+
+@lru_cache(maxsize=1024)
+def fingerprint(statement: str) -> str:
+    """Нормализованный текст SQL-запроса без значений литералов и параметров"""
+    statement = STRING_LITERAL.sub("?", statement)
+    statement = NUMBER_LITERAL.sub("?", statement)
+    statement = PARAMETER.sub("?", statement)
+    statement = VALUE_LIST.sub("(?+)", statement)
+    return WHITESPACE.sub(" ", statement).strip()
+
+
+def query_budget(limit: int):
+    """
+    Декоратор эндпоинта, объявляющий наибольшее допустимое число SQL-запросов,
+    включая запросы зависимостей (например, загрузку текущего пользователя)
+    """
+    def decorator(endpoint):
+        endpoint.query_budget = limit
+        return endpoint
+    return decorator
+
+
+class QueryAudit:
+    """Отпечатки и медленные запросы одного HTTP-запроса"""
+    def __init__(self):
+        self.fingerprints: Counter = Counter()
+        self.slow: List[Tuple[str, float]] = []
+
+    @property
+    def total(self) -> int:
+        """Число выполненных запросов"""
+        return sum(self.fingerprints.values())
+
+    def record(self, statement: str, duration: float):
+        """Учёт выполненного запроса и его длительности в секундах"""
+        key = fingerprint(statement)
+        self.fingerprints[key] += 1
+        if duration * 1000 >= settings.SLOW_QUERY_MS:
+            self.slow.append((key, duration))
+
+    def repeated(self) -> List[Tuple[str, int]]:
+        """Отпечатки, повторившиеся не меньше QUERY_REPEAT_THRESHOLD раз"""
+        return [(key, count) for key, count in self.fingerprints.most_common()
+                if count >= settings.QUERY_REPEAT_THRESHOLD]
+
+    def violations(self, budget: Optional[int]) -> List[str]:
+        """Описание повторов и превышения бюджета запросов"""
+        problems = [f"запрос выполнен {count} раз: {key}" for key, count in self.repeated()]
+        if budget is not None and self.total > budget:
+            problems.append(f"выполнено {self.total} запросов при бюджете {budget}")
+        return problems
+
+    def check(self, request: Request):
+        """Запись нарушений в журнал; в строгом режиме — исключение при повторах и бюджете"""
+        route = f"{request.method} {request.url.path}"
+        for key, duration in self.slow:
+            logger.warning("%s: медленный запрос %.1f мс: %s", route, duration * 1000, key)
+        budget = getattr(request.scope.get("endpoint"), "query_budget", None)
+        problems = self.violations(budget)
+        for problem in problems:
+            logger.warning("%s: %s", route, problem)
+        if problems and settings.QUERY_AUDIT_STRICT:
+            raise QueryBudgetExceeded(f"{route}: " + "; ".join(problems))
+
+
+current_audit: ContextVar[Optional[QueryAudit]] = ContextVar("current_audit", default=None)
+
+
+def before_cursor_execute(conn, _cursor, _statement, _parameters, _context, _executemany):
+    """Запоминание момента начала SQL-запроса при включённом аудите HTTP-запроса"""
+    if current_audit.get() is not None:
+        conn.info[QUERY_START_KEY] = time.perf_counter()
+
+
+def after_cursor_execute(conn, _cursor, statement, _parameters, _context, _executemany):
+    """Передача выполненного SQL-запроса и его длительности в аудит HTTP-запроса"""
+    audit = current_audit.get()
+    started = conn.info.pop(QUERY_START_KEY, None)
+    if audit is not None and started is not None:
+        audit.record(statement, time.perf_counter() - started)
+
+
+def instrument_query_audit(engine: Engine):
+    """Подключение обработчиков событий аудита к синхронному движку SQLAlchemy"""
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", after_cursor_execute)
+
+
+async def query_audit_middleware(request: Request, call_next) -> Response:
+    """
+    Аудит SQL-запросов HTTP-запроса. Настройка QUERY_AUDIT_ENABLED читается
+    при каждом запросе; при выключенном аудите запрос передаётся дальше без учёта
+    """
+    if not settings.QUERY_AUDIT_ENABLED:
+        return await call_next(request)
+    audit = QueryAudit()
+    token = current_audit.set(audit)
+    try:
+        response = await call_next(request)
+    finally:
+        current_audit.reset(token)
+    audit.check(request)
+    return response
@@ -2,191 +2,367 @@
 Модуль API для управления заказами и их позициями
 """
 
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, Body
-from sqlalchemy import desc
-from sqlalchemy.orm import Session, joinedload
+from collections import defaultdict
+from datetime import datetime
+from typing import Annotated, Dict, List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Body, Query
+from sqlalchemy import desc, tuple_
 from sqlalchemy.exc import IntegrityError
-from app.schemas.order_schema import OrderResponse, OrderItemCreate
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.schemas.order_schema import \
+    (OrderResponse, OrderItemCreate, OrderCreate, OrderListQuery, OrderPage,
+     OrderSummaryPage, OrderAvailabilityResponse, OrderBulkResponse)
 from app.database import get_db
 from app.auth.dependencies import get_current_user
 from app.business_logic.recommendations import RecommendationEngine
+from app.business_logic.pagination import encode_cursor, decode_cursor
+from app.business_logic.order_service import OrderService, order_with_items_query
+from app.business_logic.stock import exec_with_stock, select_with_stock
+from app.fast_json import fast_json_enabled, json_response, rows_to_dicts
+from app.query_audit import query_budget
 from app.models.order import Order, OrderItem
 from app.models.user import User
 from app.models.product import Product
 
 router = APIRouter(tags=["Заказы"])
 
-def get_order_or_404(order_id: int, db: Session, user: User):
+def apply_order_cursor(query, cursor: Optional[str]):
     """
-    Вспомогательная функция для получения заказа с проверкой прав доступа
+    Ограничение запроса заказами, созданными строго раньше ключа (created_at, id) из курсора
     """
-    order = db.query(Order).options(
-        joinedload(Order.items).joinedload(OrderItem.product)
-    ).get(order_id)
+    if not cursor:
+        return query
+    created_at, last_id = decode_cursor(cursor, 2, (str, int))
+    try:
+        created_at = datetime.fromisoformat(created_at)
+    except (TypeError, ValueError) as exc:
+        raise HTTPException(400, "Некорректный курсор пагинации") from exc
+    return query.where(tuple_(Order.created_at, Order.id) < tuple_(created_at, last_id))
 
-    if not order or order.user_id != user.id:
-        raise HTTPException(404, "Заказ не найден")
 
-    return order
+def get_next_order_cursor(rows: list, limit: int):
+    """Формирование курсора следующей страницы по последнему заказу текущей страницы"""
+    if len(rows) <= limit:
+        return None
+    last = rows[limit - 1]
+    return encode_cursor(last.created_at.isoformat(), last.id)
 
 
-@router.get("/get_all_orders", response_model=List[OrderResponse],
+@router.get("/get_all_orders", response_model=OrderPage,
             summary="Просмотреть все заказы пользователя")
-def get_all_orders(
-        db: Session = Depends(get_db),
+@query_budget(3)
+async def get_all_orders(
+        params: Annotated[OrderListQuery, Query()],
+        db: AsyncSession = Depends(get_db),
         user: User = Depends(get_current_user)
 ):
     """
-    Получение полной истории заказов текущего пользователя
+    Получение страницы истории заказов текущего пользователя, начиная с самых новых
     """
-    orders = (
-        db.query(Order)
-        .options(
-            joinedload(Order.items)
-            .joinedload(OrderItem.product)
-        )
-        .filter(Order.user_id == user.id)
-        .order_by(desc(Order.created_at))
-        .all()
+    if fast_json_enabled():
+        return json_response(await load_order_page_rows(db, user, params))
+
+    query = apply_order_cursor(
+        order_with_items_query().where(Order.user_id == user.id),
+        params.cursor
     )
-    return orders
+    orders = (await db.exec(
+        query.order_by(desc(Order.created_at), desc(Order.id)).limit(params.limit + 1)
+    )).all()
+    return {
+        "items": orders[:params.limit],
+        "next_cursor": get_next_order_cursor(orders, params.limit)
+    }
+
+
+async def load_order_page_rows(db: AsyncSession, user: User, params: OrderListQuery) -> dict:
+    """
+    Загрузка страницы истории заказов двумя запросами по столбцам:
+    заказы страницы и позиции этих заказов.
+    Строки отображаются в словари формата OrderResponse без создания объектов и валидации
+    """
+    result = await db.exec(apply_order_cursor(
+        select(Order.id, Order.status, Order.user_id, Order.created_at,
+               Order.item_count, Order.total, Order.reserved_until)
+        .where(Order.user_id == user.id),
+        params.cursor
+    ).order_by(desc(Order.created_at), desc(Order.id)).limit(params.limit + 1))
+    keys = result.keys()
+    rows = result.all()
+    orders = rows_to_dicts(keys, rows[:params.limit])
+
+    items = defaultdict(list)
+    if orders:
+        result = await db.exec(
+            select(OrderItem.order_id, OrderItem.id, OrderItem.product_id, OrderItem.quantity,
+                   OrderItem.product_name,
+                   OrderItem.unit_price.label("price")) # pylint: disable=no-member
+            .where(OrderItem.order_id.in_([order["id"] for order in orders])) # pylint: disable=no-member
+            .order_by(OrderItem.id)
+        )
+        item_keys = list(result.keys())[1:]
+        for order_id, *item in result.all():
+            items[order_id].append(dict(zip(item_keys, item)))
+
+    for order in orders:
+        order["items"] = items[order["id"]]
+    return {"items": orders, "next_cursor": get_next_order_cursor(rows, params.limit)}
+
+
+@router.get("/get_orders_summary", response_model=OrderSummaryPage,
+            summary="Просмотреть краткую историю заказов пользователя")
+@query_budget(2)
+async def get_orders_summary(
+        params: Annotated[OrderListQuery, Query()],
+        db: AsyncSession = Depends(get_db),
+        user: User = Depends(get_current_user)
+):
+    """
+    Получение страницы истории заказов без позиций.
+    Количество товаров и сумма хранятся в заказе, поэтому читается только таблица заказов
+    """
+    summaries = (await db.exec(apply_order_cursor(
+        select(Order.id, Order.status, Order.created_at, Order.item_count, Order.total)
+        .where(Order.user_id == user.id),
+        params.cursor
+    ).order_by(desc(Order.created_at), desc(Order.id)).limit(params.limit + 1))).all()
+    return {
+        "items": summaries[:params.limit],
+        "next_cursor": get_next_order_cursor(summaries, params.limit)
+    }
 
 
 @router.get("/get_the_order_using_ID", response_model=OrderResponse,
             summary="Просмотреть данные о заказе по ID")
-def get_order(
+@query_budget(3)
+async def get_order(
         order_id: int,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         user: User = Depends(get_current_user)
 ):
     """
     Получение детальной информации о конкретном заказе
     """
-    order = (
-        db.query(Order)
-        .options(
-            joinedload(Order.items)
-            .joinedload(OrderItem.product)
-        )
-        .filter(Order.id == order_id)
-        .first()
+    return await OrderService(db, user).get_order(
+        order_id, "Заказ не найден или у вас нет прав доступа"
     )
 
-    if not order or order.user_id != user.id:
-        raise HTTPException(
-            status_code=404,
-            detail="Заказ не найден или у вас нет прав доступа"
-        )
-
-    return order
-
 @router.post("/create_new_order", response_model=OrderResponse,
              summary="Создать новый заказ")
-def create_order(
-        db: Session = Depends(get_db),
+@query_budget(2)
+async def create_order(
+        db: AsyncSession = Depends(get_db),
         user: User = Depends(get_current_user)
 ):
     """
     Инициализация нового заказа
     """
-    db_order = Order(user_id=user.id)
-    db.add(db_order)
-    db.commit()
-    db.refresh(db_order)
-    return db_order
+    return await OrderService(db, user).create_order()
+
+
+async def raise_insufficient_stock(db: AsyncSession, product_id: int):
+    """Отказ с кодом 409 и рекомендациями замен при недостатке товара на складе"""
+    recommender = RecommendationEngine(db)
+    alternatives = await recommender.find_alternatives(product_id)
+    raise HTTPException(409, detail=recommender.prepare_recommendation_message(alternatives))
+
+
+def get_item_quantities(order_data: OrderCreate) -> Dict[int, int]:
+    """Суммарное запрошенное количество по каждому товару"""
+    quantities = defaultdict(int)
+    for item in order_data.items:
+        quantities[item.product_id] += item.quantity
+    return dict(quantities)
+
+
+def build_shortages(quantities: Dict[int, int], products: Dict[int, Product],
+                    recommendations: Dict[int, List[Product]]) -> List[Dict]:
+    """
+    Формирование списка дефицитных позиций: несуществующих товаров
+    и товаров, которых недостаточно на складе
+    """
+    shortages = []
+    for product_id, quantity in quantities.items():
+        product = products.get(product_id)
+        if product is None or product_id in recommendations:
+            shortages.append({
+                "product_id": product_id,
+                "requested": quantity,
+                "available_stock": product.stock if product else 0,
+                "recommendations": RecommendationEngine.prepare_recommendations(
+                    recommendations.get(product_id, [])
+                )
+            })
+    return shortages
+
+
+@router.post("/check_order_availability", response_model=OrderAvailabilityResponse,
+             dependencies=[Depends(get_current_user)],
+             summary="Проверить наличие всех товаров заказа на складе")
+@query_budget(4)
+async def check_order_availability(
+        order_data: OrderCreate,
+        db: AsyncSession = Depends(get_db)
+):
+    """
+    Проверка наличия всех позиций заказа перед оформлением.
+    Для дефицитных позиций подбираются замены, не входящие в заказ
+    """
+    quantities = get_item_quantities(order_data)
+    recommender = RecommendationEngine(db)
+    products, recommendations = await recommender.find_alternatives_for_items(quantities)
+    shortages = build_shortages(quantities, products, recommendations)
+    return {"available": not shortages, "shortages": shortages}
+
+
+@router.post("/add_order_items", response_model=OrderBulkResponse,
+             summary="Добавить несколько товаров в заказ")
+@query_budget(9)
+async def add_order_items(
+        order_id: int,
+        order_data: OrderCreate,
+        db: AsyncSession = Depends(get_db),
+        user: User = Depends(get_current_user)
+):
+    """
+    Пакетное добавление товаров в существующий заказ.
+    Загрузка товаров, их резервирование и вставка позиций выполняются в одной транзакции
+    одним запросом каждое, поэтому число запросов не зависит от числа позиций.
+    Позиции, которых недостаточно на складе, не добавляются и возвращаются
+    в списке дефицитных вместе с рекомендованными заменами
+    """
+    service = OrderService(db, user)
+    order = await service.get_order(order_id)
+    quantities = get_item_quantities(order_data)
+    products = {p.id: p for p in await exec_with_stock(
+        db,
+        select_with_stock(Product).where(Product.id.in_(list(quantities))) # pylint: disable=no-member
+    )}
+
+    short_ids = await service.add_items(order, {
+        product_id: quantity for product_id, quantity in quantities.items()
+        if product_id in products
+    })
+    recommendations = await RecommendationEngine(db).find_alternatives_batch(
+        short_ids, set(quantities)
+    )
+    return {
+        "order": await service.commit(order),
+        "shortages": build_shortages(quantities, products, recommendations)
+    }
 
 
 @router.post("/add_new_order_item", response_model=OrderResponse,
              summary="Добавить новый товар в заказ")
-def add_order_item(
+@query_budget(6)
+async def add_order_item(
         order_id: int,
         item: OrderItemCreate,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         user: User = Depends(get_current_user)
 ):
     """Добавление товара в существующий заказ"""
-    order = get_order_or_404(order_id, db, user)
-    product = db.query(Product).get(item.product_id)
+    service = OrderService(db, user)
+    order = await service.get_order(order_id)
 
-    if not product:
-        raise HTTPException(404, "Товар не найден")
-
-    if product.stock < item.quantity:
-        recommender = RecommendationEngine(db)
-        alternatives = recommender.find_alternatives(item.product_id)
-        raise HTTPException(409, detail=recommender.prepare_recommendation_message(alternatives))
+    if not await service.add_item(order, item.product_id, item.quantity):
+        if await db.get(Product, item.product_id) is None:
+            raise HTTPException(404, "Товар не найден")
+        await raise_insufficient_stock(db, item.product_id)
 
     try:
-        db_item = OrderItem(**item.model_dump(), order_id=order_id)
-        product.stock -= item.quantity
-        db.add(db_item)
-        db.commit()
+        return await service.commit(order)
     except IntegrityError as exc:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=400,
             detail="Товар уже в заказе"
         ) from exc
 
-    db.refresh(order)
-    return order
-
 
 @router.put("/update_order_item", response_model=OrderResponse,
             summary="Обновить данные о товаре в заказе")
-def update_order_item(
+@query_budget(6)
+async def update_order_item(
         order_id: int,
         item_id: int,
         quantity: int = Body(..., gt=0,example=2,
         description="Новое количество товара (должно быть больше 0)"),
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         user: User = Depends(get_current_user)
 ):
     """
     Изменение количества товара в позиции заказа
     """
-    order = get_order_or_404(order_id, db, user)
-    item = next((i for i in order.items if i.id == item_id), None)
-
-    if not item:
-        raise HTTPException(404, "Позиция не найдена")
-
-    delta = quantity - item.quantity
-    product = db.query(Product).get(item.product_id)
+    service = OrderService(db, user)
+    order = await service.get_order(order_id)
+    item = service.find_item(order, item_id)
 
-    if product.stock < delta:
-        recommender = RecommendationEngine(db)
-        alternatives = recommender.find_alternatives(item.product_id)
-        raise HTTPException(409, detail=recommender.prepare_recommendation_message(alternatives))
-
-    product.stock -= delta
-    item.quantity = quantity
-    db.commit()
-    db.refresh(order)
-    return order
+    if not await service.change_quantity(order, item, quantity):
+        await raise_insufficient_stock(db, item.product_id)
+    return await service.commit(order)
 
 
 @router.delete("/remove_order_item", response_model=OrderResponse,
                summary="Удалить товар из заказа")
-def remove_order_item(
+@query_budget(6)
+async def remove_order_item(
         order_id: int,
         item_id: int,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         user: User = Depends(get_current_user)
 ):
     """
     Удаление позиции из заказа с возвратом товара на склад
     """
-    order = get_order_or_404(order_id, db, user)
-    item = next((i for i in order.items if i.id == item_id), None)
+    service = OrderService(db, user)
+    order = await service.get_order(order_id)
+    await service.remove_item(order, service.find_item(order, item_id))
+    return await service.commit(order)
 
-    if not item:
-        raise HTTPException(404, "Позиция не найдена")
 
-    product = db.query(Product).get(item.product_id)
-    product.stock += item.quantity
-    db.delete(item)
-    db.commit()
-    db.refresh(order)
-    return order
+@router.post("/checkout_order", response_model=OrderResponse,
+             summary="Оформить заказ")
+@query_budget(4)
+async def checkout_order(
+        order_id: int,
+        db: AsyncSession = Depends(get_db),
+        user: User = Depends(get_current_user)
+):
+    """
+    Оформление заказа: позиции больше не изменяются,
+    товары остаются зарезервированными до оплаты в течение срока резервирования
+    """
+    service = OrderService(db, user)
+    return await service.checkout(await service.get_order(order_id))
+
+
+@router.post("/pay_order", response_model=OrderResponse,
+             summary="Оплатить заказ")
+@query_budget(4)
+async def pay_order(
+        order_id: int,
+        db: AsyncSession = Depends(get_db),
+        user: User = Depends(get_current_user)
+):
+    """
+    Оплата оформленного заказа до истечения срока резервирования
+    """
+    service = OrderService(db, user)
+    return await service.pay(await service.get_order(order_id))
+
+
+@router.post("/cancel_order", response_model=OrderResponse,
+             summary="Отменить заказ")
+@query_budget(5)
+async def cancel_order(
+        order_id: int,
+        db: AsyncSession = Depends(get_db),
+        user: User = Depends(get_current_user)
+):
+    """
+    Отмена неоплаченного заказа с возвратом товаров на склад
+    """
+    service = OrderService(db, user)
+    return await service.cancel(await service.get_order(order_id))
@@ -2,13 +2,38 @@
 Модуль API-эндпоинтов для управления товарами магазина.
 Содержит операции CRUD (Create, Read, Update, Delete) для работы с товарами
 """
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+import io
+from typing import Annotated, Optional
+from fastapi import \
+    (APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request, Response,
+     UploadFile, status)
+from fastapi.responses import StreamingResponse
+from sqlalchemy import tuple_
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from app.models.product import Product
 from app.schemas.product_schema import \
-    (ProductCreate, ProductResponse, ProductUpdate, ProductShortInfo)
+    (ProductCreate, ProductResponse, ProductUpdate, ProductPage,
+     ProductListQuery, ProductSortField, CatalogFileFormat, ProductImportReport,
+     ProductSearchQuery)
+from app.business_logic.pagination import encode_cursor, decode_cursor
+from app.business_logic.ingredient_index import \
+    (replace_product_ingredients, remove_product_ingredients)
+from app.business_logic.similarity import \
+    (refresh_product_similarity, remove_product_similarity)
+from app.business_logic.product_cache import product_cache
+from app.business_logic.stock import \
+    (exec_with_stock, load_product, select_with_stock, stock_expression)
+from app.business_logic.stock_ledger import discard_stock_movements
+from app.business_logic.catalog_export import MEDIA_TYPES, stream_catalog
+from app.business_logic.product_import import \
+    ImportFileError, import_products, rebuild_similarity_job
+from app.business_logic.search import build_search_query
 from app.database import get_db
+from app.http_cache import \
+    (make_etag, is_not_modified, not_modified, set_cache_headers, cache_headers)
+from app.fast_json import fast_json_enabled, json_response, rows_to_dicts
+from app.query_audit import query_budget
 
 router = APIRouter(tags=["Товары"])
 
@@ -18,55 +43,246 @@ router = APIRouter(tags=["Товары"])
     status_code=status.HTTP_201_CREATED,
     summary="Создать новый товар"
 )
-def create_product(
+async def create_product(
         product: ProductCreate,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
 ):
     """"
     Создание нового товара в каталоге
     """
     db_product = Product(**product.dict())
     db.add(db_product)
-    db.commit()
-    db.refresh(db_product)
-    return db_product
+    await db.flush()
+    await replace_product_ingredients(db, db_product.id, db_product.ingredients)
+    await refresh_product_similarity(db, db_product.id)
+    await db.commit()
+    await db.refresh(db_product)
+    return await product_cache.write_through(db_product)
 
 
-@router.get("/view_all_products", response_model=List[ProductShortInfo],
+def build_product_page_query(params: ProductListQuery, *columns):
+    """
+    Построение запроса страницы товаров с фильтрами и курсорной пагинацией.
+    Записи упорядочены по (поле сортировки, id), следующая страница начинается
+    строго после ключа из курсора, поэтому стоимость запроса не зависит от номера страницы.
+    Выбирается на одну запись больше лимита, чтобы определить наличие следующей страницы.
+    Если переданы columns, выбираются только эти столбцы вместо объектов Product
+    """
+    query = select(*columns) if columns else select_with_stock(Product)
+
+    if params.category is not None:
+        query = query.where(Product.category == params.category)
+    if params.min_price is not None:
+        query = query.where(Product.price >= params.min_price)
+    if params.max_price is not None:
+        query = query.where(Product.price <= params.max_price)
+    if params.in_stock:
+        query = query.where(stock_expression() > 0)
+
+    by_price = params.sort_by == ProductSortField.PRICE
+    sort_column = Product.price if by_price else Product.id
+
+    if params.cursor:
+        sort_field, last_value, last_id = decode_cursor(
+            params.cursor, 3, (str, float if by_price else int, int)
+        )
+        if sort_field != params.sort_by.value:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Курсор не соответствует полю сортировки"
+            )
+        query = query.where(tuple_(sort_column, Product.id) > tuple_(last_value, last_id))
+
+    return query.order_by(sort_column, Product.id).limit(params.limit + 1)
+
+
+def get_next_cursor(products: list, params: ProductListQuery):
+    """Формирование курсора следующей страницы по последней записи текущей страницы"""
+    if len(products) <= params.limit:
+        return None
+    last = products[params.limit - 1]
+    return encode_cursor(params.sort_by.value, getattr(last, params.sort_by.value), last.id)
+
+
+@router.get("/view_all_products", response_model=ProductPage,
             summary="Просмотреть все товары")
-def get_all_products(db: Session = Depends(get_db)):
+@query_budget(2)
+async def get_all_products(
+        params: Annotated[ProductListQuery, Query()],
+        request: Request,
+        response: Response,
+        db: AsyncSession = Depends(get_db)
+):
     """
-    Получение списка всех товаров с краткой информацией
+    Получение страницы списка товаров с краткой информацией.
+    Поддерживает фильтрацию по категории, диапазону цен и наличию на складе.
+    Страницы кешируются до следующего изменения каталога или остатков,
+    ETag страницы определяется версией каталога и параметрами запроса
     """
-    return db.query(Product).all()
+    version = await product_cache.version()
+    etag = make_etag(product_cache.epoch, version, params.model_dump_json())
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+
+    page = await product_cache.get_page(version, params)
+    if page is None:
+        loader = load_product_page_rows if fast_json_enabled() else load_product_page
+        page = await loader(db, params)
+        await product_cache.set_page(version, params, page)
+
+    if fast_json_enabled():
+        return json_response(page, headers=cache_headers(etag))
+    set_cache_headers(response, etag)
+    return page
+
+
+async def load_product_page(db: AsyncSession, params: ProductListQuery) -> dict:
+    """Загрузка страницы каталога объектами Product с валидацией по схеме ProductPage"""
+    products = await exec_with_stock(db, build_product_page_query(params))
+    return ProductPage(
+        items=products[:params.limit],
+        next_cursor=get_next_cursor(products, params)
+    ).model_dump(mode="json")
+
+
+async def load_product_page_rows(db: AsyncSession, params: ProductListQuery) -> dict:
+    """
+    Загрузка страницы каталога только столбцами ProductShortInfo
+    с отображением строк в словари без создания объектов и валидации
+    """
+    result = await db.exec(build_product_page_query(
+        params, Product.id, Product.name, Product.price, stock_expression().label("stock")
+    ))
+    keys = result.keys()
+    rows = result.all()
+    return {
+        "items": rows_to_dicts(keys, rows[:params.limit]),
+        "next_cursor": get_next_cursor(rows, params)
+    }
+
+
+@router.get("/search", response_model=ProductPage,
+            summary="Найти товары по названию, описанию и ингредиентам")
+@query_budget(2)
+async def search_products(
+        params: Annotated[ProductSearchQuery, Query()],
+        db: AsyncSession = Depends(get_db)
+):
+    """
+    Полнотекстовый поиск товаров. Каждое слово запроса ищется как начало слова
+    в названии, описании или ингредиентах; результаты упорядочены по релевантности,
+    совпадения в названии ценятся выше совпадений в ингредиентах и описании
+    """
+    query = build_search_query(params.q, params.limit, params.cursor)
+    if query is None:
+        return {"items": [], "next_cursor": None}
+
+    rows = (await db.exec(query)).all()
+    next_cursor = None
+    if len(rows) > params.limit:
+        last = rows[params.limit - 1]
+        next_cursor = encode_cursor(last.score, last.id)
+    return {"items": rows[:params.limit], "next_cursor": next_cursor}
+
+
+@router.get("/export", response_class=StreamingResponse,
+            summary="Выгрузить весь каталог товаров")
+async def export_products(
+        export_format: CatalogFileFormat = Query(CatalogFileFormat.NDJSON, alias="format")
+):
+    """
+    Потоковая выгрузка всех товаров с полными данными в формате NDJSON или CSV.
+    Товары читаются из БД порциями и отправляются по мере чтения
+    """
+    return StreamingResponse(
+        stream_catalog(export_format),
+        media_type=MEDIA_TYPES[export_format],
+        headers={
+            "Content-Disposition": f'attachment; filename="products.{export_format.value}"'
+        }
+    )
+
+
+@router.post("/import", response_model=ProductImportReport,
+             summary="Импортировать товары из файла")
+async def import_products_file(
+        file: UploadFile,
+        background_tasks: BackgroundTasks,
+        import_format: Optional[CatalogFileFormat] = Query(None, alias="format"),
+        db: AsyncSession = Depends(get_db)
+):
+    """
+    Пакетный импорт товаров из файла NDJSON или CSV (формат выгрузки каталога).
+    Формат определяется параметром format или расширением файла.
+    Товары с существующими названиями обновляются, строки с ошибками пропускаются
+    и перечисляются в отчёте. Полный пересчёт похожести после крупного импорта
+    выполняется в фоне после отправки ответа
+    """
+    if import_format is None:
+        extension = (file.filename or "").rsplit(".", 1)[-1].lower()
+        import_format = CatalogFileFormat.CSV if extension == "csv" else CatalogFileFormat.NDJSON
+    lines = io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+    try:
+        report = await import_products(db, lines, import_format)
+    except ImportFileError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    if report.similarity_rebuild_required:
+        background_tasks.add_task(rebuild_similarity_job)
+    return report.as_dict()
+
+
+@router.get("/cache_stats", summary="Статистика кеша каталога")
+async def get_cache_stats():
+    """
+    Счётчики попаданий и промахов кеша каталога в текущем процессе
+    """
+    return product_cache.stats()
 
 
 @router.get("/get_product_by_ID", response_model=ProductResponse,
             summary="Найти конкретный товар по ID")
-def get_product(product_id: int, db: Session = Depends(get_db)):
+@query_budget(2)
+async def get_product(
+        product_id: int,
+        request: Request,
+        response: Response,
+        db: AsyncSession = Depends(get_db)
+):
     """"
-    Получение полной информации о товаре по ID
+    Получение полной информации о товаре по ID.
+    ETag карточки определяется версией товара
     """
-    product = db.query(Product).filter(Product.id == product_id).first()
+    version = await product_cache.product_version(product_id)
+    etag = make_etag(product_cache.epoch, "product", product_id, version)
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+
+    cached = await product_cache.get_product(product_id, version)
+    if cached is not None:
+        set_cache_headers(response, etag)
+        return cached
+
+    product = await load_product(db, product_id)
     if not product:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Товар не найден"
         )
-    return product
+    set_cache_headers(response, etag)
+    return await product_cache.set_product(product, version)
 
 
 @router.put("/update_product_by_ID/{product_id}", response_model=ProductResponse,
             summary="Обновить данные о товаре")
-def update_product(
+async def update_product(
         product_id: int,
         product_data: ProductUpdate,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
 ):
     """"
     Обновление данных товара
     """
-    db_product = db.query(Product).filter(Product.id == product_id).first()
+    db_product = await db.get(Product, product_id)
     if not db_product:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -77,25 +293,35 @@ def update_product(
     for key, value in update_data.items():
         setattr(db_product, key, value)
 
-    db.commit()
-    db.refresh(db_product)
-    return db_product
+    if "stock" in update_data:
+        await discard_stock_movements(db, [product_id])
+    if "ingredients" in update_data:
+        await replace_product_ingredients(db, product_id, db_product.ingredients)
+    if update_data.keys() & {"ingredients", "category"}:
+        await refresh_product_similarity(db, product_id)
+
+    await db.commit()
+    return await product_cache.write_through(await load_product(db, product_id))
 
 @router.delete("/delete_product_by_ID", status_code=status.HTTP_204_NO_CONTENT,
                summary="Удалить товар")
-def delete_product(
+async def delete_product(
         product_id: int,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
 ):
     """"
     Удаление товара из системы
     """
-    db_product = db.query(Product).filter(Product.id == product_id).first()
+    db_product = await db.get(Product, product_id)
     if not db_product:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Товар не найден"
         )
 
-    db.delete(db_product)
-    db.commit()
+    await remove_product_ingredients(db, product_id)
+    await remove_product_similarity(db, product_id)
+    await discard_stock_movements(db, [product_id])
+    await db.delete(db_product)
+    await db.commit()
+    await product_cache.invalidate([product_id])
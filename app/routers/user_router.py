@@ -3,11 +3,13 @@
 """
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlmodel import Session, select
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from app.models.user import User
 from app.schemas.user_schema import UserCreate, UserResponse, Token, UserMessage
 from app.auth.dependencies import get_current_user
-from app.auth.auth_handler import (get_password_hash, verify_password, create_access_token)
+from app.auth.auth_handler import \
+    (get_password_hash_async, verify_password_async, create_access_token)
 from app.database import get_db
 
 router = APIRouter(tags=["Пользователи"])
@@ -16,14 +18,14 @@ router = APIRouter(tags=["Пользователи"])
 @router.post("/register", response_model=UserMessage, summary = "Регистрация")
 async def register_user(
         user_data: UserCreate,
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_db)
 ):
     """
     Регистрация нового пользователя в системе
     """
-    existing_user = db.exec(
+    existing_user = (await db.exec(
         select(User).where(User.email == user_data.email)
-    ).first()
+    )).first()
 
     if existing_user:
         raise HTTPException(
@@ -31,7 +33,7 @@ async def register_user(
             detail="Пользователь с таким email уже существует"
         )
 
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await get_password_hash_async(user_data.password)
     new_user = User(
         username=user_data.username,
         email=user_data.email,
@@ -39,8 +41,8 @@ async def register_user(
     )
 
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
 
     return {
         "message": f"Пользователь {new_user.username} успешно зарегистрирован",
@@ -51,14 +53,14 @@ async def register_user(
 @router.post("/login", response_model=Token, summary = "Авторизация")
 async def login(
         form_data: OAuth2PasswordRequestForm = Depends(),
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_db)
 ):
     """
     Аутентификация пользователя и получение JWT токена
     """
-    user = db.exec(select(User).where(User.email == form_data.username)).first()
+    user = (await db.exec(select(User).where(User.email == form_data.username))).first()
 
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    if not user or not await verify_password_async(form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Неверные учётные данные",
@@ -2,16 +2,17 @@
 Модуль со схемами валидации заказов
 """
 
-from typing import List
+from typing import List, Optional
 from datetime import datetime
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from app.config import settings
 
 
 class OrderItemCreate(BaseModel):
     """Модель для создания элементов заказа"""
     # pylint: disable=too-few-public-methods
     product_id: int
-    quantity: int
+    quantity: int = Field(gt=0)
 
     class Config:
         """
@@ -46,6 +47,9 @@ class OrderResponse(BaseModel):
     status: str
     user_id: int
     created_at: datetime
+    item_count: int
+    total: float
+    reserved_until: Optional[datetime] = None
     items: List[OrderItemResponse]
 
     class Config:
@@ -53,3 +57,80 @@ class OrderResponse(BaseModel):
         Класс, необходимый для совместимости с ORM
         """
         from_attributes = True
+
+
+class OrderListQuery(BaseModel):
+    """Параметры запроса истории заказов: размер страницы и курсор"""
+    limit: int = Field(
+        default=settings.ORDER_PAGE_DEFAULT_LIMIT,
+        ge=1,
+        le=settings.ORDER_PAGE_MAX_LIMIT
+    )
+    cursor: Optional[str] = None
+
+
+class OrderPage(BaseModel):
+    """
+    Модель страницы истории заказов.
+    Курсор next_cursor передаётся в следующий запрос; его отсутствие означает последнюю страницу
+    """
+    items: List[OrderResponse]
+    next_cursor: Optional[str] = None
+
+
+class OrderSummary(BaseModel):
+    """
+    Краткая модель заказа без позиций: количество товаров и сумма хранятся в заказе
+    """
+    # pylint: disable=too-few-public-methods
+    id: int
+    status: str
+    created_at: datetime
+    item_count: int
+    total: float
+
+    class Config:
+        """
+        Класс, необходимый для совместимости с ORM
+        """
+        from_attributes = True
+
+
+class OrderSummaryPage(BaseModel):
+    """Модель страницы краткой истории заказов"""
+    items: List[OrderSummary]
+    next_cursor: Optional[str] = None
+
+
+class RecommendationResponse(BaseModel):
+    """Модель товара, рекомендованного взамен недостающего"""
+    id: int
+    name: str
+    price: float
+    available_stock: int
+
+
+class ItemShortage(BaseModel):
+    """
+    Модель дефицитной позиции: запрошенное и доступное количество товара,
+    а также рекомендованные замены
+    """
+    product_id: int
+    requested: int
+    available_stock: int
+    recommendations: List[RecommendationResponse]
+
+
+class OrderAvailabilityResponse(BaseModel):
+    """Модель результата проверки наличия всех позиций заказа на складе"""
+    available: bool
+    shortages: List[ItemShortage]
+
+
+class OrderBulkResponse(BaseModel):
+    """
+    Модель ответа на пакетное добавление позиций: обновлённый заказ
+    и позиции, которые не удалось зарезервировать из-за недостатка товара
+    """
+    order: OrderResponse
+    shortages: List[ItemShortage]
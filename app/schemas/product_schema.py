@@ -1,6 +1,8 @@
 """Модуль со схемами данных для работы с продуктами"""
+from enum import Enum
 from typing import List, Optional
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from app.config import settings
 
 class ProductBase(BaseModel):
     """
@@ -71,3 +73,64 @@ class ProductShortInfo(BaseModel):
         Класс, необходимый для совместимости с ORM
         """
         from_attributes = True
+
+class ProductSortField(str, Enum):
+    """Поля, по которым возможна курсорная сортировка списка товаров"""
+    ID = "id"
+    PRICE = "price"
+
+class CatalogFileFormat(str, Enum):
+    """Форматы файлов выгрузки и импорта каталога"""
+    NDJSON = "ndjson"
+    CSV = "csv"
+
+class ProductListQuery(BaseModel):
+    """
+    Параметры запроса списка товаров: фильтры, поле сортировки, размер страницы и курсор
+    """
+    category: Optional[str] = None
+    min_price: Optional[float] = Field(default=None, ge=0)
+    max_price: Optional[float] = Field(default=None, ge=0)
+    in_stock: bool = False
+    sort_by: ProductSortField = ProductSortField.ID
+    limit: int = Field(
+        default=settings.PRODUCT_PAGE_DEFAULT_LIMIT,
+        ge=1,
+        le=settings.PRODUCT_PAGE_MAX_LIMIT
+    )
+    cursor: Optional[str] = None
+
+class ProductSearchQuery(BaseModel):
+    """
+    Параметры полнотекстового поиска товаров: строка запроса, размер страницы и курсор
+    """
+    q: str = Field(min_length=1, max_length=200)
+    limit: int = Field(
+        default=settings.PRODUCT_PAGE_DEFAULT_LIMIT,
+        ge=1,
+        le=settings.PRODUCT_PAGE_MAX_LIMIT
+    )
+    cursor: Optional[str] = None
+
+class ProductPage(BaseModel):
+    """
+    Модель страницы списка товаров.
+    Курсор next_cursor передаётся в следующий запрос; его отсутствие означает последнюю страницу
+    """
+    items: List[ProductShortInfo]
+    next_cursor: Optional[str] = None
+
+class ProductImportError(BaseModel):
+    """Ошибки одной строки импортируемого файла"""
+    line: int
+    errors: List[str]
+
+class ProductImportReport(BaseModel):
+    """
+    Отчёт о пакетном импорте товаров.
+    failed — общее число отклонённых строк, errors — подробности по первым из них
+    """
+    inserted: int
+    updated: int
+    failed: int
+    errors: List[ProductImportError]
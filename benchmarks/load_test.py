@@ -0,0 +1,272 @@
+"""
+Нагрузочное тестирование API на локальном сервере uvicorn.
+
+Сценарий: создаётся отдельная БД (миграции + синтетические данные из benchmarks.seed),
+запускается uvicorn, виртуальные пользователи параллельно выполняют смесь запросов:
+авторизацию, просмотр каталога и истории заказов, оформление заказа и добавление
+отсутствующего на складе товара (ответ 409 с рекомендациями).
+По каждому эндпоинту выводятся задержки p50/p95/p99 и пропускная способность.
+Результат можно сохранить как эталон (--save-baseline) и сравнить с ним
+последующий запуск (--compare): при ухудшении сверх допуска код возврата равен 1.
+
+Пример запуска:
+    python -m benchmarks.load_test --products 5000 --concurrency 32 --duration 30 \\
+        --save-baseline benchmarks/baseline.json
+    python -m benchmarks.load_test --compare benchmarks/baseline.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+import httpx
+
+ROOT = Path(__file__).resolve().parent.parent
+LOGIN = "POST /auth/login"
+LIST_PRODUCTS = "GET /products/view_all_products"
+LIST_ORDERS = "GET /orders/get_all_orders"
+CREATE_ORDER = "POST /orders/create_new_order"
+ADD_ITEM = "POST /orders/add_new_order_item"
+ADD_ITEM_409 = "POST /orders/add_new_order_item (409)"
+
+
+class Stats:
+    """Накопление задержек и ошибок по эндпоинтам"""
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record(self, name: str, latency: float, ok: bool):
+        """Учёт одного запроса"""
+        self.latencies[name].append(latency)
+        if not ok:
+            self.errors[name] += 1
+
+    def summary(self, elapsed: float) -> dict:
+        """Сводка по эндпоинтам: количество, ошибки, запросов в секунду, перцентили в мс"""
+        result = {}
+        for name, values in sorted(self.latencies.items()):
+            cuts = statistics.quantiles(values, n=100) if len(values) > 1 else values * 99
+            result[name] = {
+                "requests": len(values),
+                "errors": self.errors[name],
+                "throughput": round(len(values) / elapsed, 2),
+                "p50_ms": round(cuts[49] * 1000, 2),
+                "p95_ms": round(cuts[94] * 1000, 2),
+                "p99_ms": round(cuts[98] * 1000, 2),
+            }
+        return result
+
+
+class VirtualUser:
+    """Пользователь, выполняющий случайные сценарии до истечения времени теста"""
+    def __init__(self, client: httpx.AsyncClient, context: dict, stats: Stats, seed: int):
+        self.client = client
+        self.context = context
+        self.stats = stats
+        self.random = random.Random(seed)
+        self.email = self.random.choice(context["users"])
+        self.headers = {}
+
+    async def request(self, name: str, method: str, url: str, expected: int = 200, **kwargs):
+        """Выполнение запроса с замером задержки"""
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            self.stats.record(name, time.perf_counter() - started, False)
+            return None
+        self.stats.record(name, time.perf_counter() - started, response.status_code == expected)
+        return response
+
+    async def login(self):
+        """Авторизация и сохранение токена"""
+        response = await self.request(LOGIN, "POST", "/auth/login", data={
+            "username": self.email, "password": self.context["password"]
+        })
+        if response is not None and response.status_code == 200:
+            self.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    async def list_products(self):
+        """Просмотр страницы каталога с фильтром по категории или без него"""
+        params = {"limit": self.random.choice([20, 50, 100])}
+        if self.random.random() < 0.5:
+            params["category"] = self.random.choice(self.context["categories"])
+        await self.request(LIST_PRODUCTS, "GET", "/products/view_all_products", params=params)
+
+    async def list_orders(self):
+        """Просмотр истории заказов"""
+        await self.request(LIST_ORDERS, "GET", "/orders/get_all_orders", headers=self.headers)
+
+    async def create_order(self):
+        """Оформление заказа из нескольких товаров в наличии"""
+        response = await self.request(CREATE_ORDER, "POST", "/orders/create_new_order",
+                                      headers=self.headers)
+        if response is None or response.status_code != 200:
+            return
+        order_id = response.json()["id"]
+        for product_id in self.random.sample(self.context["in_stock_ids"], 2):
+            await self.request(ADD_ITEM, "POST", "/orders/add_new_order_item",
+                               params={"order_id": order_id}, headers=self.headers,
+                               json={"product_id": product_id, "quantity": 1})
+        self.context.setdefault("orders", {})[self.email] = order_id
+
+    async def add_out_of_stock(self):
+        """Добавление отсутствующего товара: ожидается 409 с рекомендациями"""
+        order_id = self.context.get("orders", {}).get(self.email)
+        if order_id is None or not self.context["out_of_stock_ids"]:
+            await self.create_order()
+            return
+        await self.request(ADD_ITEM_409, "POST", "/orders/add_new_order_item", expected=409,
+                           params={"order_id": order_id}, headers=self.headers,
+                           json={"product_id": self.random.choice(
+                               self.context["out_of_stock_ids"]
+                           ), "quantity": 1})
+
+    async def run(self, deadline: float):
+        """Цикл сценариев, выбираемых с весами, до момента deadline"""
+        await self.login()
+        scenarios = [
+            (self.list_products, 50), (self.list_orders, 15), (self.create_order, 15),
+            (self.add_out_of_stock, 10), (self.login, 10),
+        ]
+        functions, weights = zip(*scenarios)
+        while time.perf_counter() < deadline:
+            await self.random.choices(functions, weights)[0]()
+
+
+async def run_load(base_url: str, context: dict, concurrency: int, duration: float) -> dict:
+    """Параллельный запуск виртуальных пользователей и сбор сводки"""
+    stats = Stats()
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        started = time.perf_counter()
+        deadline = started + duration
+        await asyncio.gather(*(
+            VirtualUser(client, context, stats, seed).run(deadline)
+            for seed in range(concurrency)
+        ))
+        elapsed = time.perf_counter() - started
+    return stats.summary(elapsed)
+
+
+def prepare_database(args, env: dict) -> dict:
+    """Применение миграций и наполнение БД; возвращает параметры данных"""
+    subprocess.run([sys.executable, "-m", "alembic", "upgrade", "head"],
+                   cwd=ROOT, env=env, check=True, capture_output=True)
+    context_file = Path(env["BENCHMARK_DIR"]) / "context.json"
+    subprocess.run([
+        sys.executable, "-m", "benchmarks.seed",
+        "--products", str(args.products), "--users", str(args.users),
+        "--orders", str(args.orders), "--output", str(context_file)
+    ], cwd=ROOT, env=env, check=True)
+    return json.loads(context_file.read_text(encoding="utf-8"))
+
+
+def start_server(args, env: dict) -> subprocess.Popen:
+    """Запуск uvicorn и ожидание его готовности"""
+    server = subprocess.Popen([ # pylint: disable=consider-using-with
+        sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1",
+        "--port", str(args.port), "--workers", str(args.workers), "--log-level", "warning"
+    ], cwd=ROOT, env=env)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{args.port}/", timeout=1).status_code == 200:
+                return server
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("Сервер uvicorn не запустился")
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> list:
+    """Список ухудшений p95 и пропускной способности относительно эталона"""
+    regressions = []
+    for name, base in baseline["endpoints"].items():
+        current = result["endpoints"].get(name)
+        if current is None:
+            continue
+        if current["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {base['p95_ms']} -> {current['p95_ms']} мс")
+        if current["throughput"] < base["throughput"] * (1 - tolerance):
+            regressions.append(
+                f"{name}: throughput {base['throughput']} -> {current['throughput']} req/s"
+            )
+    return regressions
+
+
+def print_report(endpoints: dict):
+    """Вывод сводки в виде таблицы"""
+    print(f"{'endpoint':<40}{'req':>8}{'err':>6}{'req/s':>9}"
+          f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for name, row in endpoints.items():
+        print(f"{name:<40}{row['requests']:>8}{row['errors']:>6}{row['throughput']:>9}"
+              f"{row['p50_ms']:>9}{row['p95_ms']:>9}{row['p99_ms']:>9}")
+
+
+def parse_args():
+    """Разбор аргументов командной строки"""
+    parser = argparse.ArgumentParser(description="Нагрузочное тестирование API")
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--orders", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=20, help="длительность, с")
+    parser.add_argument("--workers", type=int, default=1, help="число воркеров uvicorn")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--database-url",
+                        help="пустая БД для теста; по умолчанию временный файл SQLite")
+    parser.add_argument("--save-baseline", help="сохранить результат как эталон")
+    parser.add_argument("--compare", help="сравнить результат с эталоном")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="допустимое относительное ухудшение при сравнении")
+    return parser.parse_args()
+
+
+def main():
+    """Подготовка БД, запуск сервера и нагрузки, вывод и сравнение результатов"""
+    args = parse_args()
+    with tempfile.TemporaryDirectory(prefix="candy_shop_load_") as directory:
+        env = {
+            **os.environ,
+            "BENCHMARK_DIR": directory,
+            "DATABASE_URL": args.database_url
+                            or f"sqlite+aiosqlite:///{directory}/load.sqlite3",
+            "SECRET_KEY": os.environ.get("SECRET_KEY", "benchmark"),
+        }
+        context = prepare_database(args, env)
+        server = start_server(args, env)
+        try:
+            endpoints = asyncio.run(run_load(
+                f"http://127.0.0.1:{args.port}", context, args.concurrency, args.duration
+            ))
+        finally:
+            server.terminate()
+            server.wait()
+
+    result = {
+        "config": {key: getattr(args, key) for key in
+                   ("products", "users", "orders", "concurrency", "duration", "workers")},
+        "endpoints": endpoints,
+    }
+    print_report(endpoints)
+    if args.save_baseline:
+        Path(args.save_baseline).write_text(json.dumps(result, indent=2), encoding="utf-8")
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        regressions = compare(result, baseline, args.tolerance)
+        for line in regressions:
+            print("REGRESSION", line)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Сравнение загрузки страницы заказов с позициями двумя способами:
+полной загрузкой товаров через joinedload (прежний вариант) и загрузкой позиций
+через selectinload без обращения к товарам (order_with_items_query): название
+и цена товара хранятся в позициях заказа.
+Для каждого способа выводятся число SQL-запросов, число строк и объём данных,
+декодированных драйвером, в пересчёте на один заказ, а также время загрузки страницы.
+
+Тест выполняется на временной БД SQLite бенчмарка сериализации,
+описания товаров заменяются строками максимальной длины.
+
+Пример запуска: python -m benchmarks.order_projection_benchmark --requests 100
+"""
+import argparse
+import asyncio
+import time
+from sqlalchemy import desc, event, update
+from sqlalchemy.orm import joinedload
+from sqlmodel import select
+from benchmarks.serialization_benchmark import ORDERS, seed
+from app.database import async_session, engine
+from app.models.order import Order, OrderItem
+from app.models.product import Product
+from app.business_logic.order_service import order_with_items_query
+from app.schemas.order_schema import OrderResponse
+
+DESCRIPTION = ("Описание " * 34)[:300]
+INGREDIENTS = ["мука", "сахар", "масло сливочное", "яйца", "ваниль", "какао"]
+
+
+class DecodedSize:
+    """Подсчёт запросов, строк и байт, полученных драйвером"""
+    # pylint: disable=too-few-public-methods
+    def __init__(self):
+        self.queries = self.rows = self.bytes = 0
+
+    def __call__(self, _conn, cursor, *_args):
+        rows = list(getattr(cursor, "_rows", ()))
+        self.queries += 1
+        self.rows += len(rows)
+        self.bytes += sum(
+            len(value.encode()) if isinstance(value, str) else
+            len(value) if isinstance(value, bytes) else 8
+            for row in rows for value in row if value is not None
+        )
+
+
+def legacy_query():
+    """Прежний запрос: позиции и товары целиком присоединяются к строкам заказов"""
+    return select(Order).options(
+        joinedload(Order.items).joinedload(OrderItem.product)
+    ).execution_options(populate_existing=True)
+
+
+async def prepare() -> int:
+    """
+    Наполнение БД данными бенчмарка сериализации с описаниями максимальной длины;
+    возвращает id пользователя
+    """
+    user_id = await seed()
+    async with async_session() as db:
+        await db.exec(update(Product).values(description=DESCRIPTION, ingredients=INGREDIENTS))
+        await db.commit()
+    return user_id
+
+
+async def load_page(query, user_id: int) -> list:
+    """Загрузка и сериализация страницы заказов в отдельной сессии"""
+    async with async_session() as db:
+        orders = (await db.exec(
+            query.where(Order.user_id == user_id)
+            .order_by(desc(Order.created_at), desc(Order.id)).limit(ORDERS)
+        )).unique().all()
+        return [OrderResponse.model_validate(order, from_attributes=True).model_dump()
+                for order in orders]
+
+
+async def measure(query, user_id: int, requests: int) -> tuple:
+    """Объём данных одной загрузки страницы и среднее время загрузки"""
+    size = DecodedSize()
+    event.listen(engine.sync_engine, "after_cursor_execute", size)
+    page = await load_page(query, user_id)
+    event.remove(engine.sync_engine, "after_cursor_execute", size)
+
+    started = time.perf_counter()
+    for _ in range(requests):
+        await load_page(query, user_id)
+    return page, size, (time.perf_counter() - started) / requests
+
+
+async def run(requests: int):
+    """Запуск сравнения и вывод результатов"""
+    user_id = await prepare()
+    print(f"{'query':<12}{'queries':>9}{'rows':>8}{'bytes/order':>13}{'ms/page':>10}")
+    pages = []
+    for name, query in (("joinedload", legacy_query()), ("projection", order_with_items_query())):
+        page, size, elapsed = await measure(query, user_id, requests)
+        pages.append(page)
+        print(f"{name:<12}{size.queries:>9}{size.rows:>8}{size.bytes / ORDERS:>13.0f}"
+              f"{elapsed * 1000:>10.2f}")
+    assert pages[0] == pages[1], "ответы различаются"
+
+
+def main():
+    """Разбор аргументов и запуск сравнения"""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n", maxsplit=1)[0])
+    parser.add_argument("--requests", type=int, default=100)
+    args = parser.parse_args()
+    asyncio.run(run(args.requests))
+
+
+if __name__ == "__main__":
+    main()
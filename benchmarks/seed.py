@@ -0,0 +1,146 @@
+"""
+Наполнение БД синтетическими данными для нагрузочного тестирования:
+товары, пользователи с одинаковым паролем и история заказов.
+Часть товаров создаётся с нулевым остатком для проверки ответа 409 с рекомендациями.
+
+БД задаётся переменной окружения DATABASE_URL; схема должна быть создана миграциями.
+Пример запуска: DATABASE_URL=sqlite+aiosqlite:///./bench.sqlite3 python -m benchmarks.seed
+"""
+import argparse
+import asyncio
+import json
+import random
+from datetime import datetime, timedelta, timezone
+import faker
+from sqlalchemy import func, insert, update
+from sqlmodel import select
+from app.auth.auth_handler import get_password_hash
+from app.business_logic.ingredient_index import replace_ingredients_bulk
+from app.business_logic.similarity import rebuild_similarity
+from app.database import async_session
+from app.models.order import Order, OrderItem
+from app.models.product import Product
+from app.models.user import User
+
+PASSWORD = "benchmark-password"
+EMAIL_TEMPLATE = "user{}@bench.example.com"
+CATEGORIES = 25
+INGREDIENTS = 150
+OUT_OF_STOCK_SHARE = 0.05
+CHUNK_SIZE = 5000
+
+
+def make_products(fake: faker.Faker, count: int) -> list:
+    """Генерация товаров; последние OUT_OF_STOCK_SHARE товаров не в наличии"""
+    categories = [f"{fake.word().capitalize()} {i}" for i in range(CATEGORIES)]
+    ingredients = [f"{fake.word()}-{i}" for i in range(INGREDIENTS)]
+    in_stock = count - int(count * OUT_OF_STOCK_SHARE)
+    return [{
+        "name": f"{fake.word().capitalize()} {i}",
+        "description": fake.sentence(nb_words=8),
+        "price": round(random.uniform(10, 2000), 2),
+        "category": random.choice(categories),
+        "ingredients": random.sample(ingredients, random.randint(3, 4)),
+        "stock": 10 ** 6 if i < in_stock else 0,
+    } for i in range(count)]
+
+
+async def seed_products(db, fake: faker.Faker, count: int) -> dict:
+    """Запись товаров с индексом ингредиентов и таблицей похожести; возвращает {id: товар}"""
+    rows = make_products(fake, count)
+    last_product = (await db.exec(select(func.max(Product.id)))).one() or 0
+    for start in range(0, len(rows), CHUNK_SIZE):
+        await db.exec(insert(Product), params=rows[start:start + CHUNK_SIZE])
+    product_ids = (await db.exec(
+        select(Product.id).where(Product.id > last_product).order_by(Product.id)
+    )).all()
+    await replace_ingredients_bulk(db, {
+        product_id: row["ingredients"] for product_id, row in zip(product_ids, rows)
+    })
+    await rebuild_similarity(db)
+    return dict(zip(product_ids, rows))
+
+
+async def seed_orders(db, catalog: dict, in_stock: list, user_ids: list, size: tuple):
+    """
+    Запись size[0] заказов по size[1] позиций из товаров в наличии
+    со снимком названий и цен и итогами заказов
+    """
+    count, items_per_order = size
+    last_order = (await db.exec(select(func.max(Order.id)))).one() or 0
+    now = datetime.now(timezone.utc)
+    await db.exec(insert(Order), params=[{
+        "user_id": random.choice(user_ids),
+        "created_at": now - timedelta(minutes=random.randint(0, 525600))
+    } for _ in range(count)])
+    order_ids = (await db.exec(select(Order.id).where(Order.id > last_order))).all()
+    item_rows = [
+        {"order_id": order_id, "product_id": product_id, "quantity": 1,
+         "product_name": catalog[product_id]["name"],
+         "unit_price": catalog[product_id]["price"]}
+        for order_id in order_ids
+        for product_id in random.sample(in_stock, min(items_per_order, len(in_stock)))
+    ]
+    totals = {order_id: {"id": order_id, "item_count": 0, "total": 0.0}
+              for order_id in order_ids}
+    for row in item_rows:
+        totals[row["order_id"]]["item_count"] += row["quantity"]
+        totals[row["order_id"]]["total"] += row["quantity"] * row["unit_price"]
+    for start in range(0, len(item_rows), CHUNK_SIZE):
+        await db.exec(insert(OrderItem), params=item_rows[start:start + CHUNK_SIZE])
+    if totals:
+        await db.exec(update(Order), params=list(totals.values()))
+
+
+async def seed(products: int, users: int, orders: int, items_per_order: int) -> dict:
+    """Запись данных в БД; возвращает параметры, необходимые нагрузочному тесту"""
+    fake = faker.Faker("ru_RU")
+    faker.Faker.seed(0)
+    random.seed(0)
+    hashed_password = get_password_hash(PASSWORD)
+
+    async with async_session() as db:
+        catalog = await seed_products(db, fake, products)
+
+        await db.exec(insert(User), params=[{
+            "username": fake.first_name(), "email": EMAIL_TEMPLATE.format(i),
+            "hashed_password": hashed_password
+        } for i in range(users)])
+        user_ids = (await db.exec(
+            select(User.id).where(
+                User.email.like(EMAIL_TEMPLATE.format("%")) # pylint: disable=no-member
+            )
+        )).all()
+
+        in_stock = [pid for pid, row in catalog.items() if row["stock"]]
+        await seed_orders(db, catalog, in_stock, user_ids, (orders, items_per_order))
+        await db.commit()
+
+    return {
+        "users": [EMAIL_TEMPLATE.format(i) for i in range(users)],
+        "password": PASSWORD,
+        "categories": sorted({row["category"] for row in catalog.values()}),
+        "in_stock_ids": in_stock,
+        "out_of_stock_ids": [pid for pid, row in catalog.items() if not row["stock"]],
+    }
+
+
+def main():
+    """Разбор аргументов и вывод параметров наполненной БД в формате JSON"""
+    parser = argparse.ArgumentParser(description="Наполнение БД для нагрузочного теста")
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--orders", type=int, default=1000)
+    parser.add_argument("--items-per-order", type=int, default=3)
+    parser.add_argument("--output", help="файл для записи параметров; по умолчанию stdout")
+    args = parser.parse_args()
+    result = asyncio.run(seed(args.products, args.users, args.orders, args.items_per_order))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(result, file, ensure_ascii=False)
+    else:
+        print(json.dumps(result, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
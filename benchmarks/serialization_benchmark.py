@@ -0,0 +1,108 @@
+"""
+Сравнение пропускной способности списочных эндпоинтов (строк в секунду)
+при обычной сериализации через response_model и при быстром пути orjson
+с отображением столбцов в словари (настройка FAST_JSON_RESPONSES).
+
+Тест выполняется на временной БД SQLite, кеш каталога отключается,
+чтобы измерялась загрузка и сериализация страницы, а не попадание в кеш.
+
+Пример запуска: python -m benchmarks.serialization_benchmark --requests 200
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+DB_DIR = tempfile.mkdtemp(prefix="candy_shop_bench_")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{DB_DIR}/bench.sqlite3"
+os.environ["PRODUCT_CACHE_SIZE"] = "0"
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+# pylint: disable=wrong-import-position
+from fastapi.testclient import TestClient
+from sqlalchemy import insert
+from app.auth.auth_handler import create_access_token
+from app.config import settings
+from app.database import async_session, create_db_and_tables
+from app.main import app
+from app.models.order import Order, OrderItem
+from app.models.product import Product
+from app.models.user import User
+
+PRODUCTS = 1000
+ORDERS = 200
+ITEMS_PER_ORDER = 5
+
+
+async def seed() -> int:
+    """Наполнение БД товарами и заказами одного пользователя; возвращает id пользователя"""
+    await create_db_and_tables()
+    async with async_session() as db:
+        await db.exec(insert(Product), params=[{
+            "name": f"Товар {i}", "description": "Описание", "price": 10.0 + i % 500,
+            "category": f"Категория {i % 20}", "ingredients": ["мука", "сахар", "масло"],
+            "stock": 100
+        } for i in range(PRODUCTS)])
+        user = User(username="bench", email="bench@example.com", hashed_password="-")
+        db.add(user)
+        await db.flush()
+        orders = [Order(user_id=user.id) for _ in range(ORDERS)]
+        db.add_all(orders)
+        await db.flush()
+        items = [{
+            "order_id": order.id, "product_id": 1 + (order.id * 7 + i) % PRODUCTS, "quantity": 1
+        } for order in orders for i in range(ITEMS_PER_ORDER)]
+        by_id = {order.id: order for order in orders}
+        for item in items:
+            item["product_name"] = f"Товар {item['product_id'] - 1}"
+            item["unit_price"] = 10.0 + (item["product_id"] - 1) % 500
+            by_id[item["order_id"]].item_count += 1
+            by_id[item["order_id"]].total += item["unit_price"]
+        await db.exec(insert(OrderItem), params=items)
+        await db.commit()
+        return user.id
+
+
+def measure(client: TestClient, case: tuple, requests: int) -> float:
+    """Количество отдаваемых строк в секунду для серии одинаковых запросов"""
+    _, url, params, headers, rows_per_page = case
+    for _ in range(10):
+        client.get(url, params=params, headers=headers)
+    started = time.perf_counter()
+    for _ in range(requests):
+        response = client.get(url, params=params, headers=headers)
+        response.raise_for_status()
+    return rows_per_page * requests / (time.perf_counter() - started)
+
+
+def main():
+    """Запуск сравнения и вывод результатов"""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n", maxsplit=1)[0])
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    user_id = asyncio.run(seed())
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': str(user_id)})}"}
+    cases = [
+        ("view_all_products", "/products/view_all_products",
+         {"limit": settings.PRODUCT_PAGE_MAX_LIMIT}, {}, settings.PRODUCT_PAGE_MAX_LIMIT),
+        ("get_all_orders", "/orders/get_all_orders",
+         {"limit": settings.ORDER_PAGE_MAX_LIMIT}, headers,
+         settings.ORDER_PAGE_MAX_LIMIT * ITEMS_PER_ORDER),
+    ]
+
+    print(f"{'endpoint':<20}{'response_model':>16}{'fast path':>14}{'speedup':>10}")
+    with TestClient(app) as client:
+        for case in cases:
+            results = []
+            for fast in (False, True):
+                setattr(settings, "FAST_JSON_RESPONSES", fast)
+                results.append(measure(client, case, args.requests))
+            print(f"{case[0]:<20}{results[0]:>16.0f}{results[1]:>14.0f}"
+                  f"{results[1] / results[0]:>9.2f}x")
+    print("строк в секунду; для заказов строкой считается позиция заказа")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,4 @@
+import asyncio
 from logging.config import fileConfig
 from sqlmodel import SQLModel
 from alembic import context
@@ -9,7 +10,8 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 from app.models.user import User
 from app.models.product import Product
 from app.models.order import Order
-from app.database import engine
+from app.database import engine, SQLALCHEMY_DATABASE_URL
+from app.business_logic.search import SEARCH_TABLE, SEARCH_VECTOR_COLUMN
 
 config = context.config
 
@@ -18,9 +20,18 @@ if config.config_file_name is not None:
 
 target_metadata = SQLModel.metadata
 
+def include_object(_object, name, type_, _reflected, _compare_to):
+    """
+    Исключение из автогенерации объектов полнотекстового поиска,
+    создаваемых миграцией вручную и отсутствующих в моделях
+    """
+    if type_ == "table" and name.startswith(SEARCH_TABLE):
+        return False
+    return not (type_ == "column" and name == SEARCH_VECTOR_COLUMN)
+
 def run_migrations_offline():
     """Запуск миграций в оффлайн режиме"""
-    url = config.get_main_option("sqlalchemy.url")
+    url = SQLALCHEMY_DATABASE_URL
     context.configure(
         url=url,
         target_metadata=target_metadata,
@@ -28,28 +39,36 @@ def run_migrations_offline():
         dialect_opts={"paramstyle": "named"},
         compare_type=True,
         compare_server_default=True,
+        include_object=include_object,
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+def do_run_migrations(connection):
+    """Выполнение миграций на синхронном соединении, полученном из асинхронного движка"""
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        compare_type=True,
+        compare_server_default=True,
+        include_object=include_object,
+        render_as_batch=True
     )
 
     with context.begin_transaction():
         context.run_migrations()
 
-def run_migrations_online():
+async def run_migrations_online():
     """Запуск миграций в онлайн режиме"""
     connectable = engine
 
-    with connectable.connect() as connection:
-        context.configure(
-            connection=connection,
-            target_metadata=target_metadata,
-            compare_type=True,
-            compare_server_default=True,
-            render_as_batch=True
-        )
+    async with connectable.connect() as connection:
+        await connection.run_sync(do_run_migrations)
 
-        with context.begin_transaction():
-            context.run_migrations()
+    await connectable.dispose()
 
 if context.is_offline_mode():
     run_migrations_offline()
 else:
-    run_migrations_online()
+    asyncio.run(run_migrations_online())
@@ -0,0 +1,49 @@
+"""similarity_shared_ingredients
+
+Revision ID: 45b09f4a91c3
+Revises: 60718fc83e59
+Create Date: 2026-10-18 12:57:17.277937
+
+"""
+from typing import Sequence, Union
+import json
+
+from alembic import op
+import sqlalchemy as sa
+from app.business_logic.similarity import build_catalog_matrix, top_k_rows
+from app.config import settings
+
+
+# revision identifiers, used by Alembic.
+revision: str = '45b09f4a91c3'
+down_revision: Union[str, None] = '60718fc83e59'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """
+    Пересчёт таблицы похожести: пары товаров одной категории без общих
+    ингредиентов больше не хранятся
+    """
+    bind = op.get_bind()
+    products = [
+        (product_id, category, json.loads(ingredients) if isinstance(ingredients, str)
+         else ingredients)
+        for product_id, category, ingredients in bind.execute(
+            sa.text("SELECT id, category, ingredients FROM products ORDER BY id")
+        )
+    ]
+    rows = top_k_rows(build_catalog_matrix(products), range(len(products)),
+                      settings.SIMILARITY_TOP_K, settings.SIMILARITY_CATEGORY_BOOST)
+    op.execute("DELETE FROM product_similarity")
+    if rows:
+        product_similarity = sa.table('product_similarity',
+                                      sa.column('product_id', sa.Integer()),
+                                      sa.column('similar_id', sa.Integer()),
+                                      sa.column('score', sa.Float()))
+        op.bulk_insert(product_similarity, rows)
+
+
+def downgrade() -> None:
+    """Таблица похожести остаётся рассчитанной по общим ингредиентам"""
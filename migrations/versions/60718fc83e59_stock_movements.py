@@ -0,0 +1,41 @@
+"""stock_movements
+
+Revision ID: 60718fc83e59
+Revises: fce73e72d817
+Create Date: 2026-10-18 11:46:20.566440
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '60718fc83e59'
+down_revision: Union[str, None] = 'fce73e72d817'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('stock_movements',
+                    sa.Column('id', sa.Integer(), nullable=False),
+                    sa.Column('product_id', sa.Integer(), nullable=False),
+                    sa.Column('delta', sa.Integer(), nullable=False),
+                    sa.Column('created_at', sa.DateTime(timezone=True),
+                              server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False),
+                    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ),
+                    sa.PrimaryKeyConstraint('id'))
+    with op.batch_alter_table('stock_movements', schema=None) as batch_op:
+        batch_op.create_index('ix_stock_movements_product_id_delta', ['product_id', 'delta'],
+                              unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('stock_movements', schema=None) as batch_op:
+        batch_op.drop_index('ix_stock_movements_product_id_delta')
+
+    op.drop_table('stock_movements')
@@ -0,0 +1,53 @@
+"""product_ingredients_index
+
+Revision ID: 6513a86d0074
+Revises: d587986d2baa
+Create Date: 2026-10-18 11:47:05.830144
+
+"""
+from typing import Sequence, Union
+import json
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6513a86d0074'
+down_revision: Union[str, None] = 'd587986d2baa'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    product_ingredients = op.create_table('product_ingredients',
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('ingredient', sqlmodel.sql.sqltypes.AutoString(length=100), nullable=False),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ),
+    sa.PrimaryKeyConstraint('product_id', 'ingredient')
+    )
+    with op.batch_alter_table('product_ingredients', schema=None) as batch_op:
+        batch_op.create_index('ix_product_ingredients_ingredient_product_id',
+                              ['ingredient', 'product_id'], unique=False)
+
+    bind = op.get_bind()
+    rows = []
+    for product_id, ingredients in bind.execute(sa.text("SELECT id, ingredients FROM products")):
+        if isinstance(ingredients, str):
+            ingredients = json.loads(ingredients)
+        rows += [
+            {'product_id': product_id, 'ingredient': ingredient}
+            for ingredient in dict.fromkeys(ingredients or [])
+        ]
+    if rows:
+        op.bulk_insert(product_ingredients, rows)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('product_ingredients', schema=None) as batch_op:
+        batch_op.drop_index('ix_product_ingredients_ingredient_product_id')
+
+    op.drop_table('product_ingredients')
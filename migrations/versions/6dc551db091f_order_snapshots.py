@@ -0,0 +1,66 @@
+"""order_snapshots
+
+Revision ID: 6dc551db091f
+Revises: f3a1c7d29e40
+Create Date: 2026-10-18 11:31:16.884283
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6dc551db091f'
+down_revision: Union[str, None] = 'f3a1c7d29e40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('order_items', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('product_name',
+                                      sqlmodel.sql.sqltypes.AutoString(length=100),
+                                      nullable=True))
+        batch_op.add_column(sa.Column('unit_price', sa.Float(), nullable=True))
+
+    with op.batch_alter_table('orders', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('item_count', sa.Integer(), server_default='0',
+                                      nullable=False))
+        batch_op.add_column(sa.Column('total', sa.Float(), server_default='0',
+                                      nullable=False))
+
+    # Снимок текущих названий и цен товаров для существующих позиций
+    op.execute(sa.text(
+        "UPDATE order_items SET "
+        "product_name = COALESCE((SELECT name FROM products "
+        "WHERE products.id = order_items.product_id), ''), "
+        "unit_price = COALESCE((SELECT price FROM products "
+        "WHERE products.id = order_items.product_id), 0)"
+    ))
+    op.execute(sa.text(
+        "UPDATE orders SET "
+        "item_count = COALESCE((SELECT SUM(quantity) FROM order_items "
+        "WHERE order_items.order_id = orders.id), 0), "
+        "total = COALESCE((SELECT SUM(quantity * unit_price) FROM order_items "
+        "WHERE order_items.order_id = orders.id), 0)"
+    ))
+
+    with op.batch_alter_table('order_items', schema=None) as batch_op:
+        batch_op.alter_column('product_name', nullable=False,
+                              existing_type=sqlmodel.sql.sqltypes.AutoString(length=100))
+        batch_op.alter_column('unit_price', existing_type=sa.Float(), nullable=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('orders', schema=None) as batch_op:
+        batch_op.drop_column('total')
+        batch_op.drop_column('item_count')
+
+    with op.batch_alter_table('order_items', schema=None) as batch_op:
+        batch_op.drop_column('unit_price')
+        batch_op.drop_column('product_name')
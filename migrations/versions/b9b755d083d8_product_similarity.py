@@ -0,0 +1,60 @@
+"""product_similarity
+
+Revision ID: b9b755d083d8
+Revises: 6513a86d0074
+Create Date: 2026-10-18 12:36:52.107466
+
+"""
+from typing import Sequence, Union
+import json
+
+from alembic import op
+import sqlalchemy as sa
+from app.business_logic.similarity import build_catalog_matrix, top_k_rows
+from app.config import settings
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b9b755d083d8'
+down_revision: Union[str, None] = '6513a86d0074'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    product_similarity = op.create_table('product_similarity',
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('similar_id', sa.Integer(), nullable=False),
+    sa.Column('score', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ),
+    sa.ForeignKeyConstraint(['similar_id'], ['products.id'], ),
+    sa.PrimaryKeyConstraint('product_id', 'similar_id')
+    )
+    with op.batch_alter_table('product_similarity', schema=None) as batch_op:
+        batch_op.create_index('ix_product_similarity_product_id_score',
+                              ['product_id', 'score'], unique=False)
+        batch_op.create_index('ix_product_similarity_similar_id', ['similar_id'], unique=False)
+
+    bind = op.get_bind()
+    products = [
+        (product_id, category, json.loads(ingredients) if isinstance(ingredients, str)
+         else ingredients)
+        for product_id, category, ingredients in bind.execute(
+            sa.text("SELECT id, category, ingredients FROM products ORDER BY id")
+        )
+    ]
+    matrix = build_catalog_matrix(products)
+    rows = top_k_rows(matrix, range(len(products)), settings.SIMILARITY_TOP_K,
+                      settings.SIMILARITY_CATEGORY_BOOST)
+    if rows:
+        op.bulk_insert(product_similarity, rows)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('product_similarity', schema=None) as batch_op:
+        batch_op.drop_index('ix_product_similarity_similar_id')
+        batch_op.drop_index('ix_product_similarity_product_id_score')
+
+    op.drop_table('product_similarity')
@@ -0,0 +1,34 @@
+"""product_listing_indexes
+
+Revision ID: cd90f4864b21
+Revises: 501503f56e23
+Create Date: 2026-10-18 10:12:41.512903
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'cd90f4864b21'
+down_revision: Union[str, None] = '501503f56e23'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('products', schema=None) as batch_op:
+        batch_op.create_index('ix_products_price_id', ['price', 'id'], unique=False)
+        batch_op.create_index('ix_products_category_id', ['category', 'id'], unique=False)
+        batch_op.create_index('ix_products_category_price_id', ['category', 'price', 'id'],
+                              unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('products', schema=None) as batch_op:
+        batch_op.drop_index('ix_products_category_price_id')
+        batch_op.drop_index('ix_products_category_id')
+        batch_op.drop_index('ix_products_price_id')
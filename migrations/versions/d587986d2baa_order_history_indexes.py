@@ -0,0 +1,47 @@
+"""order_history_indexes
+
+Revision ID: d587986d2baa
+Revises: cd90f4864b21
+Create Date: 2026-10-18 11:02:17.264815
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd587986d2baa'
+down_revision: Union[str, None] = 'cd90f4864b21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    if bind.dialect.name == 'sqlite':
+        # CURRENT_TIMESTAMP хранит время без долей секунды, тогда как SQLAlchemy
+        # записывает его с микросекундами. Приведение к единому формату нужно
+        # для корректного сравнения (created_at, id) при курсорной пагинации
+        op.execute(sa.text(
+            "UPDATE orders SET created_at = created_at || '.000000' "
+            "WHERE length(created_at) = 19"
+        ))
+
+    with op.batch_alter_table('orders', schema=None) as batch_op:
+        batch_op.create_index('ix_orders_user_id_created_at', ['user_id', 'created_at', 'id'],
+                              unique=False)
+
+    with op.batch_alter_table('order_items', schema=None) as batch_op:
+        batch_op.create_index('ix_order_items_order_id', ['order_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('order_items', schema=None) as batch_op:
+        batch_op.drop_index('ix_order_items_order_id')
+
+    with op.batch_alter_table('orders', schema=None) as batch_op:
+        batch_op.drop_index('ix_orders_user_id_created_at')
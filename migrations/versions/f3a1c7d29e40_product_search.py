@@ -0,0 +1,105 @@
+"""product_search
+
+Revision ID: f3a1c7d29e40
+Revises: b9b755d083d8
+Create Date: 2026-10-18 14:05:12.418307
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3a1c7d29e40'
+down_revision: Union[str, None] = 'b9b755d083d8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SQLITE_INGREDIENTS = "(SELECT group_concat(value, ' ') FROM json_each({}.ingredients))"
+
+SQLITE_INSERT = (
+    "INSERT INTO products_fts(rowid, name, description, ingredients) "
+    "VALUES (new.id, new.name, new.description, " + SQLITE_INGREDIENTS.format('new') + ");"
+)
+
+POSTGRES_VECTOR = """
+    setweight(to_tsvector('simple', coalesce(NEW.name, '')), 'A') ||
+    setweight(to_tsvector('simple', coalesce((
+        SELECT string_agg(value, ' ') FROM jsonb_array_elements_text(NEW.ingredients::jsonb)
+    ), '')), 'B') ||
+    setweight(to_tsvector('simple', coalesce(NEW.description, '')), 'C')
+"""
+
+
+def upgrade_sqlite() -> None:
+    """
+    Полнотекстовый индекс FTS5 с rowid, равным id товара.
+    Ингредиенты хранятся в JSON с экранированием не-ASCII символов,
+    поэтому в индекс попадают значения, извлечённые json_each
+    """
+    op.execute(
+        "CREATE VIRTUAL TABLE products_fts USING fts5("
+        "name, description, ingredients, "
+        "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+    )
+    op.execute(
+        "INSERT INTO products_fts(products_fts, rank) VALUES ('rank', 'bm25(10.0, 1.0, 5.0)')"
+    )
+    op.execute(
+        "INSERT INTO products_fts(rowid, name, description, ingredients) "
+        "SELECT id, name, description, " + SQLITE_INGREDIENTS.format('products') + " FROM products"
+    )
+    op.execute(
+        "CREATE TRIGGER products_fts_ai AFTER INSERT ON products BEGIN "
+        + SQLITE_INSERT + " END"
+    )
+    op.execute(
+        "CREATE TRIGGER products_fts_ad AFTER DELETE ON products BEGIN "
+        "DELETE FROM products_fts WHERE rowid = old.id; END"
+    )
+    op.execute(
+        "CREATE TRIGGER products_fts_au AFTER UPDATE OF name, description, ingredients "
+        "ON products BEGIN DELETE FROM products_fts WHERE rowid = old.id; "
+        + SQLITE_INSERT + " END"
+    )
+
+
+def upgrade_postgresql() -> None:
+    """Столбец tsvector с GIN-индексом, заполняемый триггером"""
+    op.execute("ALTER TABLE products ADD COLUMN search_vector tsvector")
+    op.execute(
+        "CREATE FUNCTION products_search_vector_update() RETURNS trigger AS $$ BEGIN "
+        "NEW.search_vector := " + POSTGRES_VECTOR + "; RETURN NEW; END $$ LANGUAGE plpgsql"
+    )
+    op.execute(
+        "CREATE TRIGGER products_search_vector_trigger "
+        "BEFORE INSERT OR UPDATE OF name, description, ingredients ON products "
+        "FOR EACH ROW EXECUTE FUNCTION products_search_vector_update()"
+    )
+    op.execute("UPDATE products SET name = name")
+    op.execute(
+        "CREATE INDEX ix_products_search_vector ON products USING gin (search_vector)"
+    )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name == 'postgresql':
+        upgrade_postgresql()
+    else:
+        upgrade_sqlite()
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("DROP INDEX ix_products_search_vector")
+        op.execute("DROP TRIGGER products_search_vector_trigger ON products")
+        op.execute("DROP FUNCTION products_search_vector_update()")
+        op.execute("ALTER TABLE products DROP COLUMN search_vector")
+    else:
+        op.execute("DROP TRIGGER products_fts_au")
+        op.execute("DROP TRIGGER products_fts_ad")
+        op.execute("DROP TRIGGER products_fts_ai")
+        op.execute("DROP TABLE products_fts")
@@ -0,0 +1,46 @@
+"""order_lifecycle
+
+Revision ID: fce73e72d817
+Revises: 6dc551db091f
+Create Date: 2026-10-18 11:41:19.211124
+
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.config import settings
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'fce73e72d817'
+down_revision: Union[str, None] = '6dc551db091f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('orders', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('reserved_until', sa.DateTime(timezone=True),
+                                      nullable=True))
+        batch_op.create_index('ix_orders_status_reserved_until',
+                              ['status', 'reserved_until'], unique=False)
+
+    # Существующие незавершённые заказы получают полный срок резервирования
+    op.execute(sa.text(
+        "UPDATE orders SET reserved_until = :reserved_until WHERE status = 'created'"
+    ).bindparams(sa.bindparam(
+        'reserved_until',
+        datetime.now(timezone.utc) + timedelta(minutes=settings.ORDER_RESERVATION_MINUTES),
+        type_=sa.DateTime(timezone=True)
+    )))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('orders', schema=None) as batch_op:
+        batch_op.drop_index('ix_orders_status_reserved_until')
+        batch_op.drop_column('reserved_until')
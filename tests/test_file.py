@@ -4,9 +4,30 @@
 Пример запуска: python -m pytest tests/test_file.py
 
 """
+import asyncio
+import csv
+import io
+import json
+import threading
+from datetime import datetime, timedelta, timezone
+from fastapi import FastAPI
 from fastapi.testclient import TestClient
 import faker
+import pytest
+from sqlalchemy import select, update
 from app.main import app
+from app.auth import auth_handler
+from app.auth.token_cache import token_cache
+from app.business_logic.order_lifecycle import sweep_expired_orders
+from app.business_logic.pagination import encode_cursor
+from app.business_logic.stock import reserve_stock
+from app.business_logic.stock_ledger import compact_stock_ledger
+from app.business_logic.product_cache import invalidate_changed_products, product_cache
+from app.fast_json import DefaultResponse
+from app.database import async_session
+from app.config import settings
+from app.models.order import Order
+from app.query_audit import QueryBudgetExceeded, fingerprint, query_audit_middleware
 
 client = TestClient(app)
 fake = faker.Faker()
@@ -17,6 +38,13 @@ client.fake_user_name = fake.first_name()
 client.new_user_id = 0
 client.auth_token = ""
 
+
+@pytest.fixture(autouse=True)
+def strict_query_audit(monkeypatch):
+    """Проверка бюджетов запросов и отсутствия N+1 во всех тестах"""
+    monkeypatch.setattr(settings, "QUERY_AUDIT_ENABLED", True)
+    monkeypatch.setattr(settings, "QUERY_AUDIT_STRICT", True)
+
 def test_register():
     """Тестирование регистрации нового пользователя"""
     response = client.post("/auth/register",
@@ -38,6 +66,20 @@ def test_login():
     client.auth_token = response.json()["access_token"]
 
 
+def test_login_overloaded(monkeypatch):
+    """Тестирование отказа в авторизации при переполнении очереди хеширования"""
+    slots = threading.BoundedSemaphore(1)
+    monkeypatch.setattr(auth_handler, "_hashing_slots", slots)
+
+    with slots:
+        response = client.post("/auth/login",
+                               data = {"username": client.fake_user_email,
+                                       "password": client.fake_user_password}
+                               )
+    assert response.status_code == 503
+    assert "Retry-After" in response.headers
+
+
 def test_me():
     """Тестирование получения профиля текущего пользователя"""
     response = client.get("/auth/me", headers={"Authorization": f"Bearer {client.auth_token}"})
@@ -52,6 +94,21 @@ def test_me():
     assert response.json() == expected_data
 
 
+def test_token_cache():
+    """Тестирование кеширования проверенного токена и его инвалидации"""
+    cached_user = token_cache.get(client.auth_token)
+    assert cached_user is not None
+    assert cached_user.id == client.new_user_id
+    assert token_cache.get(client.auth_token) is not cached_user
+
+    token_cache.invalidate_user(client.new_user_id)
+    assert token_cache.get(client.auth_token) is None
+
+    response = client.get("/auth/me", headers={"Authorization": f"Bearer {client.auth_token}"})
+    assert response.status_code == 200
+    assert token_cache.get(client.auth_token) is not None
+
+
 def test_create_product():
     """Тестирование создания нового товара"""
     product_data = {
@@ -82,10 +139,11 @@ def test_create_product():
 
 def test_get_all_products():
     """Тестирование получения списка товаров"""
-    response = client.get("/products/view_all_products")
+    response = client.get("/products/view_all_products",
+                          params={"category": client.test_product_data["category"]})
     assert response.status_code == 200
 
-    products = response.json()
+    products = response.json()["items"]
     assert isinstance(products, list)
 
     found = any(p["id"] == client.test_product_id for p in products)
@@ -99,6 +157,101 @@ def test_get_all_products():
     assert "description" not in first_product
 
 
+def test_get_all_products_pagination():
+    """Тестирование курсорной пагинации и фильтрации списка товаров"""
+    params = {"sort_by": "price", "limit": 3, "max_price": 5000}
+    seen_ids, prices = [], []
+    while True:
+        response = client.get("/products/view_all_products", params=params)
+        assert response.status_code == 200
+        page = response.json()
+        assert len(page["items"]) <= 3
+        seen_ids += [p["id"] for p in page["items"]]
+        prices += [p["price"] for p in page["items"]]
+        if not page["next_cursor"]:
+            break
+        params["cursor"] = page["next_cursor"]
+
+    assert len(seen_ids) == len(set(seen_ids))
+    assert prices == sorted(prices)
+    assert all(price <= 5000 for price in prices)
+
+    response = client.get("/products/view_all_products", params={"cursor": "broken"})
+    assert response.status_code == 400
+    for sort_by, cursor in (("price", ["price", [1, 2], 3]), ("price", ["price", 1.5, "3"]),
+                            ("id", ["id", 1.5, 3]), ("id", ["id", True, 2 ** 64])):
+        response = client.get("/products/view_all_products",
+                              params={"sort_by": sort_by, "cursor": encode_cursor(*cursor)})
+        assert response.status_code == 400
+
+
+def test_export_products(monkeypatch):
+    """Тестирование потоковой выгрузки каталога в NDJSON и CSV"""
+    monkeypatch.setattr(settings, "EXPORT_CHUNK_SIZE", 2)
+    response = client.get("/products/export")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    products = [json.loads(line) for line in response.text.splitlines()]
+    exported = next(p for p in products if p["id"] == client.test_product_id)
+    assert exported == {**client.test_product_data, "id": client.test_product_id}
+    assert [p["id"] for p in products] == sorted(p["id"] for p in products)
+
+    response = client.get("/products/export", params={"format": "csv"})
+    assert response.status_code == 200
+    assert "products.csv" in response.headers["content-disposition"]
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert len(rows) == len(products)
+    row = next(r for r in rows if int(r["id"]) == client.test_product_id)
+    assert json.loads(row["ingredients"]) == client.test_product_data["ingredients"]
+
+
+def test_import_products(monkeypatch):
+    """Тестирование пакетного импорта товаров с обновлением по названию и ошибками строк"""
+    category = f"Импорт {fake.uuid4()}"
+    new_products = [
+        {"name": f"Импорт {fake.uuid4()}", "description": None, "price": 10 + i,
+         "category": category, "ingredients": ["мука", "сахар", "мёд"], "stock": 5}
+        for i in range(3)
+    ]
+    lines = [json.dumps(p, ensure_ascii=False) for p in new_products]
+    lines.append(json.dumps({**new_products[0], "stock": 9}, ensure_ascii=False))
+    lines += ["", "{broken", json.dumps({"name": "Без цены"})]
+
+    response = client.post(
+        "/products/import",
+        files={"file": ("products.ndjson", "\n".join(lines).encode(), "application/x-ndjson")}
+    )
+    assert response.status_code == 200
+    report = response.json()
+    assert (report["inserted"], report["updated"], report["failed"]) == (3, 0, 2)
+    assert [error["line"] for error in report["errors"]] == [6, 7]
+
+    items = client.get("/products/view_all_products", params={"category": category}).json()
+    assert sorted(p["name"] for p in items["items"]) == sorted(p["name"] for p in new_products)
+    assert {p["name"]: p["stock"] for p in items["items"]}[new_products[0]["name"]] == 9
+
+    export = client.get("/products/export", params={"format": "csv"}).text
+    exported = [row for row in csv.DictReader(io.StringIO(export)) if row["category"] == category]
+    csv_file = io.StringIO()
+    writer = csv.DictWriter(csv_file, fieldnames=list(exported[0]))
+    writer.writeheader()
+    writer.writerows({**row, "stock": 7} for row in exported)
+    monkeypatch.setattr(settings, "SIMILARITY_INCREMENTAL_LIMIT", 0)
+    response = client.post(
+        "/products/import",
+        files={"file": ("products.csv", csv_file.getvalue().encode(), "text/csv")}
+    )
+    assert response.json() == {"inserted": 0, "updated": 3, "failed": 0, "errors": []}
+    items = client.get("/products/view_all_products", params={"category": category}).json()
+    assert all(p["stock"] == 7 for p in items["items"])
+
+    response = client.post(
+        "/products/import",
+        files={"file": ("products.ndjson", "Товар".encode("cp1251"), "application/x-ndjson")}
+    )
+    assert response.status_code == 400
+
+
 def test_get_product_by_id():
     """Тестирование получения товара по ID"""
     response = client.get(
@@ -114,6 +267,65 @@ def test_get_product_by_id():
     response = client.get("/products/get_product_by_ID?product_id=999999")
     assert response.status_code == 404
 
+def test_product_cache():
+    """Тестирование кеша каталога и его инвалидации при изменении товара"""
+    url = f"/products/get_product_by_ID?product_id={client.test_product_id}"
+    list_params = {"category": client.test_product_data["category"]}
+    client.get(url)
+    client.get("/products/view_all_products", params=list_params)
+    hits = product_cache.stats()["hits"]
+
+    assert client.get(url).status_code == 200
+    assert client.get("/products/view_all_products", params=list_params).status_code == 200
+    assert product_cache.stats()["hits"] == hits + 2
+
+    response = client.put(
+        f"/products/update_product_by_ID/{client.test_product_id}",
+        json={**client.test_product_data, "stock": 42},
+        headers={"Authorization": f"Bearer {client.auth_token}"}
+    )
+    assert response.status_code == 200
+    assert client.get(url).json()["stock"] == 42
+    items = client.get("/products/view_all_products", params=list_params).json()["items"]
+    assert next(p for p in items if p["id"] == client.test_product_id)["stock"] == 42
+
+    stats = client.get("/products/cache_stats").json()
+    assert stats["hits"] >= hits + 3
+    assert 0 < stats["hit_ratio"] <= 1
+
+def test_conditional_requests():
+    """Тестирование ответов 304 по ETag и смены ETag при изменении остатка"""
+    url = f"/products/get_product_by_ID?product_id={client.test_product_id}"
+    list_params = {"category": client.test_product_data["category"]}
+    response = client.get(url)
+    etag = response.headers["ETag"]
+    assert "must-revalidate" in response.headers["Cache-Control"]
+
+    response = client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["ETag"] == etag
+
+    list_etag = client.get("/products/view_all_products", params=list_params).headers["ETag"]
+    response = client.get("/products/view_all_products", params=list_params,
+                          headers={"If-None-Match": f'W/{list_etag}, "other"'})
+    assert response.status_code == 304
+
+    response = client.put(
+        f"/products/update_product_by_ID/{client.test_product_id}",
+        json={**client.test_product_data, "stock": 41},
+        headers={"Authorization": f"Bearer {client.auth_token}"}
+    )
+    assert response.status_code == 200
+    response = client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["stock"] == 41
+    assert response.headers["ETag"] != etag
+
+    response = client.get("/products/view_all_products", params=list_params,
+                          headers={"If-None-Match": list_etag})
+    assert response.status_code == 200
+
 def test_delete_product():
     """Тестирование удаления товара"""
     response = client.delete(
@@ -166,6 +378,145 @@ def test_add_order_item():
     client.test_order_item_id = response.json()["items"][0]["id"]
 
 
+def create_test_product(name, category, ingredients, stock):
+    """Создание товара для тестов через API"""
+    response = client.post(
+        "/products/create_a_new_product_item",
+        json={"name": name, "description": None, "price": 50.0, "category": category,
+              "ingredients": ingredients, "stock": stock},
+        headers={"Authorization": f"Bearer {client.auth_token}"}
+    )
+    assert response.status_code == 201
+    return response.json()["id"]
+
+
+def test_add_order_item_recommendations():
+    """Тестирование рекомендаций альтернатив при недостатке товара на складе"""
+    category = f"Рекомендации {fake.uuid4()}"
+    original_id = create_test_product("Исходный", category, ["мука", "сахар", "какао"], 1)
+    best_id = create_test_product("Два общих", category, ["мука", "сахар", "ваниль"], 5)
+    second_id = create_test_product("Один общий", category, ["мука", "мёд", "орехи"], 5)
+    create_test_product("Нет на складе", category, ["мука", "сахар", "какао"], 0)
+    other_id = create_test_product("Без общих", category, ["соль", "перец", "тмин"], 5)
+
+    response = client.post(
+        f"/orders/add_new_order_item?order_id={client.test_order_id}",
+        json={"product_id": original_id, "quantity": 5},
+        headers={"Authorization": f"Bearer {client.auth_token}"}
+    )
+    assert response.status_code == 409
+    recommendations = response.json()["detail"]["recommendations"]
+    assert [r["id"] for r in recommendations] == [best_id, second_id, other_id]
+
+
+def test_search_products():
+    """Тестирование полнотекстового поиска с префиксами, ранжированием и пагинацией"""
+    word = "Пастила" + "".join(fake.random_letters(8)).lower()
+    category = f"Поиск {fake.uuid4()}"
+    by_name = create_test_product(f"{word} яблочная", category, ["яблоко", "сахар", "белок"], 1)
+    by_ingredient = create_test_product("Зефир", category, [word.lower(), "сахар", "агар"], 1)
+
+    response = client.get("/products/search", params={"q": word[:10].upper(), "limit": 1})
+    assert response.status_code == 200
+    page = response.json()
+    assert [p["id"] for p in page["items"]] == [by_name]
+    page = client.get("/products/search", params={
+        "q": word[:10], "limit": 1, "cursor": page["next_cursor"]
+    }).json()
+    assert [p["id"] for p in page["items"]] == [by_ingredient]
+    assert page["next_cursor"] is None
+    for cursor in ([[1], by_name], [-1.5, "1"], ["-1.5", 1]):
+        response = client.get("/products/search",
+                              params={"q": word[:10], "cursor": encode_cursor(*cursor)})
+        assert response.status_code == 400
+
+    results = client.get("/products/search", params={"q": f"{word} ябл"}).json()["items"]
+    assert [p["id"] for p in results] == [by_name]
+
+    client.put(
+        f"/products/update_product_by_ID/{by_name}",
+        json={"name": "Мармелад", "description": None, "price": 50.0, "category": category,
+              "ingredients": ["яблоко", "сахар", "пектин"], "stock": 1},
+        headers={"Authorization": f"Bearer {client.auth_token}"}
+    )
+    client.delete(f"/products/delete_product_by_ID?product_id={by_ingredient}",
+                  headers={"Authorization": f"Bearer {client.auth_token}"})
+    assert client.get("/products/search", params={"q": word}).json()["items"] == []
+    assert client.get("/products/search", params={"q": "!!!"}).json()["items"] == []
+
+
+def test_check_order_availability():
+    """Тестирование пакетной проверки наличия позиций заказа"""
+    category = f"Проверка {fake.uuid4()}"
+    short_id = create_test_product("Мало", category, ["мука", "сахар", "какао"], 1)
+    in_cart_id = create_test_product("В корзине", category, ["мука", "сахар", "ваниль"], 5)
+    alternative_id = create_test_product("Замена", category, ["мука", "сахар", "мёд"], 5)
+    headers = {"Authorization": f"Bearer {client.auth_token}"}
+
+    response = client.post(
+        "/orders/check_order_availability",
+        json={"items": [{"product_id": short_id, "quantity": 3},
+                        {"product_id": in_cart_id, "quantity": 1},
+                        {"product_id": 999999, "quantity": 1}]},
+        headers=headers
+    )
+    assert response.status_code == 200
+    result = response.json()
+    assert result["available"] is False
+
+    shortages = {s["product_id"]: s for s in result["shortages"]}
+    assert set(shortages) == {short_id, 999999}
+    assert shortages[short_id]["available_stock"] == 1
+    recommended_ids = [r["id"] for r in shortages[short_id]["recommendations"]]
+    assert recommended_ids[0] == alternative_id
+    assert in_cart_id not in recommended_ids
+
+    response = client.post(
+        "/orders/check_order_availability",
+        json={"items": [{"product_id": in_cart_id, "quantity": 5}]},
+        headers=headers
+    )
+    assert response.json() == {"available": True, "shortages": []}
+
+    category = f"Дефицит {fake.uuid4()}"
+    short_ids = [
+        create_test_product(f"Дефицит {i}", category,
+                            [f"{category} {i}", f"{category} {j}", f"{category} {i} {j}"], 0)
+        for i, j in enumerate(range(5, 10))
+    ]
+    response = client.post(
+        "/orders/check_order_availability",
+        json={"items": [{"product_id": product_id, "quantity": 1} for product_id in short_ids]},
+        headers=headers
+    )
+    assert response.status_code == 200
+    shortages = response.json()["shortages"]
+    assert {s["product_id"] for s in shortages} == set(short_ids)
+    assert all(len(s["recommendations"]) == 3 for s in shortages)
+
+
+def test_concurrent_stock_reservation():
+    """Тестирование отсутствия продажи сверх остатка при параллельном резервировании"""
+    product_id = create_test_product("Параллельный", f"Гонка {fake.uuid4()}",
+                                     ["мука", "сахар", "какао"], 5)
+
+    async def reserve_one():
+        async with async_session() as session:
+            reserved = await reserve_stock(session, product_id, 1)
+            await session.commit()
+            await invalidate_changed_products(session)
+            return reserved
+
+    async def reserve_concurrently():
+        return await asyncio.gather(*(reserve_one() for _ in range(12)))
+
+    results = asyncio.run(reserve_concurrently())
+    assert results.count(True) == 5
+
+    response = client.get(f"/products/get_product_by_ID?product_id={product_id}")
+    assert response.json()["stock"] == 0
+
+
 def test_get_all_orders():
     """Тестирование получения списка заказов"""
     response = client.get(
@@ -174,8 +525,163 @@ def test_get_all_orders():
     )
 
     assert response.status_code == 200
-    orders = response.json()
+    orders = response.json()["items"]
     assert isinstance(orders, list)
+    assert orders[0]["id"] == client.test_order_id
+
+
+def test_get_all_orders_pagination():
+    """Тестирование курсорной пагинации истории заказов"""
+    headers = {"Authorization": f"Bearer {client.auth_token}"}
+    for _ in range(2):
+        client.post("/orders/create_new_order", headers=headers)
+
+    params = {"limit": 1}
+    seen_ids = []
+    while True:
+        response = client.get("/orders/get_all_orders", params=params, headers=headers)
+        assert response.status_code == 200
+        page = response.json()
+        seen_ids += [order["id"] for order in page["items"]]
+        if not page["next_cursor"]:
+            break
+        params["cursor"] = page["next_cursor"]
+
+    assert len(seen_ids) == 3
+    assert seen_ids == sorted(seen_ids, reverse=True)
+    assert client.test_order_id in seen_ids
+
+    for cursor in (["2024-01-01T00:00:00", [1]], [[1], 1], ["2024-01-01T00:00:00", 2 ** 64]):
+        for url in ("/orders/get_all_orders", "/orders/get_orders_summary"):
+            response = client.get(url, params={"cursor": encode_cursor(*cursor)},
+                                  headers=headers)
+            assert response.status_code == 400
+
+
+def test_fast_json_responses(monkeypatch):
+    """Тестирование совпадения ответов быстрого пути сериализации с обычными"""
+    headers = {"Authorization": f"Bearer {client.auth_token}"}
+    orders = client.get("/orders/get_all_orders", headers=headers).json()
+    products = client.get("/products/view_all_products",
+                          params={"sort_by": "price", "limit": 3}).json()
+
+    monkeypatch.setattr(settings, "FAST_JSON_RESPONSES", True)
+    assert DefaultResponse({"score": float("nan")}).body == b'{"score":null}'
+    response = client.get("/orders/get_all_orders", headers=headers)
+    assert response.headers["content-type"] == "application/json"
+    assert response.json() == orders
+
+    response = client.get("/products/view_all_products", params={"sort_by": "price", "limit": 2})
+    assert response.json()["items"] == products["items"][:2]
+    assert "ETag" in response.headers
+    next_page = client.get("/products/view_all_products", params={
+        "sort_by": "price", "limit": 2, "cursor": response.json()["next_cursor"]
+    }).json()
+    assert next_page["items"][0] == products["items"][2]
+
+
+def test_get_orders_summary():
+    """Тестирование краткой истории заказов с вычисленными количеством и суммой"""
+    response = client.get(
+        "/orders/get_orders_summary",
+        headers={"Authorization": f"Bearer {client.auth_token}"}
+    )
+
+    assert response.status_code == 200
+    summaries = {order["id"]: order for order in response.json()["items"]}
+    assert summaries[client.test_order_id]["item_count"] == 2
+    assert summaries[client.test_order_id]["total"] == 200.0
+
+
+def test_request_metrics():
+    """Тестирование заголовка Server-Timing и гистограмм по маршрутам"""
+    headers = {"Authorization": f"Bearer {client.auth_token}"}
+    response = client.get("/orders/get_all_orders", params={"limit": 1}, headers=headers)
+    timing = response.headers["Server-Timing"]
+    counts = dict(item.split("=") for item in timing.split('desc="')[1].rstrip('"').split())
+    assert timing.startswith("app;dur=") and "db;dur=" in timing
+    assert int(counts["queries"]) >= 1 and int(counts["rows"]) >= 1
+
+    queries = int(counts["queries"])
+    response = client.get("/orders/get_all_orders", params={"limit": 3}, headers=headers)
+    assert f"queries={queries} " in response.headers["Server-Timing"]
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    labels = 'method="GET",route="/orders/get_all_orders"'
+    assert f"http_request_duration_seconds_count{{{labels}}}" in response.text
+    assert f'http_request_db_queries_bucket{{{labels},le="+Inf"}}' in response.text
+    assert 'product_cache_requests_total{result="hit"}' in response.text
+
+
+def test_query_audit(monkeypatch):
+    """Тестирование отпечатков SQL и отказа при превышении бюджета запросов"""
+    assert fingerprint("SELECT * FROM t WHERE id = 5 AND name = 'a''b'") == \
+        fingerprint("SELECT *  FROM t\nWHERE id = 42 AND name = 'c'")
+    assert fingerprint("SELECT * FROM t WHERE id IN (?, ?, ?)") == \
+        fingerprint("SELECT * FROM t WHERE id IN (?, ?)")
+
+    headers = {"Authorization": f"Bearer {client.auth_token}"}
+    route = next(r for r in app.routes if getattr(r, "path", "") == "/orders/get_all_orders")
+    monkeypatch.setattr(route.endpoint, "query_budget", 0)
+    with pytest.raises(QueryBudgetExceeded):
+        client.get("/orders/get_all_orders", headers=headers)
+
+    # аудит работает и без промежуточного слоя метрик
+    audit_app = FastAPI()
+    audit_app.middleware("http")(query_audit_middleware)
+
+    @audit_app.get("/repeated")
+    async def repeated():
+        async with async_session() as db:
+            for _ in range(settings.QUERY_REPEAT_THRESHOLD):
+                await db.execute(select(Order.id).limit(1))
+
+    with pytest.raises(QueryBudgetExceeded):
+        TestClient(audit_app).get("/repeated")
+
+    monkeypatch.setattr(settings, "QUERY_AUDIT_STRICT", False)
+    assert client.get("/orders/get_all_orders", headers=headers).status_code == 200
+
+
+def test_add_order_items():
+    """Тестирование пакетного добавления позиций в заказ"""
+    headers = {"Authorization": f"Bearer {client.auth_token}"}
+    category = f"Пакет {fake.uuid4()}"
+    first_id = create_test_product("Первый", category, ["мука", "сахар", "какао"], 5)
+    second_id = create_test_product("Второй", category, ["мука", "масло", "какао"], 5)
+    third_id = create_test_product("Третий", category, ["мука", "сахар", "ваниль"], 5)
+    short_id = create_test_product("Дефицитный", category, ["мука", "сахар", "мёд"], 2)
+
+    order_id = client.post("/orders/create_new_order", headers=headers).json()["id"]
+    response = client.post(
+        f"/orders/add_order_items?order_id={order_id}",
+        json={"items": [{"product_id": first_id, "quantity": 2},
+                        {"product_id": first_id, "quantity": 1},
+                        {"product_id": second_id, "quantity": 1},
+                        {"product_id": third_id, "quantity": 4},
+                        {"product_id": short_id, "quantity": 10}]},
+        headers=headers
+    )
+    assert response.status_code == 200
+    assert statement_count(response) <= 9
+    result = response.json()
+
+    assert [(i["product_id"], i["quantity"]) for i in result["order"]["items"]] == \
+        [(first_id, 3), (second_id, 1), (third_id, 4)]
+    assert (result["order"]["item_count"], result["order"]["total"]) == (8, 400.0)
+    assert [s["product_id"] for s in result["shortages"]] == [short_id]
+    assert result["shortages"][0]["available_stock"] == 2
+
+    response = client.get(f"/products/get_product_by_ID?product_id={first_id}")
+    assert response.json()["stock"] == 2
+
+    response = client.post(
+        f"/orders/add_order_items?order_id={order_id}",
+        json={"items": [{"product_id": first_id, "quantity": 0}]},
+        headers=headers
+    )
+    assert response.status_code == 422
 
 
 def test_get_order_by_id():
@@ -190,6 +696,43 @@ def test_get_order_by_id():
 
     assert order["user_id"] == client.new_user_id
 
+
+def test_order_price_snapshot():
+    """Тестирование неизменности цены и названия в позиции после изменения товара"""
+    headers = {"Authorization": f"Bearer {client.auth_token}"}
+    response = client.put(
+        f"/products/update_product_by_ID/{client.test_product_id}",
+        json={"name": "Renamed Product", "description": "Test Description", "price": 120.0,
+              "category": "Test", "ingredients": ["test"], "stock": 8},
+        headers=headers
+    )
+    assert response.status_code == 200
+
+    order = client.get(f"/orders/get_the_order_using_ID?order_id={client.test_order_id}",
+                       headers=headers).json()
+    assert (order["items"][0]["product_name"], order["items"][0]["price"]) == \
+        ("Test Product", 100.0)
+    assert (order["item_count"], order["total"]) == (2, 200.0)
+
+def test_update_order_item():
+    """Тестирование изменения количества товара в позиции заказа"""
+    response = client.put(
+        "/orders/update_order_item",
+        params={
+            "order_id": client.test_order_id,
+            "item_id": client.test_order_item_id
+        },
+        json=3,
+        headers={"Authorization": f"Bearer {client.auth_token}"}
+    )
+
+    assert response.status_code == 200
+    assert response.json()["items"][0]["quantity"] == 3
+    assert (response.json()["item_count"], response.json()["total"]) == (3, 300.0)
+
+    response = client.get(f"/products/get_product_by_ID?product_id={client.test_product_id}")
+    assert response.json()["stock"] == 7
+
 def test_remove_order_item():
     """Тестирование удаления позиции из заказа"""
     response = client.delete(
@@ -203,3 +746,155 @@ def test_remove_order_item():
 
     assert response.status_code == 200
     assert len(response.json()["items"]) == 0
+    assert (response.json()["item_count"], response.json()["total"]) == (0, 0.0)
+
+
+def statement_count(response) -> int:
+    """Число SQL-запросов обработки запроса из заголовка Server-Timing"""
+    return int(response.headers["Server-Timing"].split("queries=")[1].split()[0])
+
+
+def test_order_write_statements():
+    """Тестирование минимального числа запросов при изменении позиций заказа"""
+    headers = {"Authorization": f"Bearer {client.auth_token}"}
+    product_id = create_test_product(f"Запросы {fake.uuid4()}", "Запросы",
+                                     ["мука", "сахар", "ваниль"], 10)
+
+    response = client.post("/orders/create_new_order", headers=headers)
+    assert statement_count(response) == 1
+    order_id = response.json()["id"]
+
+    response = client.post(f"/orders/add_new_order_item?order_id={order_id}",
+                           json={"product_id": product_id, "quantity": 2}, headers=headers)
+    assert statement_count(response) == 5
+    item = response.json()["items"][0]
+    assert item["id"] and item["price"] == 50.0
+    assert (response.json()["item_count"], response.json()["total"]) == (2, 100.0)
+
+    response = client.put("/orders/update_order_item", json=4, headers=headers,
+                          params={"order_id": order_id, "item_id": item["id"]})
+    assert statement_count(response) == 5
+    assert response.json()["items"][0]["quantity"] == 4
+
+    response = client.delete("/orders/remove_order_item", headers=headers,
+                             params={"order_id": order_id, "item_id": item["id"]})
+    assert statement_count(response) == 5
+    assert response.json()["items"] == []
+
+    response = client.get(f"/orders/get_the_order_using_ID?order_id={order_id}",
+                          headers=headers)
+    assert (response.json()["item_count"], response.json()["total"]) == (0, 0.0)
+    response = client.get(f"/products/get_product_by_ID?product_id={product_id}")
+    assert response.json()["stock"] == 10
+
+
+def test_order_lifecycle():
+    """Тестирование переходов заказа между статусами и возврата товаров при отмене"""
+    headers = {"Authorization": f"Bearer {client.auth_token}"}
+    product_id = create_test_product(f"Статусы {fake.uuid4()}", "Статусы",
+                                     ["мука", "сахар", "корица"], 10)
+
+    order = client.post("/orders/create_new_order", headers=headers).json()
+    assert order["status"] == "created" and order["reserved_until"]
+    response = client.post(f"/orders/checkout_order?order_id={order['id']}", headers=headers)
+    assert response.status_code == 409
+
+    client.post(f"/orders/add_new_order_item?order_id={order['id']}",
+                json={"product_id": product_id, "quantity": 3}, headers=headers)
+    response = client.post(f"/orders/checkout_order?order_id={order['id']}", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["status"] == "checked_out"
+
+    response = client.post(f"/orders/add_new_order_item?order_id={order['id']}",
+                           json={"product_id": product_id, "quantity": 1}, headers=headers)
+    assert response.status_code == 409
+    response = client.post(f"/orders/pay_order?order_id={order['id']}", headers=headers)
+    assert response.status_code == 200
+    assert (response.json()["status"], response.json()["reserved_until"]) == ("paid", None)
+    response = client.post(f"/orders/cancel_order?order_id={order['id']}", headers=headers)
+    assert response.status_code == 409
+
+    order = client.post("/orders/create_new_order", headers=headers).json()
+    client.post(f"/orders/add_new_order_item?order_id={order['id']}",
+                json={"product_id": product_id, "quantity": 4}, headers=headers)
+    assert client.get(f"/products/get_product_by_ID?product_id={product_id}").json()["stock"] == 3
+    response = client.post(f"/orders/cancel_order?order_id={order['id']}", headers=headers)
+    assert response.json()["status"] == "cancelled"
+    assert client.get(f"/products/get_product_by_ID?product_id={product_id}").json()["stock"] == 7
+
+
+def test_expire_orders():
+    """Тестирование снятия резерва просроченных заказов фоновой задачей"""
+    headers = {"Authorization": f"Bearer {client.auth_token}"}
+    product_id = create_test_product(f"Резерв {fake.uuid4()}", "Резерв",
+                                     ["мука", "сахар", "мёд"], 10)
+    order_ids = []
+    for quantity in (2, 3):
+        order_id = client.post("/orders/create_new_order", headers=headers).json()["id"]
+        client.post(f"/orders/add_new_order_item?order_id={order_id}",
+                    json={"product_id": product_id, "quantity": quantity}, headers=headers)
+        order_ids.append(order_id)
+    client.post(f"/orders/checkout_order?order_id={order_ids[1]}", headers=headers)
+    assert client.get(f"/products/get_product_by_ID?product_id={product_id}").json()["stock"] == 5
+
+    async def expire():
+        async with async_session() as session:
+            await session.exec(
+                update(Order).where(Order.id.in_(order_ids)) # pylint: disable=no-member
+                .values(reserved_until=datetime.now(timezone.utc) - timedelta(minutes=1))
+            )
+            await session.commit()
+        return await sweep_expired_orders(batch_size=1)
+
+    assert asyncio.run(expire()) >= 2
+    asyncio.run(sweep_expired_orders())
+    for order_id in order_ids:
+        response = client.get(f"/orders/get_the_order_using_ID?order_id={order_id}",
+                              headers=headers)
+        assert response.json()["status"] == "expired"
+    assert client.get(f"/products/get_product_by_ID?product_id={product_id}").json()["stock"] == 10
+
+
+def test_stock_ledger(monkeypatch):
+    """Тестирование резервирования через журнал движения товаров и сжатия журнала"""
+    monkeypatch.setattr(settings, "STOCK_LEDGER_ENABLED", True)
+    headers = {"Authorization": f"Bearer {client.auth_token}"}
+    category = f"Журнал {fake.uuid4()}"
+    product_id = create_test_product(f"Журнал {fake.uuid4()}", category,
+                                     ["мука", "сахар", "изюм"], 5)
+    url = f"/products/get_product_by_ID?product_id={product_id}"
+
+    order_ids = [client.post("/orders/create_new_order", headers=headers).json()["id"]
+                 for _ in range(2)]
+    response = client.post(f"/orders/add_new_order_item?order_id={order_ids[0]}",
+                           json={"product_id": product_id, "quantity": 3}, headers=headers)
+    assert response.status_code == 200
+    assert statement_count(response) == 6
+    assert response.json()["items"][0]["price"] == 50.0
+    assert client.get(url).json()["stock"] == 2
+    response = client.get("/products/view_all_products",
+                          params={"category": category, "in_stock": True})
+    assert [item["stock"] for item in response.json()["items"]] == [2]
+    response = client.post("/orders/check_order_availability", headers=headers,
+                           json={"items": [{"product_id": product_id, "quantity": 3}]})
+    assert response.json()["shortages"][0]["available_stock"] == 2
+    response = client.post(f"/orders/add_new_order_item?order_id={order_ids[1]}",
+                           json={"product_id": product_id, "quantity": 3}, headers=headers)
+    assert response.status_code == 409
+
+    async def reserve_one():
+        async with async_session() as session:
+            reserved = await reserve_stock(session, product_id, 1)
+            await session.commit()
+            return reserved
+
+    async def reserve_concurrently():
+        return await asyncio.gather(*(reserve_one() for _ in range(6)))
+
+    assert asyncio.run(reserve_concurrently()).count(True) == 2
+    client.post(f"/orders/cancel_order?order_id={order_ids[0]}", headers=headers)
+    assert client.get(url).json()["stock"] == 3
+
+    assert asyncio.run(compact_stock_ledger(batch_size=2)) >= 4
+    assert asyncio.run(compact_stock_ledger()) == 0
+    assert client.get(url).json()["stock"] == 3